@@ -0,0 +1,216 @@
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+# name: the turn mentions the bot's name or an alias
+# follow_up: the turn is a question right after the bot spoke
+# question: the turn is a question
+# all: every turn goes to the LLM
+RULES = ("name", "follow_up", "question", "all")
+DEFAULT_RULES = ("name", "follow_up")
+
+# The name get_llm_base_prompt gives the bot, and how a German system prompt may name it
+_PROMPT_NAMES = (
+    re.compile(r'named "([^"]+)"'),
+    re.compile(r"(?:hörst|hoerst) auf den Namen \"?([\w-]+(?: [A-ZÄÖÜ][\w-]*)*)"),
+    re.compile(r"(?:heißt|heisst) \"?([A-ZÄÖÜ][\w-]*(?: [A-ZÄÖÜ][\w-]*)*)"),
+)
+_QUESTION_WORDS = {
+    # German
+    "wer", "wen", "wem", "wessen", "was", "wann", "wo", "woher", "wohin", "wie", "wieso", "weshalb", "warum",
+    "welche", "welcher", "welches", "welchen", "welchem", "wozu", "womit", "wofur", "woruber", "wovon", "worum",
+    # English
+    "who", "what", "when", "where", "why", "how", "which",
+}  # fmt: skip
+# A verb first and then "du"/"ihr"/"you", e.g. "Kannst du ..." or "Could you ..."
+_VERB_FIRST = re.compile(r"^[a-z]+ (du|ihr|you)\b")
+
+
+def fold(text: str) -> str:
+    """
+    Lowercases `text` and strips its diacritics, e.g. "Größe" -> "grosse".
+    """
+    text = unicodedata.normalize("NFKD", text.lower().replace("ß", "ss"))
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", fold(text))
+
+
+def cologne_phonetics(word: str) -> str:
+    """
+    Returns the Kölner Phonetik code of a word, which is the same for words that sound
+    alike in German, e.g. "Moderator" and "Moderatur" are both "62727".
+    """
+    word = re.sub(r"[^A-Z]", "", fold(word).upper())
+    codes = []
+    for i, c in enumerate(word):
+        before = word[i - 1] if i else ""
+        after = word[i + 1] if i + 1 < len(word) else ""
+        if c in "AEIJOUY":
+            code = "0"
+        elif c == "B" or (c == "P" and after != "H"):
+            code = "1"
+        elif c in "DT":
+            code = "8" if after and after in "CSZ" else "2"
+        elif c in "FVW" or c == "P":
+            code = "3"
+        elif c in "GKQ":
+            code = "4"
+        elif c == "C":
+            if i == 0:
+                code = "4" if after and after in "AHKLOQRUX" else "8"
+            else:
+                code = "4" if after and after in "AHKOQUX" and before not in "SZ" else "8"
+        elif c == "X":
+            code = "8" if before and before in "CKQ" else "48"
+        elif c == "L":
+            code = "5"
+        elif c in "MN":
+            code = "6"
+        elif c == "R":
+            code = "7"
+        elif c in "SZ":
+            code = "8"
+        else:
+            # H
+            code = ""
+        codes.append(code)
+
+    collapsed = ""
+    for code in codes:
+        for digit in code:
+            if not collapsed or collapsed[-1] != digit:
+                collapsed += digit
+    return collapsed[:1] + collapsed[1:].replace("0", "")
+
+
+def is_question(text: str) -> bool:
+    """
+    Whether an utterance is a question: it ends with a question mark, starts with a
+    question word ("Wie ...", "Warum ...") or with a verb and "du" ("Kannst du ...").
+    """
+    if text.rstrip().endswith("?"):
+        return True
+    first = words(text)[:2]
+    return bool(first) and (first[0] in _QUESTION_WORDS or bool(_VERB_FIRST.match(" ".join(first))))
+
+
+def names_from_prompt(prompt: dict) -> List[str]:
+    """
+    Returns the names a system prompt gives the bot, e.g. the one of get_llm_base_prompt.
+    """
+    content = prompt.get("content") or ""
+    names = []
+    for pattern in _PROMPT_NAMES:
+        for name in pattern.findall(content):
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def parse_rules(value: str) -> Tuple[str, ...]:
+    """
+    Parses a list of rules, e.g. "name,follow_up". An empty list turns the gate off.
+    """
+    rules = tuple(rule.strip() for rule in value.split(",") if rule.strip())
+    for rule in rules:
+        if rule not in RULES:
+            raise ValueError(f"Unknown address rule: {rule}")
+    return rules
+
+
+class AddressGate:
+    """
+    Decides locally whether a turn is addressed to the bot, so that the LLM is only
+    asked when an answer is expected.
+
+    A turn is addressed to the bot if one of the `rules` applies (see RULES). The name
+    rule matches the bot's names in the transcript exactly, fuzzily (a similarity
+    ratio of at least `fuzzy_threshold`, for transcription errors and inflections like
+    "Moderators") or by their German pronunciation (the Kölner Phonetik), also across
+    a name the transcription split in two ("Mode Rator"). Names shorter than
+    `min_fuzzy_length` only match exactly.
+
+    Attributes:
+        metrics (dict): The number of turns forwarded and skipped, and forwarded by each rule.
+    """
+
+    def __init__(
+        self,
+        names: Iterable[str],
+        rules: Iterable[str] = DEFAULT_RULES,
+        fuzzy_threshold: float = 0.8,
+        min_fuzzy_length: int = 4,
+    ):
+        self.rules = tuple(rules)
+        self.fuzzy_threshold = fuzzy_threshold
+        self.min_fuzzy_length = min_fuzzy_length
+        self._names: List[Tuple[int, str, str]] = []
+        for name in names:
+            name_words = words(name)
+            if name_words:
+                joined = "".join(name_words)
+                self._names.append((len(name_words), joined, cologne_phonetics(joined)))
+        if "name" in self.rules and not self._names:
+            logger.warning("The address gate has no name to match")
+        self.metrics: Dict[str, int] = {"forwarded": 0, "skipped": 0, **{rule: 0 for rule in self.rules}}
+
+    @classmethod
+    def from_prompt(cls, prompt: dict, rules: Iterable[str] = DEFAULT_RULES, aliases: Iterable[str] = (), **kwargs):
+        """
+        Creates a gate matching the names of the system `prompt` and `aliases`.
+        """
+        return cls([*names_from_prompt(prompt), *aliases], rules, **kwargs)
+
+    def mentions_name(self, text: str) -> bool:
+        text_words = words(text)
+        for length, name, code in self._names:
+            fuzzy = len(name) >= self.min_fuzzy_length
+            for n in {length, length + 1} if fuzzy else {length}:
+                for i in range(len(text_words) - n + 1):
+                    candidate = "".join(text_words[i : i + n])
+                    if candidate == name:
+                        return True
+                    if not fuzzy or abs(len(candidate) - len(name)) > len(name) // 3:
+                        continue
+                    if SequenceMatcher(None, candidate, name).ratio() >= self.fuzzy_threshold:
+                        return True
+                    # Short codes are shared by too many words, e.g. "Anna" and "ohne"
+                    if len(code) >= 3 and cologne_phonetics(candidate) == code:
+                        return True
+        return False
+
+    def rule(self, texts: List[str], after_bot: bool = False) -> Optional[str]:
+        """
+        Returns the first rule that applies to a turn of utterances `texts`, or None if
+        the turn isn't addressed to the bot. `after_bot` tells whether the bot spoke last.
+        """
+        for rule in self.rules:
+            if rule == "all":
+                return rule
+            if rule == "name" and any(self.mentions_name(text) for text in texts):
+                return rule
+            if rule == "question" and any(is_question(text) for text in texts):
+                return rule
+            if rule == "follow_up" and after_bot and any(is_question(text) for text in texts):
+                return rule
+        return None
+
+    def forward(self, texts: List[str], after_bot: bool = False) -> bool:
+        """
+        Decides whether a turn goes to the LLM, and counts the decision.
+        """
+        rule = self.rule(texts, after_bot)
+        if rule:
+            self.metrics["forwarded"] += 1
+            self.metrics[rule] += 1
+            logger.debug(f"Turn addressed to the bot ({rule})")
+        else:
+            self.metrics["skipped"] += 1
+            logger.debug("Turn not addressed to the bot, skipping the LLM")
+        return bool(rule)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Compares VAD throughput of sessions sharing a host, with one inference per chunk
+and with the BatchedVADEngine.
+
+    PYTHONPATH=. python benchmarks/batched_vad.py
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+from loguru import logger
+
+from shared_vad import BatchedVADEngine, SharedSileroOnnxModel, silero_session
+
+CHUNK = 512
+SAMPLE_RATE = 16000
+
+
+def run_sessions(models: list, chunks: int) -> float:
+    audio = (np.random.RandomState(0).randn(chunks, CHUNK) * 0.1).astype(np.float32)
+
+    def session(model):
+        for chunk in audio:
+            model(chunk, SAMPLE_RATE)
+
+    threads = [threading.Thread(target=session, args=(model,)) for model in models]
+    start = time.process_time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.process_time() - start
+
+
+def main(sessions: list, chunks: int):
+    logger.remove()
+    silero_session()
+    print(f"{chunks} chunks of {CHUNK * 1000 // SAMPLE_RATE} ms per session, CPU time per chunk")
+    print(f"{'sessions':>8} {'single':>12} {'batched':>12} {'avg batch':>10}")
+    for n in sessions:
+        single = run_sessions([SharedSileroOnnxModel(silero_session()) for _ in range(n)], chunks)
+        engine = BatchedVADEngine()
+        batched = run_sessions([engine.model() for _ in range(n)], chunks)
+        engine.close()
+        avg_batch = engine.metrics["chunks"] / engine.metrics["batches"]
+        total = n * chunks
+        print(f"{n:>8} {single / total * 1e6:>9.0f} us {batched / total * 1e6:>9.0f} us {avg_batch:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched VAD benchmark")
+    parser.add_argument("--sessions", type=int, nargs="*", default=[1, 4, 16, 32])
+    parser.add_argument("--chunks", type=int, default=200)
+    args = parser.parse_args()
+    main(args.sessions, args.chunks)
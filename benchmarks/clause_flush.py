@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Compares the time to first audio of the TTS with and without the ClauseAggregator.
+
+A simulated LLM streams German replies token by token into a stub TTS service that
+aggregates sentences like ElevenLabsTTSService. The time to first audio is the time
+until the TTS gets its first text, plus a fixed TTS time to first byte.
+
+    PYTHONPATH=. python benchmarks/clause_flush.py
+"""
+
+import argparse
+import asyncio
+import re
+import statistics
+import time
+
+from clause_aggregator import ClauseAggregator
+from pipecat.frames.frames import LLMFullResponseEndFrame, TextFrame
+from pipecat.processors.frame_processor import FrameDirection
+from pipecat.services.ai_services import TTSService
+
+REPLIES = [
+    "Das ist eine gute Frage, über die wir in der letzten Runde schon ausführlich gesprochen haben, "
+    "und ich fasse die wichtigsten Punkte noch einmal kurz zusammen.",
+    "Wenn ich die bisherigen Beiträge richtig verstanden habe, sind sich Anna und Max einig, dass der "
+    "Termin am 3. Oktober zu früh ist.",
+    "Ja. Die Sitzung dauert noch etwa zehn Minuten, danach machen wir eine kurze Pause.",
+    "Laut der Tagesordnung, die z.B. im Wiki steht, kommen als Nächstes die Berichte der Arbeitsgruppen "
+    "an die Reihe, beginnend mit der Gruppe Finanzen.",
+    "Um das zusammenzufassen: Es gibt drei Vorschläge, und wir stimmen in der nächsten Runde darüber ab.",
+]
+
+
+class StubTTSService(TTSService):
+    """
+    Records when text arrives instead of synthesizing it. Aggregates sentences like ElevenLabsTTSService.
+    """
+
+    def __init__(self):
+        super().__init__(aggregate_sentences=True, push_text_frames=False)
+        self.first_text_at = None
+
+    async def set_model(self, model: str):
+        pass
+
+    def set_voice(self, voice: str):
+        pass
+
+    async def flush_audio(self):
+        pass
+
+    async def run_tts(self, text: str):
+        if self.first_text_at is None:
+            self.first_text_at = time.perf_counter()
+        yield None
+
+    async def push_frame(self, frame, direction=FrameDirection.DOWNSTREAM):
+        pass
+
+
+def tokens(text: str):
+    # Roughly the size of GPT-4o tokens: words with their leading space, punctuation on its own
+    return re.findall(r" ?\w+|[^\w ]", text)
+
+
+async def time_to_first_text(reply: str, token_interval: float, clause_flush: bool) -> float:
+    tts = StubTTSService()
+    head = tts
+    if clause_flush:
+        head = ClauseAggregator()
+
+        async def push_to_tts(frame, direction=FrameDirection.DOWNSTREAM):
+            await tts.process_frame(frame, direction)
+
+        head.push_frame = push_to_tts
+
+    start = time.perf_counter()
+    for token in tokens(reply):
+        await asyncio.sleep(token_interval)
+        await head.process_frame(TextFrame(token), FrameDirection.DOWNSTREAM)
+    await head.process_frame(LLMFullResponseEndFrame(), FrameDirection.DOWNSTREAM)
+    return tts.first_text_at - start
+
+
+async def main(token_interval: float, tts_ttfb: float):
+    print(f"LLM token interval: {token_interval * 1000:.0f} ms, TTS time to first byte: {tts_ttfb * 1000:.0f} ms")
+    print(f"{'reply':>5} {'sentences':>12} {'clauses':>12}")
+    results = {False: [], True: []}
+    for i, reply in enumerate(REPLIES):
+        for clause_flush in (False, True):
+            results[clause_flush].append(await time_to_first_text(reply, token_interval, clause_flush) + tts_ttfb)
+        print(f"{i:>5} {results[False][-1] * 1000:>9.0f} ms {results[True][-1] * 1000:>9.0f} ms")
+    baseline, clauses = statistics.mean(results[False]), statistics.mean(results[True])
+    speedup = (1 - clauses / baseline) * 100
+    print(f"{'mean':>5} {baseline * 1000:>9.0f} ms {clauses * 1000:>9.0f} ms ({speedup:.0f}% faster)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time to first audio with clause-level flushing")
+    parser.add_argument("--token-interval-ms", type=float, default=25, help="Time between LLM tokens")
+    parser.add_argument("--tts-ttfb-ms", type=float, default=300, help="TTS time to first byte")
+    args = parser.parse_args()
+    asyncio.run(main(args.token_interval_ms / 1000, args.tts_ttfb_ms / 1000))
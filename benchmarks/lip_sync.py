@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+Measures the per-chunk cost of the lip-sync mode of TalkingAnimation.
+
+    PYTHONPATH=. python benchmarks/lip_sync.py
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from pipecat.frames.frames import TTSAudioRawFrame
+from talking_animation import TalkingAnimation, mouth_indices
+
+SAMPLE_RATE = 16000
+
+
+def speech_like_audio(seconds: float) -> bytes:
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    # A 180 Hz tone with a syllable-rate (4 Hz) envelope
+    envelope = np.abs(np.sin(2 * np.pi * 4 * t))
+    return (np.sin(2 * np.pi * 180 * t) * envelope * 12000).astype(np.int16).tobytes()
+
+
+async def main(chunk_ms: int, iterations: int):
+    audio = speech_like_audio(chunk_ms / 1000)
+    animation = TalkingAnimation(lip_sync=True)
+    pushed = []
+
+    async def push_frame(frame, direction=None):
+        pushed.append(frame)
+
+    animation.push_frame = push_frame
+    window_samples = int(SAMPLE_RATE * 0.04)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        mouth_indices(audio, window_samples, 28, 0.01, 0.2)
+    indices_us = (time.perf_counter() - start) / iterations * 1e6
+
+    frame = TTSAudioRawFrame(audio=audio, sample_rate=SAMPLE_RATE, num_channels=1)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await animation._lip_sync_audio(frame)
+    process_us = (time.perf_counter() - start) / iterations * 1e6
+
+    print(f"chunk: {chunk_ms} ms of audio, {iterations} iterations")
+    print(f"mouth_indices:   {indices_us:8.1f} us/chunk")
+    print(f"_lip_sync_audio: {process_us:8.1f} us/chunk ({len(pushed) / iterations:.1f} frames pushed per chunk)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lip-sync benchmark")
+    parser.add_argument("--chunk-ms", type=int, default=100, help="Length of each TTS audio chunk")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.chunk_ms, args.iterations))
@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+"""
+Replays user turns through the bot's pipeline with local stub LLM and TTS services
+and reports the throughput, the time spent in each processor (wall time in
+process_frame, so the stub delays count for the LLM and TTS) and the turn latency.
+
+The chain is the one bot.py builds, without the Daily transport: ConversationProcessor
+-> LLM -> ClauseAggregator -> TTS -> TalkingAnimation -> assistant aggregator ->
+ConversationLogger, with the latency probes in between. The stub LLM streams a canned
+answer at a configurable time to first token and token rate, the stub TTS returns
+silence at a configurable time to first byte.
+
+Turns are synthetic, or the user turns of a recorded conversation log (--transcript).
+Each turn is sent once the answer to the previous one is complete. Two scenarios run:
+"latency" with realistic stub delays, "throughput" with stubs that don't wait at all.
+
+    PYTHONPATH=. python benchmarks/pipeline.py
+    PYTHONPATH=. python benchmarks/pipeline.py --check            # fail on regressions
+    PYTHONPATH=. python benchmarks/pipeline.py --update-baseline
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from loguru import logger
+
+from clause_aggregator import ClauseAggregator
+from jsonl import iter_jsonl
+from latency_probes import LatencyProbe, TurnLatencyTracker
+from pipecat.frames.frames import (
+    EndFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    TextFrame,
+    TranscriptionFrame,
+    TTSAudioRawFrame,
+    TTSStartedFrame,
+    TTSStoppedFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineParams, PipelineTask
+from pipecat.processors.aggregators.llm_response import LLMAssistantResponseAggregator
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.ai_services import TTSService
+from pipecat.services.openai import OpenAILLMService
+from processors import ConversationLogger, ConversationProcessor
+from talking_animation import TalkingAnimation
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "pipeline_baseline.json")
+SAMPLE_RATE = 16000
+
+QUESTIONS = [
+    "Moderator, kannst du bitte zusammenfassen, was wir bisher besprochen haben?",
+    "Wie viel Zeit haben wir noch für diesen Punkt?",
+    "Ich finde, wir sollten über den Termin im Oktober abstimmen.",
+    "Moderator, wer hat als Nächstes das Wort?",
+    "Gibt es noch offene Fragen zur Tagesordnung?",
+]
+ANSWER = (
+    "Gerne, bisher haben wir über den Termin, das Budget und die Aufgabenverteilung gesprochen, "
+    "und als Nächstes steht die Abstimmung an. Danach machen wir eine kurze Pause."
+)
+
+
+class StubLLMService(OpenAILLMService):
+    """
+    Streams a canned answer instead of calling OpenAI.
+    """
+
+    def __init__(self, ttft: float, token_interval: float):
+        super().__init__(api_key="benchmark", model="gpt-4o")
+        self.ttft = ttft
+        self.token_interval = token_interval
+
+    async def _process_context(self, context):
+        await asyncio.sleep(self.ttft)
+        for token in re.findall(r" ?\w+|[^\w ]", ANSWER):
+            await self.push_frame(TextFrame(token))
+            await asyncio.sleep(self.token_interval)
+
+
+class StubTTSService(TTSService):
+    """
+    Returns silence, 60 ms per character, after a fixed time to first byte.
+    """
+
+    def __init__(self, ttfb: float):
+        super().__init__(
+            aggregate_sentences=True, push_text_frames=True, push_stop_frames=True, stop_frame_timeout_s=0.2
+        )
+        self.ttfb = ttfb
+
+    async def set_model(self, model: str):
+        pass
+
+    def set_voice(self, voice: str):
+        pass
+
+    async def flush_audio(self):
+        pass
+
+    async def run_tts(self, text: str):
+        await asyncio.sleep(self.ttfb)
+        yield TTSStartedFrame()
+        yield TTSAudioRawFrame(
+            audio=bytes(int(len(text) * 0.06 * SAMPLE_RATE) * 2), sample_rate=SAMPLE_RATE, num_channels=1
+        )
+        yield TTSStoppedFrame()
+
+
+class FrameCounter(FrameProcessor):
+    """
+    Counts the frames leaving the pipeline and signals the end of each answer.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.frames = 0
+        self.answers = asyncio.Queue()
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        self.frames += 1
+        if isinstance(frame, LLMFullResponseEndFrame):
+            await self.answers.put(frame)
+        await self.push_frame(frame, direction)
+
+
+def timed(name: str, process_frame, busy: Dict[str, List[float]]):
+    async def process_frame_timed(frame: Frame, direction: FrameDirection):
+        start = time.perf_counter()
+        await process_frame(frame, direction)
+        entry = busy[name]
+        entry[0] += time.perf_counter() - start
+        entry[1] += 1
+
+    return process_frame_timed
+
+
+def synthetic_turns(count: int) -> List[Tuple[str, str]]:
+    return [(f"user{i % 3}", QUESTIONS[i % len(QUESTIONS)]) for i in range(count)]
+
+
+def recorded_turns(path: str) -> List[Tuple[str, str]]:
+    """
+    Reads the user turns of a conversation log written by ConversationLogger with jsonl=True.
+    """
+    turns = []
+    for message in iter_jsonl(path):
+        if message.get("role") != "user":
+            continue
+        for line in message["content"].splitlines():
+            parts = line.split(" | ", 2)
+            if len(parts) == 3:
+                turns.append((parts[1], parts[2]))
+    return turns
+
+
+async def run_scenario(turns: List[Tuple[str, str]], ttft: float, token_interval: float, tts_ttfb: float) -> dict:
+    latency = TurnLatencyTracker()
+    counter = FrameCounter()
+    conversation = ConversationProcessor(messages := [{"role": "system", "content": "Du bist ein Moderator."}])
+    log_dir = tempfile.TemporaryDirectory()
+    processors = [
+        LatencyProbe(latency, "stopped"),
+        conversation,
+        LatencyProbe(latency, "aggregated"),
+        StubLLMService(ttft, token_interval),
+        LatencyProbe(latency, "llm_started"),
+        LatencyProbe(latency, "llm_first_token"),
+        ClauseAggregator(),
+        StubTTSService(tts_ttfb),
+        LatencyProbe(latency, "tts_first_audio"),
+        TalkingAnimation(lip_sync=True),
+        # Stands in for the transport output
+        LatencyProbe(latency, "output_first_audio"),
+        LLMAssistantResponseAggregator(messages),
+        ConversationLogger(messages, os.path.join(log_dir.name, "conversation.jsonl"), jsonl=True),
+        counter,
+    ]
+    busy: Dict[str, List[float]] = defaultdict(lambda: [0.0, 0])
+    for processor in processors:
+        name = type(processor).__name__
+        if isinstance(processor, LatencyProbe):
+            name = "LatencyProbe"
+        processor.process_frame = timed(name, processor.process_frame, busy)
+
+    task = PipelineTask(Pipeline(processors), PipelineParams(allow_interruptions=False))
+    runner = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+
+    start = time.perf_counter()
+    now = datetime.datetime(2024, 7, 14, 10, 0, 0)
+    for i, (user, text) in enumerate(turns):
+        conversation.add_user_mapping(user, user.capitalize())
+        timestamp = (now + datetime.timedelta(seconds=i)).isoformat() + "Z"
+        await task.queue_frames(
+            [UserStartedSpeakingFrame(), TranscriptionFrame(text, user, timestamp), UserStoppedSpeakingFrame()]
+        )
+        await asyncio.wait_for(counter.answers.get(), 30)
+    elapsed = time.perf_counter() - start
+    await task.queue_frame(EndFrame())
+    await runner
+    log_dir.cleanup()
+
+    return {
+        "turns": len(turns),
+        "frames_per_second": round(counter.frames / elapsed, 1),
+        "latency": latency.summary(),
+        "processors_us_per_frame": {
+            name: round(seconds / calls * 1e6, 1) for name, (seconds, calls) in sorted(busy.items()) if calls
+        },
+    }
+
+
+def regressions(results: dict, baseline: dict, tolerance: float, slack_ms: float = 5) -> List[str]:
+    """
+    Compares the turn latency and the throughput to the baseline, allowing `tolerance` (e.g. 0.3 for 30%).
+    Latencies may also exceed the baseline by `slack_ms`, so that sub-millisecond steps don't fail on noise.
+    """
+    found = []
+    latency, expected = results["latency"]["latency"], baseline["latency"]["latency"]
+    for interval in ("total", "aggregation"):
+        for q in ("p50", "p95"):
+            if interval not in expected:
+                continue
+            limit = expected[interval][q] * (1 + tolerance) + slack_ms
+            value = latency.get(interval, {}).get(q, float("inf"))
+            if value > limit:
+                found.append(f"latency {interval} {q}: {value} ms > {limit:.1f} ms")
+    fps, expected_fps = results["throughput"]["frames_per_second"], baseline["throughput"]["frames_per_second"]
+    if fps < expected_fps * (1 - tolerance):
+        found.append(f"throughput: {fps} frames/s < {expected_fps * (1 - tolerance):.1f} frames/s")
+    return found
+
+
+def print_results(name: str, results: dict):
+    print(f"{name}: {results['turns']} turns, {results['frames_per_second']} frames/s")
+    for interval, stats in results["latency"].items():
+        if isinstance(stats, dict):
+            print(f"  {interval:<12} p50 {stats['p50']:>8} ms  p95 {stats['p95']:>8} ms  p99 {stats['p99']:>8} ms")
+    for processor, us in results["processors_us_per_frame"].items():
+        print(f"  {processor:<32} {us:>10} us/frame")
+
+
+async def main(args):
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    turns = recorded_turns(args.transcript) if args.transcript else synthetic_turns(args.turns)
+    results = {
+        "latency": await run_scenario(
+            turns, args.ttft_ms / 1000, args.token_interval_ms / 1000, args.tts_ttfb_ms / 1000
+        ),
+        "throughput": await run_scenario(turns * args.throughput_repeat, 0, 0, 0),
+    }
+    for name, scenario in results.items():
+        print_results(name, scenario)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Baseline written to {args.baseline}")
+    elif args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        if found:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark")
+    parser.add_argument("--turns", type=int, default=10, help="Number of synthetic turns")
+    parser.add_argument("--transcript", help="Replay the user turns of a JSONL conversation log instead")
+    parser.add_argument("--ttft-ms", type=float, default=300, help="LLM time to first token")
+    parser.add_argument("--token-interval-ms", type=float, default=20, help="Time between LLM tokens")
+    parser.add_argument("--tts-ttfb-ms", type=float, default=200, help="TTS time to first byte")
+    parser.add_argument("--throughput-repeat", type=int, default=10, help="Repeat the turns for the throughput run")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--check", action="store_true", help="Fail if the results regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed regression, as a fraction")
+    parser.add_argument("--update-baseline", action="store_true")
+    asyncio.run(main(parser.parse_args()))
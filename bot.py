@@ -5,52 +5,112 @@ import datetime
 import os
 import sys
 from asyncio import Task
+from contextlib import nullcontext
 from typing import Optional
 
 import aiohttp
 from dotenv import load_dotenv
 from loguru import logger
 
+from addressing import DEFAULT_RULES, AddressGate, parse_rules
+from clause_aggregator import ClauseAggregator
+from context_window import ContextWindow, OpenAISummarizer
+from frame_tracer import FrameTracer, TraceProbe, install_dump_signal
+from idle_video import IdleDailyTransport, get_fps_profile
+from latency_probes import LatencyProbe, TurnLatencyTracker
+from participant_events import ParticipantEventCoalescer
 from pipecat.frames.frames import EndFrame, LLMFullResponseEndFrame, TextFrame
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.pipeline.runner import PipelineRunner
 from pipecat.pipeline.task import PipelineParams, PipelineTask
 from pipecat.processors.aggregators.llm_response import \
     LLMAssistantResponseAggregator
-from pipecat.processors.logger import FrameLogger
 from pipecat.services.elevenlabs import ElevenLabsTTSService
 from pipecat.services.openai import OpenAILLMService
 from pipecat.transports.services.daily import (DailyParams,
-                                               DailyTranscriptionSettings,
-                                               DailyTransport)
+                                               DailyTranscriptionSettings)
 from pipecat.vad.silero import SileroVADAnalyzer
+from pipecat.vad.vad_analyzer import VADAnalyzer
 from processors import BucketLogger, ConversationLogger, ConversationProcessor
 from prompts import get_llm_base_prompt
 from runner import configure
+from speculative_llm import SpeculativeOpenAILLMService
 from talking_animation import TalkingAnimation
+from tts_cache import (CachedPhraseFrame, ElevenLabsSynthesizer, PhraseSpeaker,
+                       TTSCache, tts_cache_dir)
 
 load_dotenv(override=True)
 
 
 DEBUG = os.getenv("DEBUG", "").lower() in ("true", "1", "yes")
-
-logger.remove(0)
-current_time_str = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-logger.add(f"./logs/{current_time_str}_trace.log", level="TRACE")
-logger.add(sys.stderr, level="DEBUG")
-# logger.opt(ansi=True)
+# Where the transcript goes: "file" (./logs) or "bucket" (S3). Defaults to "file" in DEBUG mode
+TRANSCRIPT_LOGGER = os.getenv("TRANSCRIPT_LOGGER") or ("file" if DEBUG else "bucket")
+# Frames kept in the ring buffer of the frame tracer, see frame_tracer.FrameTracer. 0 disables tracing
+FRAME_TRACE_SIZE = int(os.getenv("FRAME_TRACE_SIZE", 4096))
+# Drive the sprite from the speech energy instead of looping it while the bot talks
+LIP_SYNC = os.getenv("LIP_SYNC", "").lower() in ("true", "1", "yes")
+# How often the camera re-sends an unchanged image, see idle_video.FPS_PROFILES
+VIDEO_FPS_PROFILE = get_fps_profile(os.getenv("VIDEO_FPS_PROFILE", "balanced"))
+# Token budget of the context sent to the LLM, older turns are summarized. 0 sends the whole conversation
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+# Start the LLM on stable interim transcriptions, see speculative_llm.SpeculativeOpenAILLMService
+SPECULATIVE_LLM = os.getenv("SPECULATIVE_LLM", "").lower() in ("true", "1", "yes")
+# Shortest chunk the TTS gets at a comma or dash, see clause_aggregator.ClauseAggregator
+CLAUSE_MIN_CHARS = int(os.getenv("CLAUSE_MIN_CHARS", 20))
+# Size of the on-disk cache of greetings and goodbyes, see tts_cache.PhraseSpeaker. 0 synthesizes them every time
+TTS_CACHE_MAX_MB = int(os.getenv("TTS_CACHE_MAX_MB", 64))
+# When a turn goes to the LLM, see addressing.AddressGate. Empty sends every turn
+ADDRESS_RULES = parse_rules(os.getenv("ADDRESS_RULES", ",".join(DEFAULT_RULES)))
+# Other names the bot listens to, besides the one in its prompt
+BOT_ALIASES = [alias.strip() for alias in os.getenv("BOT_ALIASES", "").split(",") if alias.strip()]
+
+
+def setup_logging(name: Optional[str] = None):
+    """
+    Logs to stderr and to a trace file named after the start time, or `name`.
+    """
+    logger.remove()
+    name = name or datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    logger.add(f"./logs/{name}_trace.log", level="TRACE")
+    logger.add(sys.stderr, level="DEBUG")
+    # logger.opt(ansi=True)
+
+
+setup_logging()
 
 # Get the system prompt from environment variable
 SYSTEM_PROMPT = os.getenv("SYSTEM_PROMPT", "You are a friendly chatbot.")
 
 
-async def main(room_url: str, token: str, bot_name: str):
+async def main(
+    room_url: str,
+    token: str,
+    bot_name: str,
+    system_prompt: Optional[str] = None,
+    sprite_folder: Optional[str] = None,
+    aiohttp_session: Optional[aiohttp.ClientSession] = None,
+    vad_analyzer: Optional[VADAnalyzer] = None,
+    runner: Optional[PipelineRunner] = None,
+    latency: Optional[TurnLatencyTracker] = None,
+    tracer: Optional[FrameTracer] = None,
+):
+    """
+    Runs one bot session in the room.
+
+    The optional arguments let a host running several sessions in one process pass the
+    session's configuration, share its HTTP session and VAD model, cancel the
+    session through its runner and read its turn latencies and frame trace. By default
+    they come from the environment.
+    """
     logger.info(f"Bot Name: {bot_name}")
-    logger.info(f"System Prompt: {SYSTEM_PROMPT}")
-    talking_animation = TalkingAnimation()
-
-    async with aiohttp.ClientSession() as session:
-        transport = DailyTransport(
+    logger.info(f"System Prompt: {system_prompt or SYSTEM_PROMPT}")
+    talking_animation = TalkingAnimation(sprite_folder, lip_sync=LIP_SYNC)
+    # Sessions sharing a process need their own transcript names
+    room_name = room_url.rstrip("/").rsplit("/", 1)[-1]
+    session_name = f"{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}-{room_name}"
+
+    async with nullcontext(aiohttp_session) if aiohttp_session else aiohttp.ClientSession() as session:
+        transport = IdleDailyTransport(
             room_url,
             token,
             bot_name,
@@ -59,11 +119,13 @@ async def main(room_url: str, token: str, bot_name: str):
                 camera_out_enabled=True,
                 camera_out_width=talking_animation.sprite_width,
                 camera_out_height=talking_animation.sprite_height,
+                camera_out_framerate=VIDEO_FPS_PROFILE.fps,
                 vad_enabled=True,
-                vad_analyzer=SileroVADAnalyzer(),
+                vad_analyzer=vad_analyzer or SileroVADAnalyzer(),
                 transcription_enabled=True,
                 transcription_settings=DailyTranscriptionSettings(language="de", tier="nova", model="2-general"),
             ),
+            fps_profile=VIDEO_FPS_PROFILE,
         )
 
         tts = ElevenLabsTTSService(
@@ -72,49 +134,85 @@ async def main(room_url: str, token: str, bot_name: str):
             voice_id=os.getenv("ELEVENLABS_VOICE_ID", ""),
             model="eleven_multilingual_v2",
         )
-        llm = OpenAILLMService(api_key=os.getenv("OPENAI_API_KEY"), model="gpt-4o")
+        greeting = f"Hallo {{name}}! Ich bin {bot_name}."
+        goodbye = (
+            f"Auf Wiedersehen {{name}}! Ich, {bot_name}, wünsche dir alles Gute und hoffe, wir sehen uns bald wieder."
+        )
+        goodbye_many = (
+            f"Auf Wiedersehen {{name}}! Ich, {bot_name}, wünsche euch alles Gute und hoffe, wir sehen uns bald wieder."
+        )
+        phrase_speaker = None
+        if TTS_CACHE_MAX_MB > 0:
+            synthesizer = ElevenLabsSynthesizer(
+                session,
+                api_key=os.getenv("ELEVENLABS_API_KEY", ""),
+                voice_id=os.getenv("ELEVENLABS_VOICE_ID", ""),
+                model="eleven_multilingual_v2",
+            )
+            phrase_speaker = PhraseSpeaker(TTSCache(tts_cache_dir, TTS_CACHE_MAX_MB * 1024 * 1024), synthesizer)
+        if SPECULATIVE_LLM:
+            llm = SpeculativeOpenAILLMService(api_key=os.getenv("OPENAI_API_KEY"), model="gpt-4o")
+        else:
+            llm = OpenAILLMService(api_key=os.getenv("OPENAI_API_KEY"), model="gpt-4o")
 
-        messages = [get_llm_base_prompt(bot_name)]
+        messages = [get_llm_base_prompt(bot_name, system_prompt)]
 
         # user_response = LLMUserResponseAggregator(messages)
         # user_response = UserResponseAggregator()
 
+        # Probes timestamp each turn from the user stopping to speak to the first audio of the answer
+        latency = latency or TurnLatencyTracker()
+
+        # The tracer records the frames passing its probes, the trace is dumped on errors, SIGUSR1 or on request
+        if tracer is None and FRAME_TRACE_SIZE > 0:
+            tracer = FrameTracer(session_name, capacity=FRAME_TRACE_SIZE)
+
         pipeline_components = []
-        pipeline_components.append(transport.input())
 
-        if DEBUG:
-            frame_logger_1 = FrameLogger("FL1", "green")
-            pipeline_components.append(frame_logger_1)
+        def trace(name: str):
+            if tracer:
+                pipeline_components.append(TraceProbe(tracer, name))
 
-        conversation_processor = ConversationProcessor(messages)
+        pipeline_components.append(transport.input())
+        pipeline_components.append(LatencyProbe(latency, "stopped"))
+        trace("input")
+
+        gate = AddressGate.from_prompt(messages[0], ADDRESS_RULES, BOT_ALIASES) if ADDRESS_RULES else None
+        conversation_processor = ConversationProcessor(messages, speculative=SPECULATIVE_LLM, gate=gate)
         pipeline_components.append(conversation_processor)
+        if CONTEXT_TOKEN_BUDGET > 0:
+            summarizer = OpenAISummarizer(api_key=os.getenv("OPENAI_API_KEY"))
+            pipeline_components.append(ContextWindow(messages, CONTEXT_TOKEN_BUDGET, summarizer))
+        pipeline_components.append(LatencyProbe(latency, "aggregated"))
         pipeline_components.append(llm)
+        pipeline_components.append(LatencyProbe(latency, "llm_started"))
+        pipeline_components.append(LatencyProbe(latency, "llm_first_token"))
+        trace("llm")
 
-        if DEBUG:
-            frame_logger_2 = FrameLogger("FL2", "yellow")
-            pipeline_components.append(frame_logger_2)
-
+        pipeline_components.append(ClauseAggregator(min_chars=CLAUSE_MIN_CHARS))
         pipeline_components.append(tts)
-
-        if DEBUG:
-            frame_logger_3 = FrameLogger("FL3", "yellow")
-            pipeline_components.append(frame_logger_3)
+        if phrase_speaker:
+            pipeline_components.append(phrase_speaker)
+        pipeline_components.append(LatencyProbe(latency, "tts_first_audio"))
+        trace("tts")
 
         pipeline_components.append(talking_animation)
         pipeline_components.append(transport.output())
+        pipeline_components.append(LatencyProbe(latency, "output_first_audio"))
         assistant_response = LLMAssistantResponseAggregator(messages)
         pipeline_components.append(assistant_response)
+        trace("output")
 
-        if DEBUG:
-            conversation_logger = ConversationLogger(messages, f"./logs/conversation-{current_time_str}.log")
-            frame_logger_4 = FrameLogger("FL4", "red")
-            pipeline_components.append(frame_logger_4)
+        if TRANSCRIPT_LOGGER == "file":
+            conversation_logger = ConversationLogger(
+                messages, f"./logs/conversation-{session_name}.jsonl", jsonl=True, max_bytes=16 * 1024 * 1024
+            )
             pipeline_components.append(conversation_logger)
         else:
             conversation_logger = BucketLogger(
                 messages,
                 os.getenv("S3_BUCKET_NAME", "mds-moderator"),
-                f"conversation-{current_time_str}",
+                f"conversation-{session_name}",
             )
             pipeline_components.append(conversation_logger)
 
@@ -138,6 +236,15 @@ async def main(room_url: str, token: str, bot_name: str):
                 logger.info("No participants joined after 1 minute. Ending session.")
                 await task.queue_frame(EndFrame())
 
+        async def say(template: str, participant_name: str):
+            if phrase_speaker:
+                await task.queue_frame(CachedPhraseFrame(template, participant_name))
+            else:
+                await task.queue_frames([TextFrame(template.format(name=participant_name)), LLMFullResponseEndFrame()])
+
+        # Joins and leaves close together get a single greeting or goodbye
+        participant_events = ParticipantEventCoalescer(say, greeting, goodbye, goodbye_many)
+
         @transport.event_handler("on_participant_joined")
         async def on_participant_joined(transport, participant):
             nonlocal participant_count, participants_joined, end_timer
@@ -149,9 +256,7 @@ async def main(room_url: str, token: str, bot_name: str):
             participant_name = participant["info"]["userName"] or ""
             logger.info(f"Participant {participant_name} joined. Total participants: {participant_count}")
             conversation_processor.add_user_mapping(participant["id"], participant_name)
-            await task.queue_frames(
-                [TextFrame(f"Hallo {participant_name}! Ich bin {bot_name}."), LLMFullResponseEndFrame()]
-            )
+            participant_events.joined(participant_name)
 
         @transport.event_handler("on_participant_left")
         async def on_participant_left(transport, participant, reason):
@@ -159,14 +264,7 @@ async def main(room_url: str, token: str, bot_name: str):
             participant_count -= 1
             participant_name = participant["info"]["userName"] or ""
             logger.info(f"Participant {participant_name} left. Total participants: {participant_count}")
-            await task.queue_frames(
-                [
-                    TextFrame(
-                        f"Auf Wiedersehen {participant_name}! Ich, {bot_name}, wünsche dir alles Gute und hoffe, wir sehen uns bald wieder."
-                    ),
-                    LLMFullResponseEndFrame(),
-                ]
-            )
+            participant_events.left(participant_name, room_empty=participant_count == 0)
             if participant_count == 0:
                 logger.info("No participants left.")
                 participants_joined = False
@@ -176,11 +274,33 @@ async def main(room_url: str, token: str, bot_name: str):
 
         # Start the end_session_if_empty timer when the bot joins the room
         end_timer = asyncio.create_task(end_session_if_empty())
-
-        runner = PipelineRunner()
-
-        await runner.run(task)
-        conversation_logger.log_messages()
+        preload: Optional[Task] = None
+        if phrase_speaker:
+            preload = asyncio.create_task(phrase_speaker.preload([greeting, goodbye, goodbye_many]))
+
+        runner = runner or PipelineRunner()
+
+        if tracer:
+            install_dump_signal()
+
+        # The conversation logger writes out any remaining messages on pipeline cleanup
+        try:
+            await runner.run(task)
+        except Exception:
+            if tracer:
+                tracer.dump("error")
+            raise
+        finally:
+            if end_timer:
+                end_timer.cancel()
+            if preload:
+                preload.cancel()
+            participant_events.cancel()
+            # Fly sets FLY_REGION on its machines, to correlate the latency with the placement of the session
+            latency.log_summary(
+                f"./logs/latency-{session_name}.json" if DEBUG else None,
+                {"session": session_name, "room_url": room_url, "region": os.getenv("FLY_REGION", "")},
+            )
         logger.info("The conversation has ended. This is the final transcript:")
         logger.info(messages)
         logger.info("Bye!")
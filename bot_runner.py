@@ -1,27 +1,36 @@
 import argparse
 import asyncio
 import json
+import math
 import os
+import secrets
 import subprocess
 import sys
 import time
 import uuid
+from collections import Counter
 from contextlib import asynccontextmanager
-from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 
 import aiohttp
-import requests
 import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, Response
 from loguru import logger
 from pipecat.transports.services.helpers.daily_rest import (
     DailyRESTHelper, DailyRoomObject, DailyRoomParams, DailyRoomProperties)
-from tenacity import retry, stop_after_attempt, wait_exponential
+
+from fly_api import FlyAPIError, FlyMachinesClient
+from placement import Placement, PlacementScheduler, parse_regions
+from room_pool import ProvisionedRoom, RoomPool
+from session_registry import (ACTIVE_STATES, AdmissionRejected,
+                              InMemorySessionStore, Liveness, SessionRecord,
+                              SessionRegistry, SqliteSessionStore)
+from static_files import StaticIndex
+from warm_pool import WarmPool, WarmWorker
+from worker_auth import bearer_headers
 
 load_dotenv(override=True)
 
@@ -41,23 +50,120 @@ REQUIRED_ENV_VARS = [
 FLY_API_HOST = os.getenv("FLY_API_HOST", "https://api.machines.dev/v1")
 FLY_APP_NAME = os.getenv("FLY_APP_NAME", "mds-moderator")
 FLY_API_KEY = os.getenv("FLY_API_KEY", "")
-FLY_HEADERS = {
-    "Authorization": f"Bearer {FLY_API_KEY}",
-    "Content-Type": "application/json",
-}
+# Client side rate limit for the machines API, in requests per second
+FLY_API_RATE = float(os.getenv("FLY_API_RATE", 5))
+FLY_API_BURST = int(os.getenv("FLY_API_BURST", 10))
+
+# The region workers run in when there's no better choice, the primary_region in fly.toml
+FLY_PRIMARY_REGION = os.getenv("FLY_PRIMARY_REGION", "ams")
+# The Daily media region rooms are created in, e.g. "eu-central-1". Without it Daily picks the region of the first
+# participant, and sessions are placed by the client's region only
+DAILY_ROOM_GEO = os.getenv("DAILY_ROOM_GEO", "")
+# Regions workers may run in, with their session capacity, e.g. "ams:20,fra:10,iad", see placement.PlacementScheduler
+FLY_WORKER_REGIONS = parse_regions(os.getenv("FLY_WORKER_REGIONS", FLY_PRIMARY_REGION))
+
+# Number of pre-booted idle workers to keep around in each of the WARM_POOL_REGIONS, 0 disables the warm pool
+WARM_POOL_REGIONS = [r.strip() for r in os.getenv("WARM_POOL_REGIONS", FLY_PRIMARY_REGION).split(",") if r.strip()]
+WARM_POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", 0))
+WARM_POOL_MIN_SIZE = int(os.getenv("WARM_POOL_MIN_SIZE", 0))
+WARM_POOL_IDLE_TIMEOUT = int(os.getenv("WARM_POOL_IDLE_TIMEOUT", 10 * 60))  # Default: 10 minutes
+WORKER_PORT = int(os.getenv("WORKER_PORT", 8081))
+
+# Number of Daily rooms to keep around, 0 disables the room pool
+ROOM_POOL_SIZE = int(os.getenv("ROOM_POOL_SIZE", 0))
+ROOM_POOL_MAX_AGE = int(os.getenv("ROOM_POOL_MAX_AGE", 30 * 60))  # Default: 30 minutes
+
+# In RUN_AS_PROCESS mode, fork sessions from a running fork server (fork_server.py) listening on this socket
+FORK_SERVER_SOCKET = os.getenv("FORK_SERVER_SOCKET", "")
+
+# Run sessions on a multi-session worker host (worker_host.py) instead of a machine per session
+WORKER_HOST_URL = os.getenv("WORKER_HOST_URL", "")
+# Shared secret authenticating the runner to the warm workers and the worker host
+WORKER_TOKEN = os.getenv("WORKER_TOKEN", "")
+
+# Admission control, see session_registry.SessionRegistry. 0 is unlimited
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", 0))
+MAX_SESSIONS_PER_CLIENT = int(os.getenv("MAX_SESSIONS_PER_CLIENT", 0))
+# Seconds a request over the limits waits for a slot, and how many may wait, before getting a 429
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", 5))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 16))
+# An SQLite database to share the session registry between runner processes, in memory if not set
+SESSION_REGISTRY_DB = os.getenv("SESSION_REGISTRY_DB", "")
+
+# Fly sets FLY_MACHINE_ID on its machines. Only there the fly-client-ip header is set by Fly's proxy, elsewhere any
+# client could set it
+BEHIND_FLY_PROXY = bool(os.getenv("FLY_MACHINE_ID"))
+
+# Bearer token for the session details of GET /sessions (rooms and client IPs), without it only counts are returned
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Machine states in which a session's worker is gone
+DEAD_MACHINE_STATES = ("stopping", "stopped", "destroying", "destroyed", "failed")
 
 daily_helpers = {}
+http_sessions = {}
+fly_helpers = {}
+warm_pools = {}
+room_pools = {}
+registries = {}
+static_files = {}
+placement_scheduler = PlacementScheduler(FLY_WORKER_REGIONS, FLY_PRIMARY_REGION)
+
+
+def create_fly_client() -> FlyMachinesClient:
+    return FlyMachinesClient(FLY_API_HOST, FLY_APP_NAME, FLY_API_KEY, rate=FLY_API_RATE, burst=FLY_API_BURST)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     aiohttp_session = aiohttp.ClientSession()
+    http_sessions["default"] = aiohttp_session
+    static_files["frontend"] = StaticIndex(STATIC_DIR)
     daily_helpers["rest"] = DailyRESTHelper(
         daily_api_key=os.getenv("DAILY_API_KEY", ""),
         daily_api_url=os.getenv("DAILY_API_URL", "https://api.daily.co/v1"),
         aiohttp_session=aiohttp_session,
     )
+    # Pooled rooms are always new rooms, so don't pool when a fixed room is configured
+    if ROOM_POOL_SIZE > 0 and not os.getenv("off_DAILY_SAMPLE_ROOM_URL", ""):
+        room_pools["rooms"] = RoomPool(
+            daily_helpers["rest"],
+            size=ROOM_POOL_SIZE,
+            session_time=MAX_SESSION_TIME,
+            max_age=ROOM_POOL_MAX_AGE,
+            geo=DAILY_ROOM_GEO or None,
+        )
+        room_pools["rooms"].start()
+    registries["sessions"] = SessionRegistry(
+        SqliteSessionStore(SESSION_REGISTRY_DB) if SESSION_REGISTRY_DB else InMemorySessionStore(),
+        max_sessions=MAX_SESSIONS,
+        max_per_client=MAX_SESSIONS_PER_CLIENT,
+        max_wait=ADMISSION_MAX_WAIT,
+        max_queue=ADMISSION_MAX_QUEUE,
+        # Sessions can't outlast their tokens
+        max_age=MAX_SESSION_TIME + 60,
+    )
+    registries["sessions"].start()
+    fly_helpers["machines"] = create_fly_client()
+    if (WARM_POOL_SIZE > 0 or WORKER_HOST_URL) and not WORKER_TOKEN:
+        logger.warning("WORKER_TOKEN is not set, the warm workers and the worker host will refuse sessions")
+    if WARM_POOL_SIZE > 0 and not os.getenv("RUN_AS_PROCESS", False) and not WORKER_HOST_URL:
+        for region in WARM_POOL_REGIONS:
+            warm_pools[region] = WarmPool(
+                FlyWarmWorkerBackend(fly_helpers["machines"], aiohttp_session, region),
+                size=WARM_POOL_SIZE,
+                min_size=WARM_POOL_MIN_SIZE,
+                idle_timeout=WARM_POOL_IDLE_TIMEOUT,
+            )
+            warm_pools[region].start()
     yield
+    await registries.pop("sessions").stop()
+    await asyncio.gather(*[pool.stop() for pool in warm_pools.values()])
+    warm_pools.clear()
+    await fly_helpers.pop("machines").close()
+    if "rooms" in room_pools:
+        await room_pools.pop("rooms").stop()
+    http_sessions.pop("default")
     await aiohttp_session.close()
 
 
@@ -66,7 +172,7 @@ async def create_room() -> DailyRoomObject:
     room_url = os.getenv("off_DAILY_SAMPLE_ROOM_URL", "")
 
     if not room_url:
-        params = DailyRoomParams(properties=DailyRoomProperties())
+        params = DailyRoomParams(properties=DailyRoomProperties(**({"geo": DAILY_ROOM_GEO} if DAILY_ROOM_GEO else {})))
         try:
             room: DailyRoomObject = await daily_helpers["rest"].create_room(params=params)
         except Exception as e:
@@ -80,6 +186,24 @@ async def create_room() -> DailyRoomObject:
     return room
 
 
+async def provision_room() -> ProvisionedRoom:
+    if "rooms" in room_pools:
+        try:
+            return await room_pools["rooms"].acquire()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Unable to provision room {e}")
+
+    room = await create_room()
+    try:
+        bot_token, user_token = await asyncio.gather(
+            daily_helpers["rest"].get_token(room.url, MAX_SESSION_TIME),
+            daily_helpers["rest"].get_token(room.url, MAX_SESSION_TIME),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get token for room: {room.url} {e}")
+    return ProvisionedRoom(room, bot_token, user_token, usable_until=time.time() + MAX_SESSION_TIME)
+
+
 # ----------------- API ----------------- #
 
 app = FastAPI(lifespan=lifespan)
@@ -92,112 +216,271 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount the static directory
+# The exported frontend, served from memory, see static_files.StaticIndex
 STATIC_DIR = "frontend/out"
-app.mount("/static", StaticFiles(directory=STATIC_DIR, html=True), name="static")
 
 # ----------------- Main ----------------- #
 
 
-@retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=4, max=60))
-def check_machine_state(vm_id):
-    logger.info(f"Checking state of machine {vm_id}")
-    res = requests.get(
-        f"{FLY_API_HOST}/apps/{FLY_APP_NAME}/machines/{vm_id}",
-        headers=FLY_HEADERS,
-        timeout=30,
-    )
-    res.raise_for_status()
-    state = res.json()["state"]
-    logger.info(f"Machine {vm_id} state: {state}")
-    if state != "started":
-        raise Exception(f"Machine not in 'started' state. Current state: {state}")
-    return state
+def worker_properties(image: str, cmd: list, env: dict, region: Optional[str] = None) -> dict:
+    properties = {
+        "config": {
+            "image": image,
+            "auto_destroy": True,
+            "init": {"cmd": cmd},
+            "restart": {"policy": "no"},
+            "guest": {"cpu_kind": "shared", "cpus": 1, "memory_mb": 1024},
+            "env": env,
+        },
+    }
+    if region:
+        properties["region"] = region
+    return properties
 
 
-def spawn_fly_machine(
+async def spawn_fly_machine(
     room_url: str,
     token: str,
     bot_name: str,
     system_prompt: Optional[str] = None,
     sprite_folder: Optional[str] = None,
-):
+    region: Optional[str] = None,
+) -> str:
     spawn_timeout = 300  # 5 minutes timeout
 
-    logger.info(f"Spawning Fly machine for room: {room_url}")
+    logger.info(f"Spawning Fly machine for room: {room_url} in region: {region or 'default'}")
     logger.info(f"Bot name: {bot_name}")
     logger.info(f"System prompt: {system_prompt}")
     logger.info(f"Sprite folder: {sprite_folder}")
 
-    # Use the same image as the bot runner
-    logger.info("Fetching current machine image from Fly")
-    res = requests.get(
-        f"{FLY_API_HOST}/apps/{FLY_APP_NAME}/machines",
-        headers=FLY_HEADERS,
-        timeout=spawn_timeout,
-    )
-    if res.status_code != 200:
-        logger.error(f"Unable to get machine info from Fly: {res.text}")
-        raise Exception(f"Unable to get machine info from Fly: {res.text}")
-    image = res.json()[0]["config"]["image"]
-    logger.info(f"Using image: {image}")
+    fly = fly_helpers["machines"]
+    image = await fly.get_image()
 
     # Machine configuration
     cmd = f"/app/.venv/bin/python3 bot.py -u {room_url} -t {token}"
     cmd = cmd.split()
-    worker_props = {
-        "config": {
-            "image": image,
-            "auto_destroy": True,
-            "init": {"cmd": cmd},
-            "restart": {"policy": "no"},
-            "guest": {"cpu_kind": "shared", "cpus": 1, "memory_mb": 1024},
-            "env": {},
-        },
-    }
+    env = {}
 
     if system_prompt:
-        worker_props["config"]["env"]["SYSTEM_PROMPT"] = system_prompt
+        env["SYSTEM_PROMPT"] = system_prompt
 
     if sprite_folder:
-        worker_props["config"]["env"]["SPRITE_FOLDER"] = sprite_folder
+        env["SPRITE_FOLDER"] = sprite_folder
 
-    worker_props["config"]["env"]["BOT_NAME"] = bot_name
+    env["BOT_NAME"] = bot_name
 
+    worker_props = worker_properties(image, cmd, env, region)
     logger.info("Worker properties:")
     logger.info(json.dumps(worker_props, indent=2))
 
-    # Spawn a new machine instance
-    logger.info("Spawning new Fly machine")
-    res = requests.post(
-        f"{FLY_API_HOST}/apps/{FLY_APP_NAME}/machines",
-        headers=FLY_HEADERS,
-        json=worker_props,
-        timeout=spawn_timeout,
-    )
+    machine = await fly.create_machine(worker_props)
+    # Wait for the machine to enter the started state
+    await fly.wait_for_state(machine["id"], "started", spawn_timeout)
+    logger.info(f"Machine successfully started and joined room: {room_url}")
+    return machine["id"]
 
-    if res.status_code != 200:
-        logger.error(f"Problem starting a bot worker: {res.text}")
-        raise Exception(f"Problem starting a bot worker: {res.text}")
 
-    # Wait for the machine to enter the started state
-    vm_id = res.json()["id"]
-    logger.info(f"Machine spawned with ID: {vm_id}")
+async def fork_session(session: dict) -> int:
+    reader, writer = await asyncio.open_unix_connection(FORK_SERVER_SOCKET)
+    try:
+        writer.write(json.dumps(session).encode() + b"\n")
+        await writer.drain()
+        reply = json.loads(await asyncio.wait_for(reader.readline(), 10))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    if "error" in reply:
+        raise Exception(reply["error"])
+    return reply["pid"]
+
+
+async def start_hosted_session(session: dict) -> str:
+    async with http_sessions["default"].post(
+        f"{WORKER_HOST_URL}/sessions", json=session, headers=bearer_headers(WORKER_TOKEN), timeout=10
+    ) as res:
+        if res.status != 201:
+            raise Exception(f"Worker host refused the session: {res.status} {await res.text()}")
+        session_id = (await res.json())["id"]
+    logger.info(f"Session {session_id} started on {WORKER_HOST_URL}")
+    return session_id
+
+
+def pid_alive(pid: int) -> Liveness:
+    async def alive() -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        return True
+
+    return alive
+
+
+def hosted_session_alive(session_id: str) -> Liveness:
+    async def alive() -> bool:
+        async with http_sessions["default"].get(
+            f"{WORKER_HOST_URL}/sessions/{session_id}", headers=bearer_headers(WORKER_TOKEN), timeout=10
+        ) as res:
+            if res.status == 404:
+                return False
+            return (await res.json())["state"] in ("running", "stopping")
+
+    return alive
+
+
+def machine_alive(machine_id: str) -> Liveness:
+    async def alive() -> bool:
+        try:
+            machine = await fly_helpers["machines"].get_machine(machine_id)
+        except FlyAPIError as e:
+            if e.status == 404:
+                return False
+            raise
+        return machine["state"] not in DEAD_MACHINE_STATES
+
+    return alive
+
+
+class FlyWarmWorkerBackend:
+    """
+    Boots Fly machines running worker.py for the warm pool and hands them sessions
+    over Fly's private network.
+    """
+
+    def __init__(
+        self,
+        fly: FlyMachinesClient,
+        aiohttp_session: aiohttp.ClientSession,
+        region: Optional[str] = None,
+        boot_timeout: int = 300,
+    ):
+        self.fly = fly
+        self.aiohttp_session = aiohttp_session
+        self.region = region
+        self.boot_timeout = boot_timeout
+
+    async def create_worker(self) -> WarmWorker:
+        image = await self.fly.get_image()
+        cmd = ["/app/.venv/bin/python3", "worker.py", "--port", str(WORKER_PORT)]
+        machine = await self.fly.create_machine(worker_properties(image, cmd, {}, self.region))
+        worker = WarmWorker(
+            id=machine["id"], address=f"http://{machine['id']}.vm.{FLY_APP_NAME}.internal:{WORKER_PORT}"
+        )
+        try:
+            await self.fly.wait_for_state(worker.id, "started", self.boot_timeout)
+            await self._wait_until_idle(worker)
+        except Exception:
+            await self.destroy_worker(worker)
+            raise
+        return worker
+
+    async def _wait_until_idle(self, worker: WarmWorker):
+        deadline = time.monotonic() + self.boot_timeout
+        while time.monotonic() < deadline:
+            try:
+                async with self.aiohttp_session.get(f"{worker.address}/health", timeout=5) as res:
+                    if res.status == 200 and (await res.json())["state"] == "idle":
+                        return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(1)
+        raise Exception(f"Worker {worker.id} did not become ready within {self.boot_timeout} seconds")
+
+    async def assign(self, worker: WarmWorker, session: dict):
+        async with self.aiohttp_session.post(
+            f"{worker.address}/start", json=session, headers=bearer_headers(WORKER_TOKEN), timeout=10
+        ) as res:
+            if res.status != 200:
+                raise Exception(f"Worker refused the session: {res.status} {await res.text()}")
+
+    async def destroy_worker(self, worker: WarmWorker):
+        await self.fly.destroy_machine(worker.id)
+
+
+async def place_session(record: SessionRecord, room: ProvisionedRoom, client_region: Optional[str]) -> Placement:
+    """
+    Picks the region of the session's worker, from the room's media region, the client's region, the load of each
+    region and the warm workers idling in it. The session counts towards the region's load from then on, the load is
+    read and the region reserved atomically, so that concurrent requests can't overshoot a region's capacity.
+    """
+    warm = {region: pool.idle_workers for region, pool in warm_pools.items()}
+    placement: Optional[Placement] = None
+
+    def pick(load: Counter) -> Optional[str]:
+        nonlocal placement
+        placement = placement_scheduler.place(getattr(room.room.config, "geo", None), client_region, load, warm)
+        return placement.region if placement else None
+
+    if not await registries["sessions"].place(record, pick):
+        raise HTTPException(status_code=503, detail="No region has capacity left")
+    return placement
+
+
+async def launch_session(session: dict, region: Optional[str] = None) -> Tuple[str, Optional[Liveness]]:
+    """
+    Starts a bot for the session and returns where it runs, with a check whether it's still running.
+    Fly machines are started in `region`.
+    """
+    room_url, token = session["room_url"], session["token"]
+
+    # Launch a new fly.io machine, or run as a shell process (not recommended)
+    run_as_process = os.getenv("RUN_AS_PROCESS", False)
+    if run_as_process:
+        print("Running as process")
+    else:
+        print("Running as VM")
+
+    if run_as_process and FORK_SERVER_SOCKET:
+        try:
+            pid = await fork_session(session)
+            logger.info(f"Fork server started session {pid} for room: {room_url}")
+            return f"pid:{pid}", pid_alive(pid)
+        except Exception as e:
+            logger.warning(f"Fork server unavailable, starting a process instead: {e}")
 
-    logger.info("Waiting for machine to enter 'started' state")
-    start_time = time.time()
-    while time.time() - start_time < spawn_timeout:
+    if run_as_process:
         try:
-            state = check_machine_state(vm_id)
-            if state == "started":
-                logger.info(f"Machine successfully started and joined room: {room_url}")
-                return
+            env = os.environ.copy()
+            if session["system_prompt"]:
+                env["SYSTEM_PROMPT"] = session["system_prompt"]
+            env["BOT_NAME"] = session["bot_name"]
+            # check if we run inside a docker container
+            if os.path.exists("/app/.venv/bin/python"):
+                cmd = f"/app/.venv/bin/python bot.py -u {room_url} -t {token}"
+            else:
+                cmd = f"pipenv run python bot.py -u {room_url} -t {token}"
+            process = subprocess.Popen(
+                [cmd],
+                shell=True,
+                bufsize=1,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                env=env,
+            )  # nosec B602
         except Exception as e:
-            logger.warning(f"Error checking machine state: {e}")
-        time.sleep(10)  # Wait 10 seconds before checking again
+            raise HTTPException(status_code=500, detail=f"Failed to start subprocess: {e}")
 
-    logger.error(f"Bot was unable to enter started state within {spawn_timeout} seconds")
-    raise Exception(f"Bot was unable to enter started state within {spawn_timeout} seconds")
+        async def process_alive() -> bool:
+            return process.poll() is None
+
+        return f"pid:{process.pid}", process_alive
+
+    if WORKER_HOST_URL:
+        try:
+            session_id = await start_hosted_session(session)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to start session on worker host: {e}")
+        return f"host:{session_id}", hosted_session_alive(session_id)
+
+    region = region or FLY_PRIMARY_REGION
+    if region in warm_pools and (warm_worker := await warm_pools[region].launch(session)):
+        return f"fly:{warm_worker.id}", machine_alive(warm_worker.id)
+    try:
+        machine_id = await spawn_fly_machine(
+            room_url, token, session["bot_name"], session["system_prompt"], session["sprite_folder"], region
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to spawn VM: {e}")
+    return f"fly:{machine_id}", machine_alive(machine_id)
 
 
 @app.post("/start_bot")
@@ -222,78 +505,78 @@ async def start_bot(request: Request) -> JSONResponse:
         system_prompt = data.get("system_prompt") or os.getenv("SYSTEM_PROMPT")
         sprite_folder = data.get("sprite_folder")
         bot_name = data.get("name") or os.getenv("BOT_NAME", "Chatbot")
+        region = data.get("region")
     except Exception:
         system_prompt = os.getenv("SYSTEM_PROMPT")
         sprite_folder = None
         bot_name = os.getenv("BOT_NAME", "Chatbot")
+        region = None
+    # Fly's proxy adds the region of the edge the client connected to
+    region = region or request.headers.get("fly-region")
+
+    client = request.client.host if request.client else "unknown"
+    if BEHIND_FLY_PROXY:
+        client = request.headers.get("fly-client-ip") or client
+    registry = registries["sessions"]
+    try:
+        record = await registry.admit(client)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
 
-    room = await create_room()
-
-    # Give the agent a token to join the session
-    token = await daily_helpers["rest"].get_token(room.url, MAX_SESSION_TIME)
-
-    if not room or not token:
-        raise HTTPException(status_code=500, detail=f"Failed to get token for room: {room.url}")
-
-    # Launch a new fly.io machine, or run as a shell process (not recommended)
-    run_as_process = os.getenv("RUN_AS_PROCESS", False)
-    if run_as_process:
-        print("Running as process")
-    else:
-        print("Running as VM")
-
-    if run_as_process:
-        try:
-            env = os.environ.copy()
-            if system_prompt:
-                env["SYSTEM_PROMPT"] = system_prompt
-            env["BOT_NAME"] = bot_name
-            # check if we run inside a docker container
-            if os.path.exists("/app/.venv/bin/python"):
-                cmd = f"/app/.venv/bin/python bot.py -u {room.url} -t {token}"
-            else:
-                cmd = f"pipenv run python bot.py -u {room.url} -t {token}"
-            subprocess.Popen(
-                [cmd],
-                shell=True,
-                bufsize=1,
-                cwd=os.path.dirname(os.path.abspath(__file__)),
-                env=env,
-            )  # nosec B602
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to start subprocess: {e}")
-    else:
-        try:
-            spawn_fly_machine(room.url, token, bot_name, system_prompt, sprite_folder)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to spawn VM: {e}")
-
-    # Grab a token for the user to join with
-    user_token = await daily_helpers["rest"].get_token(room.url, MAX_SESSION_TIME)
+    try:
+        # Get a room with tokens for the agent and the user to join the session
+        room = await provision_room()
+        session = {
+            "room_url": room.url,
+            "token": room.bot_token,
+            "bot_name": bot_name,
+            "system_prompt": system_prompt,
+            "sprite_folder": sprite_folder,
+        }
+        placement = None
+        if not os.getenv("RUN_AS_PROCESS", False) and not WORKER_HOST_URL:
+            placement = await place_session(record, room, region)
+        worker, alive = await launch_session(session, placement.region if placement else None)
+    except BaseException:
+        await registry.end(record.id, "failed")
+        raise
+    await registry.started(record, room.url, worker, alive, placement.region if placement else "")
+    if placement:
+        logger.info(f"Session {record.id} ({worker}) placed: {json.dumps(placement.to_dict())}")
 
     return JSONResponse(
         {
             "room_url": room.url,
-            "token": user_token,
+            "token": room.user_token,
         }
     )
 
 
-@app.get("/{path_name:path}", response_class=FileResponse)
-async def catch_all(path_name: Optional[str] = ""):
-    if path_name == "":
-        return FileResponse(f"{STATIC_DIR}/index.html")
-
-    file_path = Path(STATIC_DIR) / (path_name or "")
-
-    if file_path.is_file():
-        return file_path
+@app.get("/sessions")
+async def list_sessions(request: Request) -> JSONResponse:
+    registry = registries["sessions"]
+    records = await registry.sessions()
+    result = {
+        "states": Counter(r.state for r in records),
+        "regions": Counter(r.region for r in records if r.state in ACTIVE_STATES and r.region),
+        "waiting": registry.waiting,
+        "metrics": registry.metrics,
+        "placements": placement_scheduler.metrics,
+    }
+    # The records hold the public room URLs and the client IPs, only for admins
+    authorization = request.headers.get("authorization", "")
+    if ADMIN_TOKEN and secrets.compare_digest(authorization.encode(), f"Bearer {ADMIN_TOKEN}".encode()):
+        result["sessions"] = [record.to_dict() for record in records]
+    return JSONResponse(result)
 
-    html_file_path = file_path.with_suffix(".html")
-    if html_file_path.is_file():
-        return FileResponse(html_file_path)
 
-    raise HTTPException(status_code=404, detail="File not found")
+@app.get("/{path_name:path}")
+@app.get("/static/{path_name:path}")
+async def catch_all(request: Request, path_name: Optional[str] = "") -> Response:
+    response = static_files["frontend"].response(path_name or "", request.headers)
+    if not response:
+        raise HTTPException(status_code=404, detail="File not found")
+    return response
 
 
 async def deploy_bot(bot_name: str):
@@ -312,14 +595,17 @@ async def deploy_bot(bot_name: str):
         return False
 
     # Deploy the bot to Fly
+    fly_helpers["machines"] = create_fly_client()
     try:
         system_prompt = os.getenv("SYSTEM_PROMPT", "You're a friendly chatbot.")
         sprite_folder = os.getenv("SPRITE_FOLDER", "robot")
-        spawn_fly_machine(room.url, token, bot_name, system_prompt, sprite_folder)
+        await spawn_fly_machine(room.url, token, bot_name, system_prompt, sprite_folder)
         print(f"Bot '{bot_name}' deployed successfully to room: {room.url}")
     except Exception as e:
         print(f"Failed to spawn VM: {e}")
         return False
+    finally:
+        await fly_helpers.pop("machines").close()
 
     return True
 
@@ -0,0 +1,136 @@
+import asyncio
+import re
+from typing import Optional
+
+from loguru import logger
+
+from pipecat.frames.frames import (
+    EndFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    StartInterruptionFrame,
+    TextFrame,
+    TTSSpeakFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+# German abbreviations that end in a period without ending the sentence
+ABBREVIATIONS = {
+    "abb", "abs", "allg", "bzgl", "bzw", "ca", "d", "dr", "evtl", "fr", "ggf", "hr", "inkl", "jh", "jhd", "max",
+    "min", "mind", "mio", "mrd", "nr", "o", "prof", "s", "sog", "st", "std", "str", "tel", "u", "usw", "v", "vgl",
+    "z", "zb", "zzgl",
+}  # fmt: skip
+
+# Sentence ends, and clause boundaries that are only used once a chunk is long enough
+_SENTENCE_END = re.compile(r"(?:\.\.\.|…|[.!?])[\"'“”»«)\]]*(?=\s|$)")
+_CLAUSE_END = re.compile(r"(?:[,;:]|\s[–—-])[\"'“”»«)\]]*(?=\s|$)")
+# Punctuation after a digit at the very end may still turn into "3,5" or "10:30"
+_OPEN_NUMBER = re.compile(r"\d[.,:]$")
+_WORD_BEFORE_PERIOD = re.compile(r"(\S*)\.$")
+
+
+def _is_sentence_end(text: str, end: int) -> bool:
+    """
+    Tells whether the period, question or exclamation mark before `end` ends a sentence.
+    """
+    mark = text[:end].rstrip("\"'“”»«)]")
+    if not mark.endswith(".") or mark.endswith(".."):
+        return True
+    word = _WORD_BEFORE_PERIOD.search(mark).group(1).lstrip("\"'„“»«([")
+    # Ordinals and dates ("am 3. Oktober", "18.10.") and abbreviations ("z.B.", "usw.")
+    if not word or word[-1].isdigit() or "." in word:
+        return False
+    return word.lower() not in ABBREVIATIONS
+
+
+def find_clause_boundary(text: str, min_chars: int) -> int:
+    """
+    Returns the end of the earliest chunk of `text` that can be spoken on its own, or 0.
+
+    A chunk ends at a sentence end, or at a comma, semicolon, colon or dash once it is at
+    least `min_chars` long. Punctuation must be followed by whitespace or end the text,
+    and punctuation after a digit at the end of the text waits for the next character, so
+    "3,5" or "10:30" are never split, even while they are still streaming in.
+    """
+    if _OPEN_NUMBER.search(text):
+        text = text[:-1]
+    ends = [m.end() for m in _SENTENCE_END.finditer(text) if _is_sentence_end(text, m.end())]
+    ends += [m.end() for m in _CLAUSE_END.finditer(text) if m.end() >= min_chars]
+    return min(ends, default=0)
+
+
+class ClauseAggregator(FrameProcessor):
+    """
+    This frame processor sits between the LLM and the TTS and hands the response to the
+    TTS clause by clause.
+
+    The TTS services aggregate text until a sentence ends, so with long German sentences
+    the first audio waits for the whole first sentence. This processor pushes a
+    TTSSpeakFrame, which the TTS speaks and flushes right away, as soon as the text has
+    a safe boundary (see `find_clause_boundary`). If no boundary shows up within
+    `max_wait` seconds, the text is flushed up to the last complete word. Whatever is
+    left is flushed when the response ends.
+
+    `metrics` counts the chunks by how they were flushed.
+    """
+
+    def __init__(self, min_chars: int = 20, max_wait: float = 0.6):
+        super().__init__()
+        self.min_chars = min_chars
+        self.max_wait = max_wait
+        self._text = ""
+        self._timer: Optional[asyncio.Task] = None
+        self.metrics = {"boundary": 0, "timeout": 0, "end": 0}
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, TextFrame):
+            await self._add_text(frame.text)
+        elif isinstance(frame, StartInterruptionFrame):
+            self._reset()
+            await self.push_frame(frame, direction)
+        elif isinstance(frame, (LLMFullResponseEndFrame, EndFrame)):
+            await self._flush(len(self._text), "end")
+            await self.push_frame(frame, direction)
+        else:
+            await self.push_frame(frame, direction)
+
+    async def _add_text(self, text: str):
+        self._text += text
+        while end := find_clause_boundary(self._text, self.min_chars):
+            await self._flush(end, "boundary")
+        # The wait starts over with each chunk
+        if self._text.strip() and not self._timer:
+            self._timer = asyncio.create_task(self._flush_after_max_wait())
+
+    async def _flush_after_max_wait(self):
+        await asyncio.sleep(self.max_wait)
+        # Don't cut a word that is still streaming in
+        end = len(self._text) if self._text[-1:].isspace() else self._text.rfind(" ")
+        if end > 0:
+            await self._flush(end, "timeout")
+        else:
+            self._timer = None
+
+    async def _flush(self, end: int, reason: str):
+        chunk, self._text = self._text[:end], self._text[end:].lstrip()
+        if self._timer and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        # Leftover punctuation, e.g. the rest of an ellipsis, isn't worth a TTS request
+        if any(c.isalnum() for c in chunk):
+            self.metrics[reason] += 1
+            logger.debug(f"Flushing clause ({reason}): [{chunk.strip()}]")
+            await self.push_frame(TTSSpeakFrame(chunk.strip()))
+
+    def _reset(self):
+        self._text = ""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    async def cleanup(self):
+        await super().cleanup()
+        self._reset()
+        logger.info(f"Clause aggregator metrics: {self.metrics}")
@@ -0,0 +1,155 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
+from loguru import logger
+from openai import AsyncOpenAI
+
+from pipecat.frames.frames import Frame, LLMMessagesFrame
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+try:
+    import tiktoken
+
+    # Downloads the encoding on first use, unless it is in TIKTOKEN_CACHE_DIR
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception as e:
+    logger.warning(f"Token counts fall back to an estimate of four characters per token: {e}")
+    _encoding = None
+
+# Tokens a chat message costs on top of its content
+MESSAGE_OVERHEAD = 4
+
+Summarizer = Callable[[str, List[dict]], Awaitable[str]]
+
+
+def count_tokens(message: dict) -> int:
+    """
+    Counts the tokens of a chat message. Without the tiktoken encoding, this estimates four characters per token.
+    """
+    content = message.get("content") or ""
+    if not isinstance(content, str):
+        content = str(content)
+    if _encoding:
+        return MESSAGE_OVERHEAD + len(_encoding.encode(content))
+    return MESSAGE_OVERHEAD + len(content) // 4 + 1
+
+
+class OpenAISummarizer:
+    """
+    Folds evicted messages into the running summary of the conversation.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4o-mini", max_tokens: int = 400):
+        self.client = AsyncOpenAI(api_key=api_key)
+        self.model = model
+        self.max_tokens = max_tokens
+
+    async def __call__(self, summary: str, messages: List[dict]) -> str:
+        transcript = "\n".join(f"{m['role']}: {m.get('content') or ''}" for m in messages)
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You maintain a concise summary of a moderated group conversation. Keep who said what, "
+                    "open questions and decisions. Answer with the updated summary only, in the language of the "
+                    "conversation.",
+                },
+                {"role": "user", "content": f"Summary so far:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+            ],
+        )
+        return response.choices[0].message.content.strip()
+
+
+class ContextWindow(FrameProcessor):
+    """
+    Keeps the context sent to the LLM within a token budget, so that the LLM's
+    latency and cost don't grow with the length of the session.
+
+    The conversation's `messages` list itself is left untouched, the loggers still
+    see the whole transcript. Each LLMMessagesFrame is replaced by one holding the
+    pinned system prompt, a summary of the evicted turns and the most recent
+    messages that fit into `max_tokens`. Token counts are kept per message and
+    only computed for new ones.
+
+    Evicted messages are folded into the summary by `summarizer` in the background;
+    until that is done, the window goes out with the previous summary.
+    """
+
+    def __init__(self, messages: List[dict], max_tokens: int = 3000, summarizer: Optional[Summarizer] = None):
+        super().__init__()
+        self.messages = messages
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.summary = ""
+        # The system prompt from get_llm_base_prompt is never evicted
+        self._pinned = 1 if messages and messages[0]["role"] == "system" else 0
+        self._counts: List[int] = []
+        self._start = self._pinned
+        self._summarized_until = self._pinned
+        self._summary_tokens = 0
+        self._summary_task: Optional[asyncio.Task] = None
+        self.metrics = {"evicted": 0, "summaries": 0, "summary_failures": 0, "context_tokens": 0}
+
+    def context(self) -> List[dict]:
+        """
+        Returns the messages to send to the LLM, evicting the oldest ones that no longer fit.
+        """
+        for message in self.messages[len(self._counts) :]:
+            self._counts.append(count_tokens(message))
+
+        budget = self.max_tokens - sum(self._counts[: self._pinned]) - self._summary_tokens
+        start = len(self.messages)
+        tokens = 0
+        # Walk back from the newest message, but always keep the newest one
+        while start > self._start and (start == len(self.messages) or tokens + self._counts[start - 1] <= budget):
+            start -= 1
+            tokens += self._counts[start]
+
+        if start > self._start:
+            self.metrics["evicted"] += start - self._start
+            logger.debug(f"Evicted {start - self._start} messages from the LLM context")
+            self._start = start
+            if self.summarizer and not self._summary_task:
+                self._summary_task = asyncio.create_task(self._summarize())
+
+        context = self.messages[: self._pinned]
+        if self.summary:
+            context.append(self._summary_message())
+        context.extend(self.messages[self._start :])
+        self.metrics["context_tokens"] = sum(self._counts[: self._pinned]) + self._summary_tokens + tokens
+        return context
+
+    def _summary_message(self) -> dict:
+        return {"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"}
+
+    async def _summarize(self):
+        try:
+            while self._summarized_until < self._start:
+                end = self._start
+                try:
+                    self.summary = await self.summarizer(self.summary, self.messages[self._summarized_until : end])
+                except Exception as e:
+                    # The messages are retried with the next eviction
+                    self.metrics["summary_failures"] += 1
+                    logger.warning(f"Unable to summarize evicted messages: {e}")
+                    return
+                self._summary_tokens = count_tokens(self._summary_message())
+                self._summarized_until = end
+                self.metrics["summaries"] += 1
+        finally:
+            self._summary_task = None
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, LLMMessagesFrame):
+            # A speculative frame carries a candidate user turn on top of the conversation
+            frame = type(frame)(self.context() + frame.messages[len(self.messages) :])
+        await self.push_frame(frame, direction)
+
+    async def cleanup(self):
+        await super().cleanup()
+        if self._summary_task:
+            self._summary_task.cancel()
@@ -0,0 +1,190 @@
+import asyncio
+import random
+import time
+from typing import Optional
+
+import aiohttp
+from loguru import logger
+
+# The machines API caps a single wait request at 60 seconds
+MAX_WAIT_TIMEOUT = 60
+
+
+class FlyAPIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Fly API error {status}: {message}")
+        self.status = status
+
+
+def transient(error: Exception) -> bool:
+    """
+    Whether a failed request may succeed when retried: connection errors, timeouts, 429s and 5xx responses.
+    """
+    if isinstance(error, FlyAPIError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+class RateLimiter:
+    """
+    A token bucket that allows `rate` requests per second with bursts of up to `burst` requests.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class FlyMachinesClient:
+    """
+    An asyncio client for the Fly machines API.
+
+    Requests share one pooled aiohttp session and go through a client-side rate
+    limiter. The image of the app's machines is cached for `image_ttl` seconds,
+    and waiting for a machine state uses the API's blocking wait endpoint
+    instead of polling.
+
+    Idempotent requests (GETs, including the waits) that fail with a transient
+    error are retried up to `max_retries` times with exponential backoff and
+    jitter. Every attempt goes through the rate limiter.
+    """
+
+    def __init__(
+        self,
+        api_host: str,
+        app_name: str,
+        api_key: str,
+        rate: float = 5,
+        burst: int = 10,
+        image_ttl: float = 5 * 60,
+        max_connections: int = 20,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 10.0,
+    ):
+        self.api_host = api_host
+        self.app_name = app_name
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        self.image_ttl = image_ttl
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = RateLimiter(rate, burst)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._image: Optional[str] = None
+        self._image_expires = 0.0
+        self._image_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector, headers=self.headers, timeout=aiohttp.ClientTimeout(total=90)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def _request(self, method: str, path: str, **kwargs):
+        attempts = 1 + (self.max_retries if method == "GET" else 0)
+        for attempt in range(1, attempts + 1):
+            try:
+                return await self._send(method, path, **kwargs)
+            except (FlyAPIError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == attempts or not transient(e):
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+                delay *= random.uniform(0.5, 1.0)  # nosec B311
+                logger.warning(f"Fly API {method} {path} failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def _send(self, method: str, path: str, **kwargs):
+        await self.rate_limiter.acquire()
+        url = f"{self.api_host}/apps/{self.app_name}{path}"
+        async with self.session.request(method, url, **kwargs) as res:
+            if res.status >= 300:
+                raise FlyAPIError(res.status, await res.text())
+            if res.content_type == "application/json":
+                return await res.json()
+            return await res.text()
+
+    async def list_machines(self) -> list:
+        return await self._request("GET", "/machines")
+
+    async def get_machine(self, vm_id: str) -> dict:
+        return await self._request("GET", f"/machines/{vm_id}")
+
+    async def get_image(self) -> str:
+        """
+        Returns the image of the app's machines, so that workers run the same image as the bot runner.
+        """
+        async with self._image_lock:
+            if self._image is None or time.monotonic() >= self._image_expires:
+                logger.info("Fetching current machine image from Fly")
+                machines = await self.list_machines()
+                if not machines:
+                    raise FlyAPIError(404, f"No machines found for app {self.app_name}")
+                self._image = machines[0]["config"]["image"]
+                self._image_expires = time.monotonic() + self.image_ttl
+                logger.info(f"Using image: {self._image}")
+            return self._image
+
+    async def create_machine(self, worker_props: dict) -> dict:
+        machine = await self._request("POST", "/machines", json=worker_props)
+        logger.info(f"Machine spawned with ID: {machine['id']}")
+        return machine
+
+    async def wait_for_state(self, vm_id: str, state: str = "started", timeout: float = 300):
+        """
+        Waits for a machine to reach a state, using the machines API wait endpoint.
+
+        Raises:
+            TimeoutError: If the machine doesn't reach the state within `timeout` seconds.
+        """
+        logger.info(f"Waiting for machine {vm_id} to enter '{state}' state")
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            wait_timeout = max(1, min(MAX_WAIT_TIMEOUT, int(remaining)))
+            try:
+                await self._request(
+                    "GET", f"/machines/{vm_id}/wait", params={"state": state, "timeout": str(wait_timeout)}
+                )
+                logger.info(f"Machine {vm_id} state: {state}")
+                return
+            except FlyAPIError as e:
+                # 408 means the wait timed out on the server side, keep waiting
+                if e.status != 408:
+                    raise
+        raise TimeoutError(f"Machine {vm_id} did not enter '{state}' state within {timeout} seconds")
+
+    async def destroy_machine(self, vm_id: str, force: bool = True):
+        logger.info(f"Destroying machine {vm_id}")
+        await self._request("DELETE", f"/machines/{vm_id}", params={"force": str(force).lower()})
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+import argparse
+import asyncio
+import datetime
+import gc
+import importlib
+import json
+import os
+import signal
+import socket
+from typing import Dict, List
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from shared_vad import SharedSileroVADAnalyzer, silero_session
+from talking_animation import load_atlas
+
+load_dotenv(override=True)
+
+FORK_SERVER_SOCKET = os.getenv("FORK_SERVER_SOCKET", "/tmp/mds-fork-server.sock")
+
+
+class ForkServer:
+    """
+    A zygote for RUN_AS_PROCESS sessions. It imports the bot with all of its
+    dependencies and loads the VAD model and sprite atlases once, then forks a child
+    per session, which starts joining the room right away and shares the parent's
+    memory copy-on-write.
+
+    Sessions are requested with one JSON line on a Unix socket, with `room_url`,
+    `token` and optionally `bot_name`, `system_prompt` and `sprite_folder`. The
+    reply is a JSON line with the child's `pid`, or an `error`.
+    """
+
+    def __init__(self, path: str = FORK_SERVER_SOCKET):
+        self.path = path
+        self.children: Dict[int, str] = {}
+        self.running = False
+        self._server: socket.socket | None = None
+        self._bot = None
+
+    def preload(self, sprite_folders: List[str]):
+        self._bot = importlib.import_module("bot")
+        silero_session()
+        for folder in sprite_folders:
+            load_atlas(folder)
+        # Keep the garbage collector from touching, and so copying, the preloaded objects in the children
+        gc.freeze()
+
+    def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self._server.listen()
+        # Wake up regularly to reap children
+        self._server.settimeout(1)
+        self.running = True
+        logger.info(f"Fork server listening on {self.path}")
+        try:
+            while self.running:
+                self._reap()
+                try:
+                    conn, _ = self._server.accept()
+                except (socket.timeout, InterruptedError):
+                    continue
+                with conn:
+                    self._handle(conn)
+        finally:
+            self._server.close()
+            os.unlink(self.path)
+            self._shutdown()
+
+    def _stop(self, signum, frame):
+        self.running = False
+
+    def _handle(self, conn: socket.socket):
+        conn.settimeout(5)
+        try:
+            request = json.loads(conn.makefile("rb").readline())
+            if not request.get("room_url") or not request.get("token"):
+                raise ValueError("room_url and token are required")
+            reply = {"pid": self._fork(request, conn)}
+        except Exception as e:
+            logger.warning(f"Unable to start session: {e}")
+            reply = {"error": str(e)}
+        conn.sendall(json.dumps(reply).encode() + b"\n")
+
+    def _fork(self, request: dict, conn: socket.socket) -> int:
+        pid = os.fork()
+        if pid:
+            self.children[pid] = request["room_url"]
+            logger.info(f"Forked session {pid} for room {request['room_url']} ({len(self.children)} running)")
+            return pid
+
+        exit_code = 0
+        try:
+            conn.close()
+            self._server.close()
+            self._run_child(request)
+        except BaseException as e:
+            logger.exception(f"Session failed: {e}")
+            exit_code = 1
+        finally:
+            # Never return into the parent's accept loop
+            os._exit(exit_code)
+
+    def _run_child(self, request: dict):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        self._bot.setup_logging(f"{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}-{os.getpid()}")
+        asyncio.run(
+            self._bot.main(
+                request["room_url"],
+                request["token"],
+                request.get("bot_name") or os.getenv("BOT_NAME", "Chatbot"),
+                system_prompt=request.get("system_prompt"),
+                sprite_folder=request.get("sprite_folder"),
+                vad_analyzer=SharedSileroVADAnalyzer(),
+            )
+        )
+
+    def _reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            room_url = self.children.pop(pid, None)
+            logger.info(f"Session {pid} for room {room_url} exited with status {os.waitstatus_to_exitcode(status)}")
+
+    def _shutdown(self):
+        # Let the sessions leave their rooms
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in list(self.children):
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.children.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MDS Bot Fork Server")
+    parser.add_argument("--socket", type=str, default=FORK_SERVER_SOCKET, help="Path of the Unix socket")
+    parser.add_argument(
+        "--sprites",
+        nargs="*",
+        default=[os.getenv("SPRITE_FOLDER", "parkingmeter")],
+        help="Sprite folders to load up front",
+    )
+    config = parser.parse_args()
+
+    server = ForkServer(config.socket)
+    server.preload(config.sprites)
+    server.serve()
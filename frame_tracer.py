@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import signal
+import time
+import weakref
+from collections import deque
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from pipecat.frames.frames import (
+    BotSpeakingFrame,
+    ErrorFrame,
+    Frame,
+    InputAudioRawFrame,
+    InputImageRawFrame,
+    OutputAudioRawFrame,
+    OutputImageRawFrame,
+    SpriteFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+# Frames that pass many times a second, only every `sample_every`th of each type is recorded
+HIGH_RATE_FRAMES = (
+    InputAudioRawFrame,
+    OutputAudioRawFrame,
+    InputImageRawFrame,
+    OutputImageRawFrame,
+    SpriteFrame,
+    BotSpeakingFrame,
+)
+
+_DIRECTIONS = {FrameDirection.DOWNSTREAM.value: "down", FrameDirection.UPSTREAM.value: "up"}
+
+# Every live tracer, so that a signal can dump them all
+_tracers: "weakref.WeakSet[FrameTracer]" = weakref.WeakSet()
+
+
+class FrameTracer:
+    """
+    Records compact metadata of the frames passing the TraceProbes of a session into
+    a ring buffer holding the last `capacity` records: the time, the probe, the
+    direction, the frame type and the frame id. High-rate audio and video frames
+    are sampled.
+
+    Nothing is written until the trace is dumped: on an ErrorFrame, on SIGUSR1 (see
+    `install_dump_signal`) or on request, e.g. through the worker host.
+    """
+
+    def __init__(self, name: str = "session", capacity: int = 4096, sample_every: int = 50, log_dir: str = "./logs"):
+        self.name = name
+        self.sample_every = sample_every
+        self.log_dir = log_dir
+        self._records: deque = deque(maxlen=capacity)
+        self._seen: Dict[type, int] = {}
+        self._errors: set = set()
+        self.metrics = {"recorded": 0, "sampled_out": 0, "dumps": 0}
+        _tracers.add(self)
+
+    def record(self, probe: str, frame: Frame, direction: FrameDirection):
+        if isinstance(frame, HIGH_RATE_FRAMES):
+            frame_type = type(frame)
+            seen = self._seen.get(frame_type, 0)
+            self._seen[frame_type] = seen + 1
+            if seen % self.sample_every:
+                self.metrics["sampled_out"] += 1
+                return
+        self._records.append((time.time(), probe, direction.value, type(frame).__name__, frame.id))
+        self.metrics["recorded"] += 1
+
+    def records(self) -> List[dict]:
+        return [
+            {"time": t, "probe": probe, "direction": _DIRECTIONS[direction], "frame": frame, "id": frame_id}
+            for t, probe, direction, frame, frame_id in self._records
+        ]
+
+    def dump(self, reason: str) -> Optional[str]:
+        """
+        Writes the buffered records as JSON Lines to the log directory and returns the file's path.
+        """
+        if not self._records:
+            return None
+        os.makedirs(self.log_dir, exist_ok=True)
+        path = os.path.join(self.log_dir, f"frames-{self.name}-{reason}-{time.strftime('%Y%m%d-%H%M%S')}.jsonl")
+        with open(path, "w") as f:
+            for record in self.records():
+                f.write(json.dumps(record) + "\n")
+        self.metrics["dumps"] += 1
+        logger.info(f"Dumped {len(self._records)} frame records ({reason}) to {path}")
+        return path
+
+    def error(self, frame: ErrorFrame):
+        # An error passes several probes on its way upstream, dump once
+        if frame.id not in self._errors:
+            self._errors.add(frame.id)
+            self.dump("error")
+
+
+def dump_all(reason: str) -> List[str]:
+    return [path for tracer in list(_tracers) if (path := tracer.dump(reason))]
+
+
+def install_dump_signal(signum: int = signal.SIGUSR1):
+    """
+    Dumps the traces of all sessions of the process when it receives `signum`.
+    """
+    try:
+        asyncio.get_running_loop().add_signal_handler(signum, dump_all, "signal")
+    except (NotImplementedError, RuntimeError) as e:
+        # Not supported on this platform, or not on the main thread
+        logger.warning(f"Can't dump frame traces on signal {signum}: {e}")
+
+
+class TraceProbe(FrameProcessor):
+    """
+    This frame processor records every frame passing it, in both directions, on a
+    FrameTracer and dumps the trace when an ErrorFrame passes.
+    """
+
+    def __init__(self, tracer: FrameTracer, name: str):
+        super().__init__()
+        self._tracer = tracer
+        self._name = name
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        self._tracer.record(self._name, frame, direction)
+        if isinstance(frame, ErrorFrame):
+            self._tracer.error(frame)
+        await self.push_frame(frame, direction)
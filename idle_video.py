@@ -0,0 +1,107 @@
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from loguru import logger
+
+from pipecat.frames.frames import OutputImageRawFrame
+from pipecat.transports.services.daily import DailyOutputTransport, DailyTransport
+
+
+@dataclass(frozen=True)
+class VideoFpsProfile:
+    # Camera frame rate while the image changes, e.g. during a sprite animation
+    fps: int = 30
+    # Rate at which an unchanged image is re-sent, so that late joiners get a picture
+    idle_fps: float = 1
+    # Frames sent at the full rate after a change, giving the encoder time to sharpen the new image
+    refresh_frames: int = 5
+
+
+FPS_PROFILES = {
+    # Re-send every frame, like the plain transport
+    "full": VideoFpsProfile(fps=30, idle_fps=30, refresh_frames=0),
+    "balanced": VideoFpsProfile(fps=30, idle_fps=1, refresh_frames=5),
+    "low": VideoFpsProfile(fps=15, idle_fps=0.5, refresh_frames=3),
+}
+
+
+def get_fps_profile(name: str) -> VideoFpsProfile:
+    if name not in FPS_PROFILES:
+        raise ValueError(f"Unknown video fps profile {name!r}, expected one of {', '.join(FPS_PROFILES)}")
+    return FPS_PROFILES[name]
+
+
+class IdleVideoPacer:
+    """
+    Decides which camera frames are worth sending.
+
+    A changed image is always sent, followed by `refresh_frames` repeats at the full
+    rate. After that an unchanged image is only re-sent at `idle_fps`.
+    """
+
+    def __init__(self, profile: VideoFpsProfile, clock: Callable[[], float] = time.monotonic):
+        self.profile = profile
+        self._clock = clock
+        self._last: Optional[OutputImageRawFrame] = None
+        self._last_sent = 0.0
+        self._refresh_left = 0
+        self.metrics = {"sent": 0, "skipped": 0, "changes": 0}
+
+    def _unchanged(self, frame: OutputImageRawFrame) -> bool:
+        last = self._last
+        # Sprites are cached frames, so an unchanged image is usually the very same object
+        return last is not None and (
+            frame.image is last.image or (frame.size == last.size and frame.image == last.image)
+        )
+
+    def should_send(self, frame: OutputImageRawFrame) -> bool:
+        now = self._clock()
+        if not self._unchanged(frame):
+            self._last = frame
+            self._refresh_left = self.profile.refresh_frames
+            self.metrics["changes"] += 1
+        elif self._refresh_left > 0:
+            self._refresh_left -= 1
+        elif self.profile.idle_fps <= 0 or now - self._last_sent < 1 / self.profile.idle_fps:
+            self.metrics["skipped"] += 1
+            return False
+        self._last_sent = now
+        self.metrics["sent"] += 1
+        return True
+
+
+class IdleDailyOutputTransport(DailyOutputTransport):
+    def __init__(self, *args, fps_profile: VideoFpsProfile, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pacer = IdleVideoPacer(fps_profile)
+
+    async def write_frame_to_camera(self, frame: OutputImageRawFrame):
+        if self.pacer.should_send(frame):
+            if isinstance(frame.image, memoryview):
+                # Sprite atlas frames are views into a shared map, but the Daily camera only takes bytes
+                frame = OutputImageRawFrame(image=frame.image.tobytes(), size=frame.size, format=frame.format)
+            await super().write_frame_to_camera(frame)
+
+    async def cleanup(self):
+        logger.debug(f"{self} camera frames: {self.pacer.metrics}")
+        await super().cleanup()
+
+
+class IdleDailyTransport(DailyTransport):
+    """
+    A DailyTransport whose camera only re-sends an unchanged image at the idle rate of
+    the fps profile. The camera loop of the output transport still runs at
+    `camera_out_framerate`, but skipped frames are never handed to the encoder.
+    """
+
+    def __init__(self, *args, fps_profile: VideoFpsProfile = FPS_PROFILES["balanced"], **kwargs):
+        super().__init__(*args, **kwargs)
+        self._fps_profile = fps_profile
+
+    def output(self) -> IdleDailyOutputTransport:
+        if not self._output:
+            self._output = IdleDailyOutputTransport(
+                self._client, self._params, name=self._output_name, fps_profile=self._fps_profile
+            )
+        return self._output
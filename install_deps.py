@@ -1,4 +1,8 @@
+import tiktoken
 import torch
 
 # Download (cache) the Silero VAD model
 torch.hub.load(repo_or_dir="snakers4/silero-vad:v5.1", model="silero_vad", force_reload=True)
+
+# Download (cache) the tiktoken encoding used to count the tokens of the context window
+tiktoken.get_encoding("o200k_base")
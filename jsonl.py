@@ -0,0 +1,167 @@
+import glob
+import json
+import os
+import re
+import time
+from typing import Iterable, Iterator, List, Optional
+
+from loguru import logger
+
+_READ_CHUNK_SIZE = 64 * 1024
+
+
+def segment_path(path: str, index: int) -> str:
+    """
+    Returns the path of the rotated segment `index` of a JSONL log. Segment 0 is the path itself.
+
+    Example: segment_path("logs/conversation.jsonl", 2) -> "logs/conversation.2.jsonl"
+    """
+    if index == 0:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{index}{ext}"
+
+
+def segment_paths(path: str) -> List[str]:
+    """
+    Returns the existing segments of a JSONL log in write order.
+    """
+    root, ext = os.path.splitext(path)
+    pattern = re.compile(re.escape(root) + r"\.(\d+)" + re.escape(ext) + "$")
+    rotated = []
+    for candidate in glob.glob(f"{glob.escape(root)}.*{ext}"):
+        match = pattern.match(candidate)
+        if match:
+            rotated.append((int(match.group(1)), candidate))
+    paths = [path] if os.path.exists(path) else []
+    return paths + [p for _, p in sorted(rotated)]
+
+
+class JSONLWriter:
+    """
+    An append-only JSON Lines writer that keeps its file handle open and buffers writes.
+
+    Attributes:
+        path (str): Path of the first segment. Rotated segments are numbered, see `segment_path`.
+        fsync_interval (float | None): None never fsyncs, 0 fsyncs on every flush, a positive
+            value fsyncs on flush at most every `fsync_interval` seconds.
+        max_bytes (int | None): Rotate to a new segment once the current one reaches this size.
+        max_age (float | None): Rotate to a new segment once the current one is this many seconds old.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        buffer_size: int = 64 * 1024,
+        fsync_interval: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        # Append to the last existing segment
+        self._index = max(len(segment_paths(path)) - 1, 0)
+        self._file = None
+        self._opened_at = 0.0
+        self._last_fsync = 0.0
+        self._size = 0
+
+    @property
+    def current_path(self) -> str:
+        return segment_path(self.path, max(self._index - 1, 0))
+
+    def write(self, record: dict):
+        if self._file is None or self._should_rotate():
+            self._rotate()
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        self._file.write(line)
+        self._size += len(line.encode("utf-8"))
+
+    def write_many(self, records: Iterable[dict]):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        """
+        Hands buffered lines to the OS and fsyncs according to the fsync policy.
+        """
+        if self._file is None:
+            return
+        self._file.flush()
+        if self.fsync_interval is not None:
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._file.fileno())
+                self._last_fsync = now
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def _should_rotate(self) -> bool:
+        if self.max_bytes is not None and self._size >= self.max_bytes:
+            return True
+        if self.max_age is not None and time.monotonic() - self._opened_at >= self.max_age:
+            return True
+        return False
+
+    def _rotate(self):
+        self.close()
+        path = segment_path(self.path, self._index)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", buffering=self.buffer_size, encoding="utf-8")
+        self._index += 1
+        self._opened_at = time.monotonic()
+        self._size = self._file.tell()
+        if self._index > 1:
+            logger.debug(f"Rotated JSONL log to {path}")
+
+
+def iter_jsonl(path: str, segments: Optional[List[str]] = None) -> Iterator[dict]:
+    """
+    Streams the records of a JSONL log, including its rotated segments, one line at a time.
+    Pass `segments` if they're known already, finding them lists the log's directory.
+
+    A truncated last line (e.g. after a crash) is skipped with a warning.
+    """
+    for segment in segments if segments is not None else segment_paths(path):
+        with open(segment, encoding="utf-8") as log_file:
+            for line_number, line in enumerate(log_file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    logger.warning(f"Skipping unparseable line {line_number} in {segment}: {e}")
+
+
+def iter_legacy_log(path: str) -> Iterator[dict]:
+    """
+    Streams the records of a log written by the old ConversationLogger format, which
+    concatenates pretty-printed JSON objects separated by ",\\n".
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    with open(path, encoding="utf-8") as log_file:
+        while True:
+            chunk = log_file.read(_READ_CHUNK_SIZE)
+            buffer += chunk
+            while True:
+                buffer = buffer.lstrip(",\n\r\t ")
+                if not buffer:
+                    break
+                try:
+                    record, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    break
+                yield record
+                buffer = buffer[end:]
+            if not chunk:
+                break
+    if buffer.strip():
+        logger.warning(f"Skipping {len(buffer)} trailing unparseable characters in {path}")
@@ -0,0 +1,129 @@
+import json
+import math
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Type
+
+from loguru import logger
+
+from pipecat.frames.frames import (
+    Frame,
+    LLMFullResponseStartFrame,
+    LLMMessagesFrame,
+    OutputAudioRawFrame,
+    TextFrame,
+    TTSAudioRawFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from speculative_llm import SpeculativeLLMMessagesFrame
+
+# The points of a turn, in the order they are reached, and the frame that marks each of them
+STAGES = {
+    "stopped": UserStoppedSpeakingFrame,
+    "aggregated": LLMMessagesFrame,
+    # The LLM starts its answer, only text after this is the answer and not e.g. a greeting
+    "llm_started": LLMFullResponseStartFrame,
+    "llm_first_token": TextFrame,
+    "tts_first_audio": TTSAudioRawFrame,
+    "output_first_audio": OutputAudioRawFrame,
+}
+_PREVIOUS_STAGE = dict(zip(list(STAGES)[1:], STAGES))
+
+# The intervals reported for each turn, between two stages
+INTERVALS = {
+    "aggregation": ("stopped", "aggregated"),
+    "llm": ("aggregated", "llm_first_token"),
+    "tts": ("llm_first_token", "tts_first_audio"),
+    "output": ("tts_first_audio", "output_first_audio"),
+    "total": ("stopped", "output_first_audio"),
+}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Returns the nearest-rank percentile `q` (0-100) of `values`.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class TurnLatencyTracker:
+    """
+    Collects the latency of each turn of a session, from the moment the user stopped
+    speaking until the first audio of the answer reaches the transport.
+
+    LatencyProbes mark the stages of a turn (see STAGES). A stage only counts once per
+    turn and only after the stage before it, so that e.g. audio of a greeting played
+    before the turn was sent to the LLM isn't taken for the answer. Text only counts
+    as the first token once the LLM started its answer (LLMFullResponseStartFrame), as
+    greetings may be plain TextFrames too. Text arriving after that start is still
+    taken for the answer. A turn that ends without an answer
+    still contributes the intervals it completed. The last `max_turns` values of each
+    interval are kept.
+    """
+
+    def __init__(self, max_turns: int = 1000, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._marks: Dict[str, float] = {}
+        self.turns = 0
+        self.intervals: Dict[str, Deque[float]] = {name: deque(maxlen=max_turns) for name in INTERVALS}
+
+    def mark(self, stage: str):
+        if stage == "stopped":
+            # The user may pause and go on before the turn is aggregated, the turn starts at the last pause
+            self._marks = {}
+        elif stage in self._marks or _PREVIOUS_STAGE[stage] not in self._marks:
+            return
+        elif stage == "aggregated":
+            self.turns += 1
+
+        now = self._clock()
+        self._marks[stage] = now
+        for name, (start, end) in INTERVALS.items():
+            if end == stage and start in self._marks:
+                self.intervals[name].append(now - self._marks[start])
+
+    def summary(self) -> dict:
+        """
+        Returns the count and the p50/p95/p99 in milliseconds of each interval.
+        """
+        summary = {"turns": self.turns}
+        for name, values in self.intervals.items():
+            if values:
+                summary[name] = {
+                    "count": len(values),
+                    **{f"p{q}": round(percentile(list(values), q) * 1000, 1) for q in (50, 95, 99)},
+                }
+        return summary
+
+    def log_summary(self, path: Optional[str] = None, labels: Optional[dict] = None):
+        """
+        Logs the summary, with `labels` such as the session and the region, and writes it to `path` if given.
+        """
+        summary = {**(labels or {}), **self.summary()}
+        logger.info(f"Turn latency: {json.dumps(summary)}")
+        if path:
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=4)
+
+
+class LatencyProbe(FrameProcessor):
+    """
+    This frame processor marks a stage of the current turn on a TurnLatencyTracker
+    when a frame of the stage's type passes by. It only adds an isinstance check per
+    frame, so the probes can stay in the pipeline in production.
+    """
+
+    def __init__(self, tracker: TurnLatencyTracker, stage: str):
+        super().__init__()
+        self._tracker = tracker
+        self._stage = stage
+        self._frame_type: Type[Frame] = STAGES[stage]
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, self._frame_type) and not isinstance(frame, SpeculativeLLMMessagesFrame):
+            self._tracker.mark(self._stage)
+        await self.push_frame(frame, direction)
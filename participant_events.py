@@ -0,0 +1,116 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from loguru import logger
+
+# Speaks a phrase template, "{name}" is replaced by the names
+Say = Callable[[str, str], Awaitable[None]]
+
+
+def join_names(names: List[str]) -> str:
+    """
+    Joins names the way they are spoken in German: "Anna", "Anna und Max", "Anna, Max und Lena".
+    """
+    names = [name for name in names if name]
+    if len(names) < 2:
+        return "".join(names)
+    return f"{', '.join(names[:-1])} und {names[-1]}"
+
+
+class ParticipantEventCoalescer:
+    """
+    Merges the joins and leaves of a short time window into a single utterance.
+
+    Every event restarts a `window` second timer, but no event waits longer than
+    `max_delay` seconds, so a steady stream of joins still gets greeted. When the
+    timer fires, everyone who joined is greeted with one `greeting` ("Hallo Anna,
+    Max und Lena!") after one goodbye to everyone who left. Someone leaving within the
+    window they joined in gets neither. Goodbyes are skipped when the last event
+    left the room empty, as nobody would hear them.
+
+    The templates contain a "{name}" placeholder, `goodbye_many` is used when more
+    than one participant left.
+    """
+
+    def __init__(
+        self,
+        say: Say,
+        greeting: str,
+        goodbye: str,
+        goodbye_many: Optional[str] = None,
+        window: float = 1.0,
+        max_delay: float = 3.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._say = say
+        self.greeting = greeting
+        self.goodbye = goodbye
+        self.goodbye_many = goodbye_many or goodbye
+        self.window = window
+        self.max_delay = max_delay
+        self._clock = clock
+        self._joined: List[str] = []
+        self._left: List[str] = []
+        self._room_empty = False
+        self._first_event = 0.0
+        self._last_event = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = {"events": 0, "utterances": 0, "skipped_goodbyes": 0}
+
+    def joined(self, name: str):
+        if name in self._left:
+            # Rejoined within the window, e.g. after reloading the page
+            self._left.remove(name)
+        else:
+            self._joined.append(name)
+        self._room_empty = False
+        self._event()
+
+    def left(self, name: str, room_empty: bool):
+        if name in self._joined:
+            self._joined.remove(name)
+        else:
+            self._left.append(name)
+        self._room_empty = room_empty
+        self._event()
+
+    def _event(self):
+        self.metrics["events"] += 1
+        self._last_event = self._clock()
+        if not self._task:
+            self._first_event = self._last_event
+            self._task = asyncio.create_task(self._flush_when_quiet())
+
+    async def _flush_when_quiet(self):
+        while (delay := min(self._last_event + self.window, self._first_event + self.max_delay) - self._clock()) > 0:
+            await asyncio.sleep(delay)
+        self._task = None
+        await self.flush()
+
+    async def flush(self):
+        joined, left, self._joined, self._left = self._joined, self._left, [], []
+        goodbye = None
+        if left and self._room_empty:
+            self.metrics["skipped_goodbyes"] += 1
+            logger.info(f"Not saying goodbye to {join_names(left) or 'a participant'}, nobody is left to hear it")
+        elif left:
+            goodbye = self.goodbye_many if len(left) > 1 else self.goodbye
+
+        if joined and goodbye:
+            # The goodbye becomes fixed text in front of the greeting, escape any braces in the names
+            text = goodbye.format(name=join_names(left)).replace("{", "{{").replace("}", "}}")
+            await self._speak(f"{text} {self.greeting}", join_names(joined))
+        elif joined:
+            await self._speak(self.greeting, join_names(joined))
+        elif goodbye:
+            await self._speak(goodbye, join_names(left))
+
+    async def _speak(self, template: str, names: str):
+        self.metrics["utterances"] += 1
+        await self._say(template, names)
+
+    def cancel(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
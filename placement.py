@@ -0,0 +1,166 @@
+import math
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+from loguru import logger
+
+# Approximate locations (latitude, longitude) of the Fly regions
+FLY_REGIONS = {
+    "ams": (52.37, 4.90),
+    "arn": (59.65, 17.93),
+    "atl": (33.64, -84.43),
+    "bog": (4.70, -74.14),
+    "bom": (19.09, 72.87),
+    "bos": (42.36, -71.01),
+    "cdg": (49.01, 2.55),
+    "den": (39.86, -104.67),
+    "dfw": (32.90, -97.04),
+    "ewr": (40.69, -74.17),
+    "eze": (-34.82, -58.54),
+    "fra": (50.03, 8.57),
+    "gdl": (20.52, -103.31),
+    "gig": (-22.81, -43.25),
+    "gru": (-23.43, -46.47),
+    "hkg": (22.31, 113.92),
+    "iad": (38.95, -77.46),
+    "jnb": (-26.14, 28.25),
+    "lax": (33.94, -118.41),
+    "lhr": (51.47, -0.45),
+    "mad": (40.47, -3.56),
+    "mia": (25.80, -80.29),
+    "nrt": (35.76, 140.39),
+    "ord": (41.98, -87.90),
+    "otp": (44.57, 26.09),
+    "phx": (33.43, -112.01),
+    "qro": (20.62, -100.19),
+    "scl": (-33.39, -70.79),
+    "sea": (47.45, -122.31),
+    "sin": (1.36, 103.99),
+    "sjc": (37.36, -121.93),
+    "syd": (-33.95, 151.18),
+    "waw": (52.17, 20.97),
+    "yul": (45.47, -73.74),
+    "yyz": (43.68, -79.63),
+}
+
+# The Fly region closest to each Daily media region (the `geo` room property)
+DAILY_GEO_REGIONS = {
+    "af-south-1": "jnb",
+    "ap-northeast-1": "nrt",
+    "ap-northeast-2": "nrt",
+    "ap-south-1": "bom",
+    "ap-southeast-1": "sin",
+    "ap-southeast-2": "syd",
+    "ca-central-1": "yul",
+    "eu-central-1": "fra",
+    "eu-north-1": "arn",
+    "eu-west-2": "lhr",
+    "sa-east-1": "gru",
+    "us-east-1": "iad",
+    "us-west-2": "sea",
+}
+
+
+def distance_km(a: str, b: str) -> float:
+    """
+    Returns the great-circle distance between two Fly regions.
+    """
+    (lat1, lon1), (lat2, lon2) = (map(math.radians, FLY_REGIONS[region]) for region in (a, b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(h))
+
+
+def parse_regions(value: str) -> Dict[str, int]:
+    """
+    Parses a list of regions with optional capacities, e.g. "ams:20,fra:10,lhr" (0 or none is unlimited).
+    """
+    regions = {}
+    for entry in value.split(","):
+        region, _, capacity = entry.strip().partition(":")
+        if region:
+            if region not in FLY_REGIONS:
+                raise ValueError(f"Unknown Fly region: {region}")
+            regions[region] = int(capacity or 0)
+    return regions
+
+
+@dataclass
+class Placement:
+    region: str
+    # The region the session should ideally run in, and where that came from: room, client or default
+    target: str
+    source: str
+    distance_km: float
+    # Whether an idle warm worker was available in the region
+    warm: bool
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class PlacementScheduler:
+    """
+    Picks the region to run a session's worker in.
+
+    The target is the region closest to the room's media region (the Daily `geo`
+    property) if the room has one, as the bot exchanges all its audio with the
+    media server. Otherwise it's the region of the client (e.g. the Fly-Region header
+    of the request, the edge closest to the user), who will pull the media server to
+    their side, or else `default_region`.
+
+    The session goes to the configured region closest to the target that has
+    capacity left. A region with an idle warm worker within `warm_radius_km` of that
+    is preferred, as it saves a cold start.
+    """
+
+    def __init__(self, regions: Dict[str, int], default_region: str, warm_radius_km: float = 1000):
+        if not regions:
+            regions = {default_region: 0}
+        self.regions = regions
+        self.default_region = default_region
+        self.warm_radius_km = warm_radius_km
+        self.metrics: Dict[str, int] = {region: 0 for region in regions}
+
+    def target(self, room_geo: Optional[str], client_region: Optional[str]) -> tuple[str, str]:
+        if room_geo in DAILY_GEO_REGIONS:
+            return DAILY_GEO_REGIONS[room_geo], "room"
+        if client_region in FLY_REGIONS:
+            return client_region, "client"
+        return self.default_region, "default"
+
+    def place(
+        self,
+        room_geo: Optional[str] = None,
+        client_region: Optional[str] = None,
+        load: Optional[Dict[str, int]] = None,
+        warm: Optional[Dict[str, int]] = None,
+    ) -> Optional[Placement]:
+        """
+        Args:
+            room_geo (str): The media region of the room, if it's pinned to one.
+            client_region (str): The Fly region closest to the client.
+            load (dict): The number of active sessions in each region.
+            warm (dict): The number of idle warm workers in each region.
+
+        Returns:
+            Placement | None: Where to run the session, or None if all regions are at capacity.
+        """
+        load, warm = load or {}, warm or {}
+        target, source = self.target(room_geo, client_region)
+        available = [
+            region for region, capacity in self.regions.items() if not capacity or load.get(region, 0) < capacity
+        ]
+        if not available:
+            logger.warning(f"No region has capacity left for a session near {target}")
+            return None
+
+        distances = {region: distance_km(region, target) for region in available}
+        region = min(available, key=distances.get)
+        warm_regions = [r for r in available if warm.get(r) and distances[r] <= distances[region] + self.warm_radius_km]
+        if warm_regions:
+            region = min(warm_regions, key=distances.get)
+
+        self.metrics[region] += 1
+        placement = Placement(region, target, source, round(distances[region]), bool(warm.get(region)))
+        logger.info(f"Placing session in {region}: {placement.to_dict()}")
+        return placement
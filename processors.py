@@ -1,72 +1,205 @@
+import asyncio
 import json
+import time
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
-import boto3
-from botocore.exceptions import ClientError
 from loguru import logger
 
+from addressing import AddressGate
+from jsonl import JSONLWriter
 from pipecat.frames.frames import (Frame, InterimTranscriptionFrame,
                                    LLMFullResponseEndFrame, TranscriptionFrame,
                                    UserStartedSpeakingFrame,
                                    UserStoppedSpeakingFrame)
 from pipecat.processors.aggregators.llm_response import LLMResponseAggregator
 from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from speculative_llm import SpeculativeLLMMessagesFrame
+from transcript_store import (MANIFEST_NAME, TRANSCRIPT_NAME, encode_segment,
+                              manifest, segment_name)
+from uploader import BackgroundUploader
 
 
 class ConversationLogger(FrameProcessor):
-    def __init__(self, messages: List[dict], log_file_path: str):
+    """
+    This frame processor appends new conversation messages to a local log file.
+
+    By default every flush reopens the file and appends pretty-printed JSON objects.
+    With `jsonl=True` the messages are written as JSON Lines through a JSONLWriter,
+    which keeps the file open, buffers writes and can rotate by size or age. Read
+    such logs back with `jsonl.iter_jsonl`.
+    """
+
+    def __init__(
+        self,
+        messages: List[dict],
+        log_file_path: str,
+        jsonl: bool = False,
+        fsync_interval: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ):
         super().__init__()
         self.messages = messages
         self.log_file_path = log_file_path
         self.last_logged_index = -1
+        self.writer = None
+        if jsonl:
+            self.writer = JSONLWriter(
+                log_file_path, fsync_interval=fsync_interval, max_bytes=max_bytes, max_age=max_age
+            )
 
     async def process_frame(self, frame: Frame, direction: FrameDirection):
         if isinstance(frame, LLMFullResponseEndFrame) or isinstance(frame, UserStoppedSpeakingFrame):
             self.log_messages()
         await self.push_frame(frame, direction)
 
+    async def cleanup(self):
+        await super().cleanup()
+        self.log_messages()
+        if self.writer:
+            self.writer.close()
+
     def log_messages(self):
         new_messages = self.messages[self.last_logged_index + 1 :]
         if new_messages:
-            with open(self.log_file_path, "a") as log_file:
-                for message in new_messages:
-                    json.dump(message, log_file, indent=4)
-                    log_file.write(",\n")
+            if self.writer:
+                self.writer.write_many(new_messages)
+                self.writer.flush()
+            else:
+                with open(self.log_file_path, "a") as log_file:
+                    for message in new_messages:
+                        json.dump(message, log_file, indent=4)
+                        log_file.write(",\n")
             self.last_logged_index = len(self.messages) - 1
             logger.info(f"Logged {len(new_messages)} new messages to {self.log_file_path}")
 
 
 class BucketLogger(FrameProcessor):
-    def __init__(self, messages: List[dict], bucket_name: str, subpath: str):
+    """
+    This frame processor stores the conversation in an S3 bucket as gzip'd JSON Lines.
+
+    New messages are collected and uploaded as a segment once they add up to
+    `segment_bytes` or the oldest of them is `segment_interval` seconds old, checked
+    whenever a turn ends. Uploads are handed to a BackgroundUploader, so the pipeline
+    never waits on object storage. A segment that doesn't fit into the upload queue is
+    retried on the next turn.
+
+    When the pipeline is cleaned up, the whole conversation is uploaded as one
+    transcript with a manifest and the segments are removed, so that a finished
+    session reads back with two GETs. See `transcript_store.read_session`, which also
+    reads sessions stored in the old layout of one object per message. The cleanup
+    waits at most `flush_timeout` seconds for the uploads, so that S3 retries can't
+    hold up the pipeline teardown.
+    """
+
+    def __init__(
+        self,
+        messages: List[dict],
+        bucket_name: str,
+        subpath: str,
+        uploader: Optional[BackgroundUploader] = None,
+        segment_bytes: int = 256 * 1024,
+        segment_interval: float = 5 * 60,
+        flush_timeout: float = 30.0,
+    ):
         super().__init__()
         self.messages = messages
         self.bucket_name = bucket_name
         self.subpath = subpath
+        self.segment_bytes = segment_bytes
+        self.segment_interval = segment_interval
+        self.flush_timeout = flush_timeout
         self.last_logged_index = -1
-        self.s3_client = boto3.client("s3")
+        self.uploader = uploader or BackgroundUploader(bucket_name)
+        # The uploaded segments, and the messages collected for the next one
+        self.segments: List[dict] = []
+        self._first_pending = 0
+        self._pending_bytes = 0
+        self._pending_since = 0.0
 
     async def process_frame(self, frame: Frame, direction: FrameDirection):
         if isinstance(frame, LLMFullResponseEndFrame) or isinstance(frame, UserStoppedSpeakingFrame):
             self.log_messages()
         await self.push_frame(frame, direction)
 
-    def log_messages(self):
-        new_messages = self.messages[self.last_logged_index + 1 :]
-        if new_messages:
-            for i, message in enumerate(new_messages, start=self.last_logged_index + 1):
-                filename = f"{i:06d}.json"
-                key = f"{self.subpath}/{filename}"
-                try:
-                    self.s3_client.put_object(
-                        Bucket=self.bucket_name,
-                        Key=key,
-                        Body=json.dumps(message, indent=4),
-                    )
-                    logger.info(f"Uploaded message {i} to s3://{self.bucket_name}/{key}")
-                except ClientError as e:
-                    logger.error(f"Failed to upload message {i} to S3: {e}")
-            self.last_logged_index = len(self.messages) - 1
+    async def cleanup(self):
+        await super().cleanup()
+        try:
+            await asyncio.wait_for(self.flush(), self.flush_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out storing the conversation in s3://{self.bucket_name}/{self.subpath}")
+        await self.uploader.close(self.flush_timeout)
+
+    def log_messages(self) -> int:
+        """
+        Collects the new messages and queues them as a segment when it's due. Returns the
+        number of messages of a due segment that didn't fit into the upload queue.
+        """
+        if self._first_pending > self.last_logged_index:
+            self._pending_since = time.monotonic()
+        for message in self.messages[self.last_logged_index + 1 :]:
+            self._pending_bytes += len(json.dumps(message, ensure_ascii=False, default=str))
+        self.last_logged_index = len(self.messages) - 1
+
+        pending = len(self.messages) - self._first_pending
+        due = (
+            self._pending_bytes >= self.segment_bytes or time.monotonic() - self._pending_since >= self.segment_interval
+        )
+        if not pending or not due:
+            return 0
+        name = segment_name(len(self.segments))
+        body = encode_segment(self.messages[self._first_pending :])
+        if not self.uploader.submit(f"{self.subpath}/{name}", body):
+            logger.warning(f"Upload queue full, {pending} messages pending for s3://{self.bucket_name}/{self.subpath}")
+            return pending
+        self.segments.append({"name": name, "first": self._first_pending, "count": pending, "bytes": len(body)})
+        self._first_pending = len(self.messages)
+        self._pending_bytes = 0
+        return 0
+
+    async def _upload(self, key: str, body: bytes | str, attempts: int = 3) -> bool:
+        """
+        Uploads an object and waits for it. Returns False if the upload failed, or if the
+        uploader is closed or its queue stayed full for `attempts` tries.
+        """
+        failed = self.uploader.metrics["failed"]
+        for _ in range(attempts):
+            if self.uploader.submit(key, body):
+                await self.uploader.flush()
+                return self.uploader.metrics["failed"] == failed
+            if self.uploader.closed:
+                logger.error(f"Unable to upload {key}, the uploader is closed")
+                return False
+            await self.uploader.flush()
+        logger.error(f"Unable to upload {key}, the upload queue stays full")
+        return False
+
+    async def flush(self):
+        """
+        Uploads the whole conversation as the session's transcript, then its manifest, and
+        removes the segments uploaded before. If an upload fails, the segments are kept.
+        """
+        self.log_messages()
+        await self.uploader.flush()
+        if not self.messages:
+            return
+        body = encode_segment(self.messages)
+        transcript = {"name": TRANSCRIPT_NAME, "first": 0, "count": len(self.messages), "bytes": len(body)}
+        # The manifest only goes up once the transcript is there, readers rely on it
+        if not await self._upload(f"{self.subpath}/{TRANSCRIPT_NAME}", body) or not await self._upload(
+            f"{self.subpath}/{MANIFEST_NAME}", json.dumps(manifest([transcript], complete=True), indent=4)
+        ):
+            logger.error(
+                f"Keeping the segments of s3://{self.bucket_name}/{self.subpath}, the transcript upload failed"
+            )
+            return
+        if self.segments:
+            await self.uploader.delete([f"{self.subpath}/{segment['name']}" for segment in self.segments])
+            self.segments = []
+        logger.info(
+            f"Stored {len(self.messages)} messages ({len(body)} bytes) in s3://{self.bucket_name}/{self.subpath}"
+        )
 
 
 class ConversationProcessor(LLMResponseAggregator):
@@ -74,12 +207,27 @@ class ConversationProcessor(LLMResponseAggregator):
     This frame processor keeps track of a conversation by capturing TranscriptionFrames
     and aggregating the text along with timestamps and user IDs in a conversation array.
 
+    With `speculative=True`, an interim transcription that hasn't changed for
+    `stable_after` seconds is pushed as a SpeculativeLLMMessagesFrame, so that a
+    SpeculativeOpenAILLMService can start on the turn before the final transcription
+    arrives.
+
+    With a `gate`, a turn that isn't addressed to the bot (see addressing.AddressGate)
+    is only appended to the messages, as context for later turns, and no LLM call is
+    made for it. Such turns aren't speculated on either.
+
     Attributes:
         conversation (list): A list of dictionaries containing conversation entries.
         user_mapping (dict): A dictionary mapping user_ids to participant names.
     """
 
-    def __init__(self, messages: List[dict] = []):
+    def __init__(
+        self,
+        messages: List[dict] = [],
+        speculative: bool = False,
+        stable_after: float = 0.3,
+        gate: Optional[AddressGate] = None,
+    ):
         super().__init__(
             messages=messages,
             role="user",
@@ -90,6 +238,12 @@ class ConversationProcessor(LLMResponseAggregator):
         )
         self._aggregation_detailed = []
         self.user_mapping = {}
+        self.speculative = speculative
+        self.stable_after = stable_after
+        self._interim: Optional[dict] = None
+        self._speculated = ""
+        self._speculation_timer: Optional[asyncio.Task] = None
+        self.gate = gate
 
     def add_user_mapping(self, user_id: str, participant_name: str):
         """
@@ -102,8 +256,10 @@ class ConversationProcessor(LLMResponseAggregator):
         self.user_mapping[user_id] = participant_name
 
     async def process_frame(self, frame: Frame, direction: FrameDirection):
-        await super().process_frame(frame, direction)
+        # Record the entry before the aggregator sees the frame, a final transcription
+        # arriving after the user stopped speaking makes it push the aggregation right away
         if isinstance(frame, self._accumulator_frame):
+            self._interim = None
             if self._aggregating:
                 # timestamp has the format "2024-07-14T10:18:19.766929Z"
                 # parse it into a datetime object
@@ -115,19 +271,72 @@ class ConversationProcessor(LLMResponseAggregator):
                 }
                 self._aggregation_detailed.append(entry)
                 logger.debug(f"Added conversation entry: {entry}")
+        await super().process_frame(frame, direction)
+        if self.speculative and isinstance(frame, self._interim_accumulator_frame) and self._aggregating:
+            self._interim = {
+                "user_id": frame.user_id,
+                "text": frame.text,
+                "timestamp": datetime.fromisoformat(frame.timestamp[:-1]),
+            }
+            self._restart_speculation_timer()
+
+    def _restart_speculation_timer(self):
+        self._cancel_speculation_timer()
+        self._speculation_timer = asyncio.create_task(self._speculate_when_stable())
+
+    def _cancel_speculation_timer(self):
+        if self._speculation_timer:
+            self._speculation_timer.cancel()
+            self._speculation_timer = None
+
+    async def _speculate_when_stable(self):
+        await asyncio.sleep(self.stable_after)
+        self._speculation_timer = None
+        if not self._interim:
+            return
+        entries = self._aggregation_detailed + [self._interim]
+        if self.gate and not self.gate.rule([entry["text"] for entry in entries], self._after_bot()):
+            return
+        candidate = self.format_entries(entries)
+        if candidate != self._speculated:
+            self._speculated = candidate
+            await self.push_frame(
+                SpeculativeLLMMessagesFrame(self._messages + [{"role": "user", "content": candidate}])
+            )
 
     async def _push_aggregation(self):
+        self._cancel_speculation_timer()
+        self._interim = None
+        self._speculated = ""
         self._aggregation = self.format_aggregation()
+        texts = [entry["text"] for entry in self._aggregation_detailed]
         self._aggregation_detailed = []
+        if self.gate and self._aggregation and not self.gate.forward(texts, self._after_bot()):
+            self._messages.append({"role": self._role, "content": self._aggregation})
+            self._aggregation = ""
+            return
         await super()._push_aggregation()
         logger.debug("Pushed conversation aggregation")
 
+    def _after_bot(self) -> bool:
+        # Empty answers aren't added to the messages, so this is the bot having said something
+        return bool(self._messages) and self._messages[-1]["role"] == "assistant"
+
+    async def cleanup(self):
+        await super().cleanup()
+        self._cancel_speculation_timer()
+        if self.gate:
+            logger.info(f"Address gate: {self.gate.metrics}")
+
     def format_aggregation(self):
         """
         Formats the aggregation into a multi-line string.
         """
+        return self.format_entries(self._aggregation_detailed)
+
+    def format_entries(self, entries: List[dict]) -> str:
         formatted = []
-        for entry in self._aggregation_detailed:
+        for entry in entries:
             user_id = entry["user_id"]
             username = self.user_mapping.get(user_id, user_id)  # Use username if available, otherwise use user_id
             timestamp = entry["timestamp"].strftime("%H:%M:%S")
@@ -1,7 +1,8 @@
 import os
+from typing import Optional
 
 
-def get_llm_base_prompt(bot_name: str):
+def get_llm_base_prompt(bot_name: str, system_prompt: Optional[str] = None):
     default_content = """You are a helpful assistant. Always respond politely and concisely."""
     user_format = """You are participating in a conversation with multiple users.
 User input will be formatted as follows:
@@ -16,7 +17,7 @@ For example:
 The assistant's responses should not follow this format. They should be standalone messages.
 """
 
-    system_prompt = os.getenv("SYSTEM_PROMPT", default_content)
+    system_prompt = system_prompt or os.getenv("SYSTEM_PROMPT", default_content)
     system_prompt = f"""{user_format}
 
 {system_prompt}
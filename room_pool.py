@@ -0,0 +1,199 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from loguru import logger
+from pipecat.transports.services.helpers.daily_rest import (
+    DailyRESTHelper,
+    DailyRoomObject,
+    DailyRoomParams,
+    DailyRoomProperties,
+)
+
+
+@dataclass
+class ProvisionedRoom:
+    room: DailyRoomObject
+    bot_token: str
+    user_token: str
+    # Wall clock time at which the room and its tokens expire
+    usable_until: float
+
+    @property
+    def url(self) -> str:
+        return self.room.url
+
+
+@dataclass
+class PooledRoom:
+    room: DailyRoomObject
+    # Wall clock time after which the room is no longer handed out
+    usable_until: float
+
+
+class RoomPool:
+    """
+    Keeps a pool of ready Daily rooms, so that starting a session waits for one REST
+    round-trip instead of two sequential ones.
+
+    Pooled rooms are created with enough lifetime to be held for `max_age` seconds and
+    still last a full session. When a room is handed out, its expiry is moved to
+    `session_time` seconds from now while the bot and user tokens are minted, with the
+    same lifetime. If either fails, the room is dropped and a new one is provisioned,
+    so that no session outlasts `session_time`. Rooms that sat in the pool for longer
+    than `max_age` are deleted and replaced.
+
+    When the pool is empty, the room is provisioned on the spot with both tokens minted
+    concurrently. With a `geo`, the rooms are pinned to that Daily media region.
+    """
+
+    def __init__(
+        self,
+        daily_rest: DailyRESTHelper,
+        size: int = 2,
+        session_time: float = 5 * 60,
+        max_age: float = 30 * 60,
+        check_interval: float = 30,
+        geo: Optional[str] = None,
+    ):
+        self.daily_rest = daily_rest
+        self.geo = geo
+        self.size = size
+        self.session_time = session_time
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self._ready: List[PooledRoom] = []
+        self._creating = 0
+        self._refill_event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._pending: set[asyncio.Task] = set()
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "created": 0,
+            "create_failures": 0,
+            "handout_failures": 0,
+            "evicted": 0,
+        }
+
+    @property
+    def ready_rooms(self) -> int:
+        return len(self._ready)
+
+    def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._maintain())
+            self._refill_event.set()
+
+    async def stop(self):
+        """
+        Stops refilling and deletes all pooled rooms.
+        """
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        rooms, self._ready = self._ready, []
+        await asyncio.gather(*[self._delete(r.room) for r in rooms])
+        await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def provision(self) -> ProvisionedRoom:
+        """
+        Creates a room and mints the bot and user tokens concurrently, all expiring `session_time` from now.
+        """
+        room = await self._create_room(self.session_time)
+        return await self._mint_tokens(room)
+
+    async def acquire(self) -> ProvisionedRoom:
+        """
+        Returns a ready room with fresh tokens, or provisions one if the pool is empty.
+        """
+        self._refill_event.set()
+        self._evict_expired()
+        if self._ready:
+            pooled = self._ready.pop(0)
+            try:
+                _, provisioned = await asyncio.gather(
+                    self._set_expiry(pooled.room, time.time() + self.session_time), self._mint_tokens(pooled.room)
+                )
+                self.metrics["hits"] += 1
+                return provisioned
+            except Exception as e:
+                self.metrics["handout_failures"] += 1
+                logger.warning(f"Unable to hand out pooled room {pooled.room.url}, provisioning a room: {e}")
+                self._spawn(self._delete(pooled.room))
+        else:
+            logger.info("Room pool is empty, provisioning a room")
+        self.metrics["misses"] += 1
+        return await self.provision()
+
+    async def _create_room(self, lifetime: float) -> DailyRoomObject:
+        properties = DailyRoomProperties(exp=time.time() + lifetime, **({"geo": self.geo} if self.geo else {}))
+        return await self.daily_rest.create_room(params=DailyRoomParams(properties=properties))
+
+    async def _mint_tokens(self, room: DailyRoomObject) -> ProvisionedRoom:
+        usable_until = time.time() + self.session_time
+        bot_token, user_token = await asyncio.gather(
+            self.daily_rest.get_token(room.url, self.session_time),
+            self.daily_rest.get_token(room.url, self.session_time),
+        )
+        return ProvisionedRoom(room, bot_token, user_token, usable_until)
+
+    async def _maintain(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._refill_event.wait(), self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._refill_event.clear()
+            self._evict_expired()
+            for _ in range(self.size - len(self._ready) - self._creating):
+                self._creating += 1
+                self._spawn(self._create())
+
+    async def _create(self):
+        try:
+            room = await self._create_room(self.max_age + self.session_time)
+        except Exception as e:
+            self.metrics["create_failures"] += 1
+            logger.error(f"Unable to provision pooled room: {e}")
+            return
+        finally:
+            self._creating -= 1
+        self.metrics["created"] += 1
+        self._ready.append(PooledRoom(room, time.time() + self.max_age))
+        logger.info(f"Pooled room {room.url} ready ({len(self._ready)} ready)")
+
+    def _evict_expired(self):
+        now = time.time()
+        expired = [r for r in self._ready if r.usable_until <= now]
+        for pooled in expired:
+            self._ready.remove(pooled)
+            self.metrics["evicted"] += 1
+            logger.info(f"Evicting expired pooled room {pooled.room.url}")
+            self._spawn(self._delete(pooled.room))
+        if expired:
+            self._refill_event.set()
+
+    async def _set_expiry(self, room: DailyRoomObject, exp: float):
+        # DailyRESTHelper has no room update call
+        rest = self.daily_rest
+        async with rest.aiohttp_session.post(
+            f"{rest.daily_api_url}/rooms/{room.name}",
+            headers={"Authorization": f"Bearer {rest.daily_api_key}"},
+            json={"properties": {"exp": exp}},
+        ) as r:
+            if r.status != 200:
+                raise Exception(f"Failed to update expiry of room {room.url} (status: {r.status}): {await r.text()}")
+
+    async def _delete(self, room: DailyRoomObject):
+        try:
+            await self.daily_rest.delete_room_by_name(room.name)
+        except Exception as e:
+            logger.warning(f"Unable to delete pooled room {room.url}: {e}")
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
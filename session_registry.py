@@ -0,0 +1,396 @@
+import asyncio
+import sqlite3
+import time
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Protocol
+
+from loguru import logger
+
+# Returns whether the worker running a session is still alive
+Liveness = Callable[[], Awaitable[bool]]
+# Picks a region for a session from the number of active sessions in each region, or None if none has room
+RegionPicker = Callable[[Counter], Optional[str]]
+
+ACTIVE_STATES = ("starting", "running")
+
+
+@dataclass
+class SessionRecord:
+    id: str
+    client: str
+    room_url: str = ""
+    # Where the session runs, e.g. "fly:<machine id>", "pid:<pid>" or "host:<session id>"
+    worker: str = ""
+    # The region the worker runs in, if it was placed in one
+    region: str = ""
+    # starting, running, ended or failed
+    state: str = "starting"
+    started_at: float = field(default_factory=time.time)
+    ended_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Session not admitted: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class SessionStore(Protocol):
+    """
+    Keeps the session records. Runner instances sharing a store share its limits,
+    see `SqliteSessionStore`.
+    """
+
+    async def try_add(self, record: SessionRecord, max_sessions: int, max_per_client: int) -> Optional[str]:
+        """
+        Adds the record unless that would exceed a limit (0 is unlimited). Must be atomic.
+
+        Returns:
+            str | None: Why the record wasn't added, or None if it was.
+        """
+        ...
+
+    async def update(self, session_id: str, **changes):
+        """
+        Sets the `changes` on the session's record.
+        """
+        ...
+
+    async def place(self, session_id: str, pick: RegionPicker) -> Optional[str]:
+        """
+        Sets the session's region to the one `pick` returns for the current load, if any. Must be atomic.
+        """
+        ...
+
+    async def end_started_before(self, started_at: float) -> List[str]:
+        """
+        Ends the active sessions started before `started_at` and returns their ids.
+        """
+        ...
+
+    async def prune(self, ended_before: float):
+        """
+        Deletes the records of the sessions that ended before `ended_before`.
+        """
+        ...
+
+    async def list(self) -> List[SessionRecord]:
+        """
+        Returns all records, ended ones included.
+        """
+        ...
+
+
+def _load(active: List[SessionRecord]) -> Counter:
+    return Counter(r.region for r in active if r.region)
+
+
+def _rejection(active: List[SessionRecord], client: str, max_sessions: int, max_per_client: int) -> Optional[str]:
+    if max_sessions and len(active) >= max_sessions:
+        return "too many sessions"
+    if max_per_client and sum(1 for r in active if r.client == client) >= max_per_client:
+        return "too many sessions for this client"
+    return None
+
+
+class InMemorySessionStore:
+    """
+    Keeps the records of one runner instance in memory.
+    """
+
+    def __init__(self):
+        self._records: Dict[str, SessionRecord] = {}
+
+    async def try_add(self, record: SessionRecord, max_sessions: int, max_per_client: int) -> Optional[str]:
+        active = [r for r in self._records.values() if r.state in ACTIVE_STATES]
+        if reason := _rejection(active, record.client, max_sessions, max_per_client):
+            return reason
+        self._records[record.id] = record
+        return None
+
+    async def update(self, session_id: str, **changes):
+        if record := self._records.get(session_id):
+            for name, value in changes.items():
+                setattr(record, name, value)
+
+    async def place(self, session_id: str, pick: RegionPicker) -> Optional[str]:
+        region = pick(_load([r for r in self._records.values() if r.state in ACTIVE_STATES]))
+        if region:
+            await self.update(session_id, region=region)
+        return region
+
+    async def end_started_before(self, started_at: float) -> List[str]:
+        expired = [r for r in self._records.values() if r.state in ACTIVE_STATES and r.started_at < started_at]
+        for record in expired:
+            record.state = "ended"
+            record.ended_at = time.time()
+        return [r.id for r in expired]
+
+    async def prune(self, ended_before: float):
+        for record in list(self._records.values()):
+            if record.ended_at and record.ended_at < ended_before:
+                del self._records[record.id]
+
+    async def list(self) -> List[SessionRecord]:
+        return list(self._records.values())
+
+
+class SqliteSessionStore:
+    """
+    Keeps the records in an SQLite database, so that the runner processes of a host
+    (e.g. several uvicorn workers) share one set of limits. Admission takes a write
+    lock on the database, so two runners can't both take the last slot.
+    """
+
+    _COLUMNS = ("id", "client", "room_url", "worker", "region", "state", "started_at", "ended_at")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, client TEXT, room_url TEXT, worker TEXT,"
+            " region TEXT, state TEXT, started_at REAL, ended_at REAL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def _active(self, db: sqlite3.Connection) -> List[SessionRecord]:
+        rows = db.execute(
+            f"SELECT {', '.join(self._COLUMNS)} FROM sessions WHERE state IN ({', '.join('?' * len(ACTIVE_STATES))})",
+            ACTIVE_STATES,
+        )
+        return [SessionRecord(*row) for row in rows]
+
+    def _try_add(self, record: SessionRecord, max_sessions: int, max_per_client: int) -> Optional[str]:
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            if reason := _rejection(self._active(db), record.client, max_sessions, max_per_client):
+                db.execute("ROLLBACK")
+                return reason
+            db.execute(
+                f"INSERT INTO sessions VALUES ({', '.join('?' * len(self._COLUMNS))})",
+                [getattr(record, column) for column in self._COLUMNS],
+            )
+            db.execute("COMMIT")
+            return None
+        finally:
+            db.close()
+
+    def _place(self, session_id: str, pick: RegionPicker) -> Optional[str]:
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            region = pick(_load(self._active(db)))
+            if region:
+                db.execute("UPDATE sessions SET region = ? WHERE id = ?", (region, session_id))
+            db.execute("COMMIT")
+            return region
+        finally:
+            db.close()
+
+    def _execute(self, sql: str, params=()) -> List[tuple]:
+        db = self._connect()
+        try:
+            return db.execute(sql, params).fetchall()
+        finally:
+            db.close()
+
+    async def try_add(self, record: SessionRecord, max_sessions: int, max_per_client: int) -> Optional[str]:
+        return await asyncio.to_thread(self._try_add, record, max_sessions, max_per_client)
+
+    async def place(self, session_id: str, pick: RegionPicker) -> Optional[str]:
+        return await asyncio.to_thread(self._place, session_id, pick)
+
+    async def update(self, session_id: str, **changes):
+        assignments = ", ".join(f"{name} = ?" for name in changes)
+        await asyncio.to_thread(
+            self._execute, f"UPDATE sessions SET {assignments} WHERE id = ?", [*changes.values(), session_id]
+        )
+
+    async def end_started_before(self, started_at: float) -> List[str]:
+        rows = await asyncio.to_thread(
+            self._execute,
+            "UPDATE sessions SET state = 'ended', ended_at = ? WHERE state IN ('starting', 'running')"
+            " AND started_at < ? RETURNING id",
+            (time.time(), started_at),
+        )
+        return [row[0] for row in rows]
+
+    async def prune(self, ended_before: float):
+        await asyncio.to_thread(self._execute, "DELETE FROM sessions WHERE ended_at < ?", (ended_before,))
+
+    async def list(self) -> List[SessionRecord]:
+        rows = await asyncio.to_thread(
+            self._execute, f"SELECT {', '.join(self._COLUMNS)} FROM sessions ORDER BY started_at"
+        )
+        return [SessionRecord(*row) for row in rows]
+
+
+class SessionRegistry:
+    """
+    Keeps track of the running sessions and admits new ones within a global limit
+    of `max_sessions` and a limit of `max_per_client` sessions per client (0 is
+    unlimited).
+
+    A request over a limit waits up to `max_wait` seconds for a slot. At most
+    `max_queue` requests wait at a time, further ones are rejected right away, so a
+    burst is answered with fast 429s instead of piling up.
+
+    Slots are freed when a session is ended, when the liveness check of its worker
+    fails (checked every `check_interval` seconds) and, as a backstop for sessions of
+    runners that went away, `max_age` seconds after the session started. Ended
+    sessions stay listed for `keep_finished` seconds.
+
+    Attributes:
+        metrics (dict): Admission, rejection and session end counters.
+    """
+
+    def __init__(
+        self,
+        store: Optional[SessionStore] = None,
+        max_sessions: int = 0,
+        max_per_client: int = 0,
+        max_wait: float = 5,
+        max_queue: int = 16,
+        max_age: float = 60 * 60,
+        check_interval: float = 15,
+        keep_finished: float = 5 * 60,
+        poll_interval: float = 0.5,
+    ):
+        self.store = store or InMemorySessionStore()
+        self.max_sessions = max_sessions
+        self.max_per_client = max_per_client
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self.keep_finished = keep_finished
+        # Slots freed by other runners sharing the store are only noticed by polling
+        self.poll_interval = poll_interval
+        self.waiting = 0
+        self._liveness: Dict[str, Liveness] = {}
+        self._released = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = {"admitted": 0, "queued": 0, "rejected": 0, "ended": 0, "dead": 0, "expired": 0}
+
+    def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._check_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def admit(self, client: str) -> SessionRecord:
+        """
+        Reserves a slot for a session of `client`, waiting up to `max_wait` seconds.
+
+        Raises:
+            AdmissionRejected: If no slot became free in time, or too many requests are waiting.
+        """
+        record = SessionRecord(id=uuid.uuid4().hex, client=client)
+        deadline = time.monotonic() + self.max_wait
+        queued = False
+        try:
+            while True:
+                released = self._released
+                reason = await self.store.try_add(record, self.max_sessions, self.max_per_client)
+                if reason is None:
+                    self.metrics["admitted"] += 1
+                    return record
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (not queued and self.waiting >= self.max_queue):
+                    self.metrics["rejected"] += 1
+                    logger.warning(f"Rejected session for {client}: {reason} ({self.waiting} waiting)")
+                    raise AdmissionRejected(reason, retry_after=max(1.0, self.max_wait))
+                if not queued:
+                    queued = True
+                    self.waiting += 1
+                    self.metrics["queued"] += 1
+                try:
+                    await asyncio.wait_for(released.wait(), min(remaining, self.poll_interval))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if queued:
+                self.waiting -= 1
+
+    async def place(self, record: SessionRecord, pick: RegionPicker) -> Optional[str]:
+        """
+        Places a session in the region `pick` returns for the current load, before its worker starts, so that it
+        counts towards the region's load right away. Concurrent placements, also by runners sharing the store, see
+        each other's sessions.
+        """
+        region = await self.store.place(record.id, pick)
+        if region:
+            record.region = region
+        return region
+
+    async def started(
+        self, record: SessionRecord, room_url: str, worker: str, alive: Optional[Liveness] = None, region: str = ""
+    ):
+        """
+        Records where an admitted session runs. `alive` is polled to notice when it ends.
+        """
+        record.room_url = room_url
+        record.worker = worker
+        record.region = region
+        record.state = "running"
+        await self.store.update(record.id, room_url=room_url, worker=worker, region=region, state="running")
+        if alive:
+            self._liveness[record.id] = alive
+
+    async def end(self, session_id: str, state: str = "ended"):
+        self._liveness.pop(session_id, None)
+        await self.store.update(session_id, state=state, ended_at=time.time())
+        self.metrics["ended"] += 1
+        self._release()
+
+    def _release(self):
+        released, self._released = self._released, asyncio.Event()
+        released.set()
+
+    async def sessions(self) -> List[SessionRecord]:
+        return await self.store.list()
+
+    async def check(self):
+        """
+        Ends the sessions whose worker is gone and the ones older than `max_age`.
+        """
+        for session_id, alive in list(self._liveness.items()):
+            try:
+                if await alive():
+                    continue
+            except Exception as e:
+                # Keep the slot, max_age frees it if the worker stays unreachable
+                logger.warning(f"Unable to check the worker of session {session_id}: {e}")
+                continue
+            logger.info(f"Worker of session {session_id} is gone, freeing its slot")
+            self.metrics["dead"] += 1
+            await self.end(session_id)
+
+        expired = await self.store.end_started_before(time.time() - self.max_age)
+        for session_id in expired:
+            self._liveness.pop(session_id, None)
+        if expired:
+            logger.info(f"Expired {len(expired)} sessions older than {self.max_age} seconds")
+            self.metrics["expired"] += len(expired)
+            self._release()
+        await self.store.prune(time.time() - self.keep_finished)
+
+    async def _check_loop(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Session check failed: {e}")
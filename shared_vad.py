@@ -0,0 +1,186 @@
+import functools
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from importlib import resources
+from typing import List, Optional, Tuple
+
+import numpy as np
+import onnxruntime
+from loguru import logger
+
+from pipecat.vad.silero import SileroOnnxModel, SileroVADAnalyzer
+from pipecat.vad.vad_analyzer import VADAnalyzer, VADParams
+
+
+@functools.lru_cache(maxsize=None)
+def silero_session() -> onnxruntime.InferenceSession:
+    """
+    Loads the Silero VAD model once per process. Inference sessions are safe to run
+    from several threads, so all sessions on a host share it.
+    """
+    logger.debug("Loading shared Silero VAD model...")
+    opts = onnxruntime.SessionOptions()
+    opts.inter_op_num_threads = 1
+    opts.intra_op_num_threads = 1
+    path = str(resources.files("pipecat.vad.data").joinpath("silero_vad.onnx"))
+    return onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"], sess_options=opts)
+
+
+class SharedSileroOnnxModel(SileroOnnxModel):
+    """
+    Per-session recurrent state on top of the shared inference session.
+    """
+
+    def __init__(self, session: onnxruntime.InferenceSession):
+        self.session = session
+        self.reset_states()
+        self.sample_rates = [8000, 16000]
+
+
+class SharedSileroVADAnalyzer(SileroVADAnalyzer):
+    """
+    A SileroVADAnalyzer that doesn't load its own copy of the model. With an `engine`,
+    its inference is batched with the other sessions using the same engine.
+    """
+
+    def __init__(
+        self,
+        *,
+        sample_rate: int = 16000,
+        params: VADParams = VADParams(),
+        engine: Optional["BatchedVADEngine"] = None,
+    ):
+        VADAnalyzer.__init__(self, sample_rate=sample_rate, num_channels=1, params=params)
+        if sample_rate != 16000 and sample_rate != 8000:
+            raise ValueError("Silero VAD sample rate needs to be 16000 or 8000")
+        self._model = engine.model() if engine else SharedSileroOnnxModel(silero_session())
+        self._last_reset_time = 0
+
+
+class BatchedVADEngine:
+    """
+    Runs the VAD inference of many sessions as one batched call to the shared model.
+
+    Sessions call `infer()` from their VAD executor threads and block until their
+    result is ready. The engine thread waits up to `max_wait` seconds after the first
+    pending chunk for chunks of other sessions, or less if every live session already
+    has one pending, and then runs them all at once. Each session's recurrent state
+    is stacked into the batch and scattered back afterwards.
+    """
+
+    def __init__(
+        self, session: Optional[onnxruntime.InferenceSession] = None, max_batch: int = 64, max_wait: float = 0.01
+    ):
+        self._session = session or silero_session()
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending: List[Tuple["BatchedSileroOnnxModel", np.ndarray, int, Future]] = []
+        self._cond = threading.Condition()
+        self._models: weakref.WeakSet = weakref.WeakSet()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.metrics = {"batches": 0, "chunks": 0, "max_batch": 0}
+
+    def model(self) -> "BatchedSileroOnnxModel":
+        model = BatchedSileroOnnxModel(self)
+        with self._cond:
+            self._models.add(model)
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run, name="vad-engine", daemon=True)
+                self._thread.start()
+        return model
+
+    def infer(self, model: "BatchedSileroOnnxModel", x: np.ndarray, sr: int) -> np.ndarray:
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("VAD engine is closed")
+            # A lone session has nobody to batch with, skip the hand-off to the engine thread
+            alone = len(self._models) <= 1
+            if not alone:
+                self._pending.append((model, x, sr, future))
+                self._cond.notify()
+        if alone:
+            self._run_batch([(model, x, sr, future)], sr)
+        return future.result()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+
+    def _take_batch(self) -> list:
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_wait
+            while not self._closed and len(self._pending) < min(self.max_batch, len(self._models)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, self._pending = self._pending[: self.max_batch], self._pending[self.max_batch :]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            # The sample rate is a scalar input, so each rate is its own batch
+            for sr in {sr for _, _, sr, _ in batch}:
+                self._run_batch([request for request in batch if request[2] == sr], sr)
+
+    def _run_batch(self, batch: list, sr: int):
+        try:
+            out, state = self._session.run(
+                None,
+                {
+                    "input": np.concatenate([x for _, x, _, _ in batch]),
+                    "state": np.concatenate([model._state for model, _, _, _ in batch], axis=1),
+                    "sr": np.array(sr, dtype="int64"),
+                },
+            )
+        except Exception as e:
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+        self.metrics["batches"] += 1
+        self.metrics["chunks"] += len(batch)
+        self.metrics["max_batch"] = max(self.metrics["max_batch"], len(batch))
+        for i, (model, _, _, future) in enumerate(batch):
+            model._state = state[:, i : i + 1]
+            future.set_result(out[i : i + 1])
+
+
+class BatchedSileroOnnxModel(SileroOnnxModel):
+    """
+    Per-session recurrent state, with the inference delegated to a BatchedVADEngine.
+    """
+
+    def __init__(self, engine: BatchedVADEngine):
+        self.engine = engine
+        self.reset_states()
+        self.sample_rates = [8000, 16000]
+
+    def __call__(self, x, sr: int):
+        x, sr = self._validate_input(x, sr)
+        num_samples = 512 if sr == 16000 else 256
+        if np.shape(x) != (1, num_samples):
+            raise ValueError(f"Expected a single chunk of {num_samples} samples, got {np.shape(x)}")
+        context_size = 64 if sr == 16000 else 32
+
+        if self._last_sr != sr or not np.shape(self._context)[1]:
+            self.reset_states()
+            self._context = np.zeros((1, context_size), dtype="float32")
+
+        x = np.concatenate((self._context, x), axis=1).astype("float32")
+        out = self.engine.infer(self, x, sr)
+        self._context = x[..., -context_size:]
+        self._last_sr = sr
+        self._last_batch_size = 1
+        return out
@@ -0,0 +1,139 @@
+import asyncio
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import List, Optional, Tuple
+
+from loguru import logger
+
+from pipecat.frames.frames import Frame, LLMFullResponseEndFrame, LLMFullResponseStartFrame, LLMMessagesFrame
+from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContext
+from pipecat.processors.frame_processor import FrameDirection
+from pipecat.services.openai import OpenAILLMService
+
+# The "HH:MM:SS | " prefix of each line of a formatted user turn, see ConversationProcessor.format_aggregation
+_TIMESTAMP = re.compile(r"^\d{2}:\d{2}:\d{2} \| ", re.MULTILINE)
+_PUNCTUATION = re.compile(r"[^\w\s|]")
+
+
+@dataclass
+class SpeculativeLLMMessagesFrame(LLMMessagesFrame):
+    """
+    Messages ending in a user turn that was built from interim transcriptions. The
+    LLM may start on it, but must not emit anything until the final turn confirms it.
+    """
+
+    pass
+
+
+def normalize_turn(content: str) -> str:
+    """
+    Strips what differs between an interim and a final version of the same user turn: timestamps, case and punctuation.
+    """
+    text = _PUNCTUATION.sub("", _TIMESTAMP.sub("", content).lower())
+    return " ".join(text.split())
+
+
+def turns_match(speculated: str, final: str, threshold: float) -> bool:
+    speculated, final = normalize_turn(speculated), normalize_turn(final)
+    return speculated == final or SequenceMatcher(None, speculated, final).ratio() >= threshold
+
+
+@dataclass
+class Speculation:
+    text: str
+    started_at: float = field(default_factory=time.monotonic)
+    buffer: List[Tuple[Frame, FrameDirection]] = field(default_factory=list)
+    committed: bool = False
+    task: Optional[asyncio.Task] = None
+
+
+# The speculation whose generation is running in the current task
+_speculation: ContextVar[Optional[Speculation]] = ContextVar("speculation", default=None)
+
+
+class SpeculativeOpenAILLMService(OpenAILLMService):
+    """
+    An OpenAILLMService that starts generating on a SpeculativeLLMMessagesFrame,
+    holding back everything it produces. When the final LLMMessagesFrame arrives and
+    its user turn matches the speculated one (at least `match_threshold` similar
+    after normalization), the held back frames are released and the generation
+    continues, having had a head start. Otherwise the speculation is cancelled and
+    the final messages are processed as usual.
+
+    A newer speculation replaces a running one. `metrics` counts hits, misses and
+    replaced speculations and sums up the head start of the hits in `saved_ms`.
+    """
+
+    def __init__(self, *, match_threshold: float = 0.9, **kwargs):
+        super().__init__(**kwargs)
+        self.match_threshold = match_threshold
+        self._current: Optional[Speculation] = None
+        self.metrics = {"started": 0, "hits": 0, "misses": 0, "replaced": 0, "saved_ms": 0.0}
+
+    async def push_frame(self, frame: Frame, direction: FrameDirection = FrameDirection.DOWNSTREAM):
+        speculation = _speculation.get()
+        if speculation and not speculation.committed:
+            speculation.buffer.append((frame, direction))
+            return
+        await super().push_frame(frame, direction)
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        if isinstance(frame, SpeculativeLLMMessagesFrame):
+            await self._speculate(frame.messages)
+        elif isinstance(frame, LLMMessagesFrame) and self._current:
+            await self._resolve(frame)
+        else:
+            await super().process_frame(frame, direction)
+
+    async def _speculate(self, messages: List[dict]):
+        if self._current:
+            self.metrics["replaced"] += 1
+            await self._cancel(self._current)
+        speculation = Speculation(text=messages[-1]["content"])
+        speculation.task = asyncio.create_task(self._generate(speculation, messages))
+        self._current = speculation
+        self.metrics["started"] += 1
+        logger.debug(f"Speculating on: {speculation.text}")
+
+    async def _generate(self, speculation: Speculation, messages: List[dict]):
+        _speculation.set(speculation)
+        await self.push_frame(LLMFullResponseStartFrame())
+        await self._process_context(OpenAILLMContext.from_messages(messages))
+        await self.push_frame(LLMFullResponseEndFrame())
+
+    async def _resolve(self, frame: LLMMessagesFrame):
+        speculation, self._current = self._current, None
+        failed = speculation.task.done() and (speculation.task.cancelled() or speculation.task.exception())
+        if failed or not turns_match(speculation.text, frame.messages[-1]["content"], self.match_threshold):
+            self.metrics["misses"] += 1
+            logger.debug(f"Speculation missed: {speculation.text}")
+            await self._cancel(speculation)
+            await super().process_frame(frame, FrameDirection.DOWNSTREAM)
+            return
+
+        saved_ms = (time.monotonic() - speculation.started_at) * 1000
+        self.metrics["hits"] += 1
+        self.metrics["saved_ms"] += saved_ms
+        logger.debug(f"Speculation hit, {saved_ms:.0f} ms ahead")
+        # Release what was generated so far, then let the generation continue live
+        while speculation.buffer:
+            await super().push_frame(*speculation.buffer.pop(0))
+        speculation.committed = True
+        # Finish the turn before taking the next frame, like a regular generation
+        try:
+            await speculation.task
+        except Exception as e:
+            logger.exception(f"Speculative generation failed: {e}")
+
+    async def _cancel(self, speculation: Speculation):
+        speculation.task.cancel()
+        await asyncio.gather(speculation.task, return_exceptions=True)
+
+    async def cleanup(self):
+        await super().cleanup()
+        if self._current:
+            await self._cancel(self._current)
+        logger.info(f"Speculative LLM: {self.metrics}")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from typing import List, Optional
+
+from loguru import logger
+from PIL import Image
+
+from pipecat.frames.frames import OutputImageRawFrame
+
+ATLAS_MAGIC = b"MDSATLAS"
+ATLAS_VERSION = 1
+# Frame data starts page aligned, so that frames map onto whole pages
+ATLAS_ALIGNMENT = mmap.PAGESIZE
+
+script_dir = os.path.dirname(__file__)
+assets_dir = os.path.join(script_dir, "assets")
+cache_dir = os.getenv("SPRITE_CACHE_DIR", os.path.join(assets_dir, ".cache"))
+
+
+def sprite_files(sprite_dir: str) -> List[str]:
+    return sorted([f for f in os.listdir(sprite_dir) if f.lower().endswith(".png")])
+
+
+def folder_key(sprite_dir: str) -> str:
+    """
+    Returns a key that changes whenever a sprite in the folder is added, removed or changed.
+
+    Only the names, sizes and modification times of the sprites are keyed, so that
+    finding the atlas doesn't read the sprites it replaces.
+    """
+    digest = hashlib.sha256(f"{ATLAS_VERSION}".encode())
+    for png_file in sprite_files(sprite_dir):
+        stat = os.stat(os.path.join(sprite_dir, png_file))
+        digest.update(f"{png_file}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def atlas_path(sprite_dir: str, key: Optional[str] = None) -> str:
+    name = os.path.basename(os.path.normpath(sprite_dir))
+    return os.path.join(cache_dir, f"{name}-{key or folder_key(sprite_dir)}.atlas")
+
+
+def build_atlas(sprite_dir: str, path: str):
+    """
+    Decodes all sprites of a folder and packs them into a single raw RGB atlas file.
+
+    The file starts with a magic, a JSON header and padding up to the alignment,
+    followed by the raw frames back to back.
+    """
+    png_files = sprite_files(sprite_dir)
+    if not png_files:
+        raise ValueError(f"No sprites found in {sprite_dir}")
+
+    size = None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file first, so that concurrent readers never see a partial atlas
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.seek(ATLAS_ALIGNMENT)
+            for png_file in png_files:
+                with Image.open(os.path.join(sprite_dir, png_file)) as img:
+                    img = img.convert("RGB")
+                    if size is None:
+                        size = img.size
+                    elif img.size != size:
+                        raise ValueError(f"Sprite {png_file} is {img.size}, expected {size}")
+                    f.write(img.tobytes())
+            header = json.dumps({"version": ATLAS_VERSION, "size": size, "format": "RGB", "frames": png_files}).encode()
+            if len(ATLAS_MAGIC) + 4 + len(header) > ATLAS_ALIGNMENT:
+                raise ValueError(f"Too many sprites in {sprite_dir}")
+            f.seek(0)
+            f.write(ATLAS_MAGIC + struct.pack("<I", len(header)) + header)
+        # mkstemp creates the file private to the user building it
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    logger.info(f"Built sprite atlas {path} with {len(png_files)} frames")
+
+
+class SpriteAtlas:
+    """
+    A sprite folder packed into a memory-mapped raw RGB atlas.
+
+    Processes using the same atlas share its pages: the images of the frames are
+    memoryviews into the map, not copies. Frame objects are created when first used
+    and kept around.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[: len(ATLAS_MAGIC)] != ATLAS_MAGIC:
+            raise ValueError(f"{path} is not a sprite atlas")
+        offset = len(ATLAS_MAGIC)
+        (header_length,) = struct.unpack_from("<I", self._map, offset)
+        header = json.loads(self._map[offset + 4 : offset + 4 + header_length])
+        if header["version"] != ATLAS_VERSION:
+            raise ValueError(f"{path} has atlas version {header['version']}, expected {ATLAS_VERSION}")
+        self.size = tuple(header["size"])
+        self.format = header["format"]
+        self.names = header["frames"]
+        self.frame_bytes = self.size[0] * self.size[1] * len(self.format)
+        self._frames: List[Optional[OutputImageRawFrame]] = [None] * len(self.names)
+
+    @classmethod
+    def load(cls, sprite_dir: str) -> "SpriteAtlas":
+        """
+        Loads the atlas of a sprite folder, building it first if it is missing or out of date.
+        """
+        key = folder_key(sprite_dir)
+        path = atlas_path(sprite_dir, key)
+        if not os.path.exists(path):
+            try:
+                build_atlas(sprite_dir, path)
+            except PermissionError:
+                # The cache isn't writable (e.g. it wasn't built into the image), fall back to a private one
+                path = os.path.join(tempfile.gettempdir(), os.path.basename(path))
+                logger.warning(f"Sprite cache {cache_dir} is not writable, using {path}")
+                if not os.path.exists(path):
+                    build_atlas(sprite_dir, path)
+        return cls(path)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def frame(self, index: int) -> OutputImageRawFrame:
+        if self._frames[index] is None:
+            start = ATLAS_ALIGNMENT + index * self.frame_bytes
+            image = memoryview(self._map)[start : start + self.frame_bytes]
+            self._frames[index] = OutputImageRawFrame(image=image, size=self.size, format=self.format)
+        return self._frames[index]
+
+    def frames(self) -> List[OutputImageRawFrame]:
+        return [self.frame(i) for i in range(len(self))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the sprite atlas cache")
+    parser.add_argument("folders", nargs="*", help="Sprite folders in the assets directory, defaults to all")
+    args = parser.parse_args()
+
+    folders = args.folders or sorted(
+        f for f in os.listdir(assets_dir) if not f.startswith(".") and os.path.isdir(os.path.join(assets_dir, f))
+    )
+    for folder in folders:
+        sprite_dir = os.path.join(assets_dir, folder)
+        path = atlas_path(sprite_dir)
+        if os.path.exists(path):
+            logger.info(f"Sprite atlas {path} is up to date")
+        else:
+            build_atlas(sprite_dir, path)
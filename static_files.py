@@ -0,0 +1,156 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Mapping, Optional
+
+from loguru import logger
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Files with a content hash in their path never change, e.g. Next.js' _next/static/chunks/main-3f2a1b9c.js
+_HASHED = re.compile(r"(^|/)_next/static/|[.-][0-9a-f]{8,}\.\w+$")
+_COMPRESSIBLE = re.compile(r"^text/|javascript|json|xml|svg|wasm")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Everything else may be cached, but is revalidated with its ETag on every use
+REVALIDATE = "no-cache"
+
+
+@dataclass
+class StaticAsset:
+    body: bytes
+    content_type: str
+    etag: str
+    cache_control: str
+    # Compressed bodies by content encoding, only where compression pays off
+    encoded: Dict[str, bytes] = field(default_factory=dict)
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        # Each representation needs its own strong ETag
+        return f'"{self.etag}-{encoding}"' if encoding else f'"{self.etag}"'
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """
+    Parses an Accept-Encoding header into the q-value of each encoding.
+    """
+    encodings = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            encodings[name] = q
+    return encodings
+
+
+class StaticIndex:
+    """
+    Serves a static site (the exported frontend) from memory.
+
+    The directory is read once when the index is built: every file is kept with its
+    content type, a content hash as ETag and, for text formats, gzip and (if the
+    brotli package is installed) brotli variants compressed ahead of time. Requests
+    are then answered without touching the filesystem, with a 304 when the client's
+    If-None-Match matches.
+
+    Files with a content hash in their name are served as immutable, everything else
+    has to be revalidated. Like the export's own server, "about" serves "about.html",
+    and a directory serves its "index.html".
+    """
+
+    def __init__(self, directory: str, min_compress_size: int = 512):
+        self.directory = directory
+        self.min_compress_size = min_compress_size
+        self.assets: Dict[str, StaticAsset] = {}
+        self._paths: Dict[str, str] = {}
+        self._build()
+
+    def _build(self):
+        size = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.relpath(os.path.join(root, name), self.directory).replace(os.sep, "/")
+                with open(os.path.join(root, name), "rb") as f:
+                    asset = self._asset(path, f.read())
+                self.assets[path] = asset
+                size += len(asset.body) + sum(len(body) for body in asset.encoded.values())
+
+        for path in self.assets:
+            self._paths[path] = path
+        for path in self.assets:
+            if path.endswith(".html"):
+                # Pretty URLs only where no file has that name
+                self._paths.setdefault(path[: -len(".html")], path)
+            if path == "index.html" or path.endswith("/index.html"):
+                self._paths.setdefault(path[: -len("index.html")].rstrip("/"), path)
+        logger.info(f"Indexed {len(self.assets)} static files from {self.directory} ({size / 1024:.0f} KiB in memory)")
+
+    def _asset(self, path: str, body: bytes) -> StaticAsset:
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        asset = StaticAsset(
+            body=body,
+            content_type=content_type,
+            etag=hashlib.sha256(body).hexdigest()[:20],
+            cache_control=IMMUTABLE if _HASHED.search(path) else REVALIDATE,
+        )
+        if len(body) >= self.min_compress_size and _COMPRESSIBLE.search(content_type):
+            variants = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+            if brotli:
+                variants["br"] = brotli.compress(body, quality=11)
+            # Only worth it if it saves at least a tenth
+            asset.encoded = {encoding: data for encoding, data in variants.items() if len(data) < len(body) * 0.9}
+        return asset
+
+    def lookup(self, path: str) -> Optional[StaticAsset]:
+        path = self._paths.get(path.strip("/"))
+        return self.assets[path] if path else None
+
+    def response(self, path: str, headers: Mapping[str, str]) -> Optional[Response]:
+        """
+        Returns the response to a GET of `path` with the request's `headers`, or None if there's no such file.
+        """
+        asset = self.lookup(path)
+        if not asset:
+            return None
+
+        encoding = None
+        if asset.encoded:
+            accepted = accepted_encodings(headers.get("accept-encoding", ""))
+            # The smallest variant the client accepts
+            for candidate in ("br", "gzip"):
+                if candidate in asset.encoded and accepted.get(candidate, 0) > 0:
+                    encoding = candidate
+                    break
+
+        response_headers = {"ETag": asset.etag_for(encoding), "Cache-Control": asset.cache_control}
+        if asset.encoded:
+            response_headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            # A client may revalidate a representation in another encoding than it accepts now
+            if "*" in tags or tags & {asset.etag_for(e) for e in (None, *asset.encoded)}:
+                return Response(status_code=304, headers=response_headers)
+
+        if encoding:
+            response_headers["Content-Encoding"] = encoding
+        return Response(
+            content=asset.encoded[encoding] if encoding else asset.body,
+            headers=response_headers,
+            media_type=asset.content_type,
+        )
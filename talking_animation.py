@@ -1,63 +1,132 @@
+import functools
 import os
+from typing import Optional
 
+import numpy as np
 from loguru import logger
-from PIL import Image
 
-from pipecat.frames.frames import (Frame, OutputImageRawFrame, SpriteFrame,
-                                   TTSAudioRawFrame, TTSStoppedFrame)
+from pipecat.frames.frames import (Frame, SpriteFrame, TTSAudioRawFrame,
+                                   TTSStoppedFrame)
 from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from sprite_atlas import SpriteAtlas, assets_dir
 
-sprites = []
 
-script_dir = os.path.dirname(__file__)
-assets_dir = os.path.join(script_dir, "assets")
-
-# Find the first subfolder in the assets directory
-subfolder = os.getenv("SPRITE_FOLDER", "parkingmeter")
-sprite_dir = os.path.join(assets_dir, subfolder)
-logger.info(f"Using sprite folder: {sprite_dir}")
-
-# Get all PNG files in the subfolder
-png_files = sorted([f for f in os.listdir(sprite_dir) if f.lower().endswith(".png")])
+@functools.lru_cache(maxsize=None)
+def load_atlas(subfolder: str) -> SpriteAtlas:
+    """
+    Loads a sprite folder from the atlas cache. The atlas is shared by all TalkingAnimations using the same folder.
+    """
+    sprite_dir = os.path.join(assets_dir, subfolder)
+    logger.info(f"Using sprite folder: {sprite_dir}")
+    return SpriteAtlas.load(sprite_dir)
 
-for png_file in png_files:
-    full_path = os.path.join(sprite_dir, png_file)
-    # logger.info(f"Loading sprite: {full_path}")
-    with Image.open(full_path) as img:
-        sprites.append(OutputImageRawFrame(image=img.tobytes(), size=img.size, format=img.format))
 
-# Add reversed sprites to create a loop
-sprites.extend(sprites[::-1])
+def mouth_indices(audio: bytes, window_samples: int, count: int, floor: float, ceiling: float) -> np.ndarray:
+    """
+    Maps the RMS energy of each window of 16-bit PCM audio to a sprite index.
 
-# When the bot isn't talking, show a static image of the cat listening
-quiet_frame = sprites[0]
-talking_frame = SpriteFrame(images=sprites)
+    Windows quieter than `floor` (as a fraction of full scale) map to sprite 0, windows
+    at or above `ceiling` map to the last sprite, everything in between linearly.
+    """
+    samples = np.frombuffer(audio, dtype=np.int16).astype(np.float32)
+    windows = -(-len(samples) // window_samples)
+    if windows * window_samples != len(samples):
+        samples = np.pad(samples, (0, windows * window_samples - len(samples)))
+    samples = samples.reshape(windows, window_samples)
+    rms = np.sqrt(np.einsum("ij,ij->i", samples, samples) / window_samples) / 32768
+    levels = (rms - floor) * ((count - 1) / (ceiling - floor))
+    return np.ceil(np.clip(levels, 0, count - 1)).astype(np.int32)
 
 
 class TalkingAnimation(FrameProcessor):
     """
     This class starts a talking animation when it receives an first AudioFrame,
     and then returns to a "quiet" sprite when it sees a TTSStoppedFrame.
+
+    With `lip_sync=True` the sprite follows the speech instead: every TTS audio chunk is
+    split into windows of `lip_sync_window` seconds, and each window's energy picks a
+    sprite. A new image is only pushed when the sprite changes, right before the audio
+    it belongs to, so the output transport shows it in step with the audio.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        sprite_folder: Optional[str] = None,
+        lip_sync: bool = False,
+        lip_sync_window: float = 0.04,
+        lip_sync_floor: float = 0.01,
+        lip_sync_ceiling: float = 0.2,
+    ):
         super().__init__()
         self._is_talking = False
-        self.sprite_width = sprites[0].size[0]
-        self.sprite_height = sprites[0].size[1]
+        self._atlas = load_atlas(sprite_folder or os.getenv("SPRITE_FOLDER", "parkingmeter"))
+        self._talking_frame: Optional[SpriteFrame] = None
+        self._lip_sync = lip_sync
+        self._lip_sync_window = lip_sync_window
+        self._lip_sync_floor = lip_sync_floor
+        self._lip_sync_ceiling = lip_sync_ceiling
+        self._mouth_index = 0
+        self.sprite_width = self._atlas.size[0]
+        self.sprite_height = self._atlas.size[1]
 
     def quiet_frame(self):
-        return quiet_frame
+        # When the bot isn't talking, show a static image of the cat listening
+        return self._atlas.frame(0)
+
+    def talking_frame(self):
+        if self._talking_frame is None:
+            sprites = self._atlas.frames()
+            # Add reversed sprites to create a loop
+            self._talking_frame = SpriteFrame(images=sprites + sprites[::-1])
+        return self._talking_frame
 
     async def process_frame(self, frame: Frame, direction: FrameDirection):
         await super().process_frame(frame, direction)
 
-        if isinstance(frame, TTSAudioRawFrame):
+        if self._lip_sync and isinstance(frame, TTSAudioRawFrame):
+            await self._lip_sync_audio(frame)
+            return
+        elif self._lip_sync and isinstance(frame, TTSStoppedFrame):
+            await self._set_mouth(0)
+        elif isinstance(frame, TTSAudioRawFrame):
             if not self._is_talking:
-                await self.push_frame(talking_frame)
+                await self.push_frame(self.talking_frame())
                 self._is_talking = True
         elif isinstance(frame, TTSStoppedFrame):
-            await self.push_frame(quiet_frame)
+            await self.push_frame(self.quiet_frame())
             self._is_talking = False
 
         await self.push_frame(frame)
+
+    async def _lip_sync_audio(self, frame: TTSAudioRawFrame):
+        window_samples = max(1, int(frame.sample_rate * self._lip_sync_window)) * frame.num_channels
+        indices = mouth_indices(
+            frame.audio, window_samples, len(self._atlas), self._lip_sync_floor, self._lip_sync_ceiling
+        )
+        changes = np.flatnonzero(np.diff(indices, prepend=self._mouth_index))
+        if len(changes) == 0:
+            await self.push_frame(frame)
+            return
+
+        # Split the audio where the sprite changes, so that each image precedes its audio
+        window_bytes = window_samples * 2
+        start = 0
+        for change in changes:
+            if change > 0:
+                await self._push_audio(frame, start, change * window_bytes)
+                start = change * window_bytes
+            await self._set_mouth(int(indices[change]))
+        await self._push_audio(frame, start, len(frame.audio))
+
+    async def _push_audio(self, frame: TTSAudioRawFrame, start: int, end: int):
+        if end > start:
+            await self.push_frame(
+                TTSAudioRawFrame(
+                    audio=frame.audio[start:end], sample_rate=frame.sample_rate, num_channels=frame.num_channels
+                )
+            )
+
+    async def _set_mouth(self, index: int):
+        if index != self._mouth_index:
+            self._mouth_index = index
+            await self.push_frame(self._atlas.frame(index))
@@ -0,0 +1,56 @@
+import unittest
+
+from addressing import AddressGate, cologne_phonetics, is_question, names_from_prompt, parse_rules
+from prompts import get_llm_base_prompt
+
+PROMPT = get_llm_base_prompt("Moderator", "Du bist ein Moderator in einer Unterhaltung. Du hoerst auf den Namen Mila.")
+
+
+class TestAddressing(unittest.TestCase):
+    def test_cologne_phonetics(self):
+        self.assertEqual(cologne_phonetics("Müller-Lüdenscheidt"), "65752682")
+        self.assertEqual(cologne_phonetics("Moderator"), cologne_phonetics("Moderatur"))
+        self.assertNotEqual(cologne_phonetics("Moderator"), cologne_phonetics("Motivation"))
+
+    def test_names_from_prompt(self):
+        self.assertEqual(names_from_prompt(PROMPT), ["Moderator", "Mila"])
+
+    def test_is_question(self):
+        for text in ["Wie spät ist es", "Kannst du das zusammenfassen", "Das passt?", "Worüber reden wir"]:
+            self.assertTrue(is_question(text), text)
+        for text in ["Das passt.", "Du kannst das", "Wir reden über das Budget"]:
+            self.assertFalse(is_question(text), text)
+
+    def test_parse_rules(self):
+        self.assertEqual(parse_rules("name, follow_up"), ("name", "follow_up"))
+        self.assertEqual(parse_rules(""), ())
+        with self.assertRaises(ValueError):
+            parse_rules("name,vibes")
+
+    def test_mentions_name(self):
+        gate = AddressGate.from_prompt(PROMPT, aliases=["KI"])
+        for text in [
+            "Moderator, was meinst du",
+            "moderatur fass das mal zusammen",
+            "Hey Mode rator",
+            "Was sagt Mila dazu",
+            "Frag doch die KI",
+        ]:
+            self.assertTrue(gate.mentions_name(text), text)
+        for text in ["Das Budget ist knapp", "Wir brauchen mehr Motivation", "Kiel ist schön", "modern art"]:
+            self.assertFalse(gate.mentions_name(text), text)
+
+    def test_rules_and_metrics(self):
+        gate = AddressGate(["Moderator"])
+        self.assertFalse(gate.forward(["Wie spät ist es?"]))
+        self.assertTrue(gate.forward(["Wie spät ist es?"], after_bot=True))
+        self.assertTrue(gate.forward(["Das Budget ist knapp", "Moderator, stimmt das?"]))
+        self.assertFalse(gate.forward(["Das Budget ist knapp"], after_bot=True))
+        self.assertEqual(gate.metrics, {"forwarded": 2, "skipped": 2, "name": 1, "follow_up": 1})
+
+        self.assertEqual(AddressGate([], ["question"]).rule(["Wie spät ist es?"]), "question")
+        self.assertEqual(AddressGate([], ["all"]).rule(["Hallo"]), "all")
+
+
+if __name__ == "__main__":
+    unittest.main()
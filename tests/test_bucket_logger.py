@@ -0,0 +1,200 @@
+import json
+import asyncio
+import os
+import threading
+import unittest
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_aws
+from pipecat.frames.frames import UserStoppedSpeakingFrame
+from pipecat.processors.frame_processor import FrameDirection
+
+from processors import BucketLogger
+from transcript_store import TRANSCRIPT_NAME, list_sessions, read_session
+from uploader import BackgroundUploader
+
+BUCKET = "mds-moderator-test"
+
+
+class FlakyS3Client:
+    """Wraps an S3 client and fails the first `failures` put_object calls."""
+
+    def __init__(self, client, failures: int):
+        self.client = client
+        self.failures = failures
+        self.calls = 0
+
+    def put_object(self, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ClientError({"Error": {"Code": "SlowDown", "Message": "Slow down"}}, "PutObject")
+        return self.client.put_object(**kwargs)
+
+
+class HangingS3Client:
+    """Wraps an S3 client and blocks put_object until released."""
+
+    def __init__(self, client):
+        self.client = client
+        self.released = threading.Event()
+
+    def put_object(self, **kwargs):
+        self.released.wait()
+        return self.client.put_object(**kwargs)
+
+
+class CountingS3Client:
+    """Wraps an S3 client and counts the calls of each operation."""
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = {}
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return getattr(self.client, name)(*args, **kwargs)
+
+        return call
+
+
+class TestBucketLogger(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+        os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+        os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+        os.environ.pop("AWS_ENDPOINT_URL_S3", None)
+        self.mock = mock_aws()
+        self.mock.start()
+        self.s3 = boto3.client("s3", region_name="us-east-1")
+        self.s3.create_bucket(Bucket=BUCKET)
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def keys(self, prefix):
+        return sorted(o["Key"] for o in self.s3.list_objects_v2(Bucket=BUCKET, Prefix=prefix).get("Contents", []))
+
+    async def test_uploads_a_transcript_and_manifest(self):
+        messages = [{"role": "user", "content": f"Nachricht {i}"} for i in range(10)]
+        uploader = BackgroundUploader(BUCKET, s3_client=self.s3)
+        bucket_logger = BucketLogger(messages, BUCKET, "conversation-test", uploader=uploader)
+
+        await bucket_logger.process_frame(UserStoppedSpeakingFrame(), FrameDirection.DOWNSTREAM)
+        messages.append({"role": "assistant", "content": "Antwort"})
+        await bucket_logger.cleanup()
+
+        self.assertEqual(
+            self.keys("conversation-test/"), ["conversation-test/manifest.json", f"conversation-test/{TRANSCRIPT_NAME}"]
+        )
+        client = CountingS3Client(self.s3)
+        self.assertEqual(read_session(client, BUCKET, "conversation-test"), messages)
+        self.assertEqual(client.calls, {"get_object": 2})
+        session_manifest = json.loads(
+            self.s3.get_object(Bucket=BUCKET, Key="conversation-test/manifest.json")["Body"].read()
+        )
+        self.assertEqual((session_manifest["messages"], session_manifest["complete"]), (11, True))
+        self.assertEqual(uploader.metrics["uploaded"], 2)
+        self.assertEqual(uploader.metrics["failed"], 0)
+
+    async def test_segments_by_size_and_time(self):
+        messages = [{"role": "user", "content": "x" * 100}]
+        uploader = BackgroundUploader(BUCKET, s3_client=self.s3)
+        bucket_logger = BucketLogger(messages, BUCKET, "conversation-seg", uploader=uploader, segment_bytes=350)
+
+        bucket_logger.log_messages()
+        messages.append({"role": "assistant", "content": "y" * 100})
+        bucket_logger.log_messages()
+        self.assertEqual(len(bucket_logger.segments), 0)
+        messages.append({"role": "user", "content": "z" * 100})
+        bucket_logger.log_messages()
+        self.assertEqual([(s["first"], s["count"]) for s in bucket_logger.segments], [(0, 3)])
+
+        bucket_logger.segment_interval = 0
+        messages.append({"role": "assistant", "content": "kurz"})
+        bucket_logger.log_messages()
+        await uploader.flush()
+        self.assertEqual(len(self.keys("conversation-seg/segment-")), 2)
+        # A running session reads back from its segments
+        self.assertEqual(read_session(self.s3, BUCKET, "conversation-seg/"), messages)
+
+        messages.append({"role": "user", "content": "tschüss"})
+        await bucket_logger.cleanup()
+        self.assertEqual(self.keys("conversation-seg/segment-"), [])
+        self.assertEqual(read_session(self.s3, BUCKET, "conversation-seg/"), messages)
+
+    async def test_reads_the_legacy_layout(self):
+        messages = [{"role": "user", "content": f"message {i}"} for i in range(3)]
+        for i, message in enumerate(messages):
+            self.s3.put_object(Bucket=BUCKET, Key=f"conversation-old/{i:06d}.json", Body=json.dumps(message, indent=4))
+
+        self.assertEqual(read_session(self.s3, BUCKET, "conversation-old"), messages)
+        self.assertEqual(list_sessions(self.s3, BUCKET), ["conversation-old/"])
+
+    async def test_retries_failed_uploads(self):
+        messages = [{"role": "user", "content": "hello"}]
+        client = FlakyS3Client(self.s3, failures=2)
+        uploader = BackgroundUploader(BUCKET, s3_client=client, backoff_base=0.01)
+        bucket_logger = BucketLogger(messages, BUCKET, "conversation-retry", uploader=uploader)
+
+        bucket_logger.log_messages()
+        await bucket_logger.cleanup()
+
+        self.assertEqual(read_session(self.s3, BUCKET, "conversation-retry"), messages)
+        self.assertEqual(uploader.metrics["retried"], 2)
+
+    async def test_failed_transcript_keeps_the_segments(self):
+        messages = [{"role": "user", "content": "hello"}]
+        client = FlakyS3Client(self.s3, failures=0)
+        uploader = BackgroundUploader(BUCKET, s3_client=client, max_retries=0)
+        bucket_logger = BucketLogger(messages, BUCKET, "conversation-kept", uploader=uploader, segment_interval=0)
+
+        bucket_logger.log_messages()
+        await uploader.flush()
+        client.failures = client.calls + 1
+        await bucket_logger.cleanup()
+
+        self.assertEqual(self.keys("conversation-kept/"), ["conversation-kept/segment-000000.jsonl.gz"])
+        self.assertEqual(read_session(self.s3, BUCKET, "conversation-kept"), messages)
+
+    async def test_full_queue_keeps_messages_pending(self):
+        messages = [{"role": "user", "content": "message 0"}]
+        uploader = BackgroundUploader(BUCKET, s3_client=self.s3, max_queue_size=1, concurrency=1)
+        bucket_logger = BucketLogger(messages, BUCKET, "conversation-full", uploader=uploader, segment_interval=0)
+
+        self.assertEqual(bucket_logger.log_messages(), 0)
+        messages.append({"role": "user", "content": "message 1"})
+        self.assertEqual(bucket_logger.log_messages(), 1)
+        self.assertGreater(uploader.metrics["rejected"], 0)
+
+        await bucket_logger.cleanup()
+        self.assertEqual(read_session(self.s3, BUCKET, "conversation-full"), messages)
+        self.assertFalse(uploader.submit("late.json", "{}"))
+
+    async def test_cleanup_after_close_returns(self):
+        messages = [{"role": "user", "content": "hello"}]
+        uploader = BackgroundUploader(BUCKET, s3_client=self.s3)
+        bucket_logger = BucketLogger(messages, BUCKET, "conversation-twice", uploader=uploader)
+
+        await bucket_logger.cleanup()
+        messages.append({"role": "user", "content": "late"})
+        # The uploader is closed now, uploading gives up instead of spinning
+        await asyncio.wait_for(bucket_logger.cleanup(), 1)
+        self.assertEqual(read_session(self.s3, BUCKET, "conversation-twice"), messages[:1])
+
+    async def test_cleanup_is_bounded_by_the_flush_timeout(self):
+        messages = [{"role": "user", "content": "hello"}]
+        client = HangingS3Client(self.s3)
+        uploader = BackgroundUploader(BUCKET, s3_client=client)
+        bucket_logger = BucketLogger(messages, BUCKET, "conversation-slow", uploader=uploader, flush_timeout=0.1)
+
+        try:
+            await asyncio.wait_for(bucket_logger.cleanup(), 1)
+        finally:
+            client.released.set()
+        self.assertTrue(uploader.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
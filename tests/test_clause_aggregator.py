@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+
+from clause_aggregator import ClauseAggregator, find_clause_boundary
+from pipecat.frames.frames import LLMFullResponseEndFrame, StartInterruptionFrame, TextFrame, TTSSpeakFrame
+from pipecat.processors.frame_processor import FrameDirection
+
+
+def boundary(text: str, min_chars: int = 20) -> str:
+    return text[: find_clause_boundary(text, min_chars)]
+
+
+class TestFindClauseBoundary(unittest.TestCase):
+    def test_sentence_ends(self):
+        self.assertEqual(boundary("Ja. Das"), "Ja.")
+        self.assertEqual(boundary("Wirklich?"), "Wirklich?")
+        self.assertEqual(boundary("Er sagte „Hallo.“ Dann"), "Er sagte „Hallo.“")
+
+    def test_abbreviations_ordinals_and_dates(self):
+        self.assertEqual(boundary("Das ist z.B. gut so"), "")
+        self.assertEqual(boundary("Äpfel, Birnen usw. sind Obst"), "")
+        self.assertEqual(boundary("Das ist z."), "")
+        self.assertEqual(boundary("Am 3. Oktober ist"), "")
+        self.assertEqual(boundary("Bis zum 18.10. haben"), "")
+        self.assertEqual(boundary("Wir fragen Dr. Müller"), "")
+
+    def test_clauses_need_min_chars(self):
+        self.assertEqual(boundary("Ja, klar"), "")
+        self.assertEqual(boundary("Wenn du morgen kommst, dann"), "Wenn du morgen kommst,")
+        self.assertEqual(boundary("Das ist der ganze Punkt - und zwar"), "Das ist der ganze Punkt -")
+
+    def test_numbers_are_not_split(self):
+        self.assertEqual(boundary("Das kostet ungefähr 3,"), "")
+        self.assertEqual(boundary("Das kostet ungefähr 3,5 Euro, aber"), "Das kostet ungefähr 3,5 Euro,")
+        self.assertEqual(boundary("Wir treffen uns um 10:"), "")
+
+
+class TestClauseAggregator(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.aggregator = ClauseAggregator(min_chars=20, max_wait=0.1)
+        self.pushed = []
+
+        async def push_frame(frame, direction=FrameDirection.DOWNSTREAM):
+            self.pushed.append(frame)
+
+        self.aggregator.push_frame = push_frame
+
+    async def send(self, *texts: str):
+        for text in texts:
+            await self.aggregator.process_frame(TextFrame(text), FrameDirection.DOWNSTREAM)
+
+    def spoken(self):
+        return [f.text for f in self.pushed if isinstance(f, TTSSpeakFrame)]
+
+    async def test_flushes_clauses_as_they_complete(self):
+        await self.send("Wenn du", " morgen kommst", ",", " dann", " reden", " wir", ". Bis")
+        self.assertEqual(self.spoken(), ["Wenn du morgen kommst,", "dann reden wir."])
+
+        await self.aggregator.process_frame(LLMFullResponseEndFrame(), FrameDirection.DOWNSTREAM)
+        self.assertEqual(self.spoken(), ["Wenn du morgen kommst,", "dann reden wir.", "Bis"])
+        self.assertIsInstance(self.pushed[-1], LLMFullResponseEndFrame)
+        self.assertEqual(self.aggregator.metrics, {"boundary": 2, "timeout": 0, "end": 1})
+
+    async def test_max_wait_flushes_complete_words(self):
+        await self.send("Das ist ein sehr langer Satz ohne jede Pause", " und imm")
+        await asyncio.sleep(0.15)
+        self.assertEqual(self.spoken(), ["Das ist ein sehr langer Satz ohne jede Pause und"])
+
+        await self.send("er weiter.")
+        self.assertEqual(self.spoken()[-1], "immer weiter.")
+        self.assertEqual(self.aggregator.metrics["timeout"], 1)
+
+    async def test_interruption_drops_pending_text(self):
+        await self.send("Das wird nie gesagt")
+        await self.aggregator.process_frame(StartInterruptionFrame(), FrameDirection.DOWNSTREAM)
+        await self.aggregator.process_frame(LLMFullResponseEndFrame(), FrameDirection.DOWNSTREAM)
+        await asyncio.sleep(0.15)
+        self.assertEqual(self.spoken(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import asyncio
+import unittest
+
+from context_window import ContextWindow, count_tokens
+from pipecat.frames.frames import LLMMessagesFrame
+from pipecat.processors.frame_processor import FrameDirection
+from prompts import get_llm_base_prompt
+
+
+class FakeSummarizer:
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, summary, messages):
+        self.calls.append(list(messages))
+        await asyncio.sleep(self.delay)
+        return f"{sum(len(c) for c in self.calls)} messages"
+
+
+class TestContextWindow(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.messages = [get_llm_base_prompt("Moderator", "Du bist ein Moderator.")]
+        self.summarizer = FakeSummarizer()
+        self.window = ContextWindow(self.messages, max_tokens=600, summarizer=self.summarizer)
+
+    def add_turn(self, i: int):
+        self.messages.append({"role": "user", "content": f"10:00:{i % 60:02d} | Anna | Frage Nummer {i} " * 5})
+        self.messages.append({"role": "assistant", "content": f"Antwort auf Frage {i}. " * 5})
+
+    async def test_context_stays_within_budget(self):
+        for i in range(200):
+            self.add_turn(i)
+            context = self.window.context()
+            self.assertLessEqual(sum(count_tokens(m) for m in context), 600)
+            self.assertIs(context[0], self.messages[0])
+            self.assertIs(context[-1], self.messages[-1])
+            await asyncio.sleep(0)
+
+        # The shared transcript is untouched
+        self.assertEqual(len(self.messages), 401)
+        self.assertGreater(self.window.metrics["evicted"], 350)
+        self.assertTrue(self.window.summary)
+
+    async def test_summary_runs_in_the_background(self):
+        self.summarizer.delay = 0.2
+        for i in range(20):
+            self.add_turn(i)
+
+        # Evicting doesn't wait for the summary
+        start = asyncio.get_running_loop().time()
+        context = self.window.context()
+        self.assertLess(asyncio.get_running_loop().time() - start, 0.1)
+        self.assertEqual(context[1]["role"], "user")
+        evicted = self.window.metrics["evicted"]
+
+        await asyncio.sleep(0.3)
+        context = self.window.context()
+        self.assertIn("Summary of the earlier conversation", context[1]["content"])
+        self.assertEqual(self.summarizer.calls[0], self.messages[1 : 1 + evicted])
+
+    async def test_replaces_llm_messages_frames(self):
+        for i in range(20):
+            self.add_turn(i)
+        pushed = []
+
+        async def push_frame(frame, direction=FrameDirection.DOWNSTREAM):
+            pushed.append(frame)
+
+        self.window.push_frame = push_frame
+        await self.window.process_frame(LLMMessagesFrame(self.messages), FrameDirection.DOWNSTREAM)
+
+        self.assertLess(len(pushed[0].messages), len(self.messages))
+        self.assertIs(pushed[0].messages[0], self.messages[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
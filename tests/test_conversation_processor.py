@@ -1,8 +1,11 @@
 import unittest
+from unittest import mock
 
-from pipecat.frames.frames import TranscriptionFrame, UserStartedSpeakingFrame
-from pipecat.processors.frame_processor import FrameDirection
-
+from addressing import AddressGate
+from pipecat.frames.frames import (LLMMessagesFrame, TranscriptionFrame,
+                                   UserStartedSpeakingFrame,
+                                   UserStoppedSpeakingFrame)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
 from processors import ConversationProcessor
 
 
@@ -48,6 +51,37 @@ class TestConversationProcessor(unittest.IsolatedAsyncioTestCase):
             timestamp_str = history[i]["timestamp"].isoformat(timespec="microseconds") + "Z"
             self.assertEqual(timestamp_str, entry["timestamp"])
 
+    async def test_gate_skips_turns_not_addressed_to_the_bot(self):
+        pushed = []
+
+        async def push_frame(processor, frame, direction=FrameDirection.DOWNSTREAM):
+            pushed.append(frame)
+
+        with mock.patch.object(FrameProcessor, "push_frame", push_frame):
+            messages = [{"role": "system", "content": "Du bist ein Moderator."}]
+            gate = AddressGate(["Moderator"])
+            processor = ConversationProcessor(messages, gate=gate)
+            processor.add_user_mapping("user1", "Anna")
+
+            async def turn(text: str, second: int):
+                await processor.process_frame(UserStartedSpeakingFrame(), FrameDirection.DOWNSTREAM)
+                frame = TranscriptionFrame(text, "user1", f"2023-07-13T10:00:{second:02d}.000000Z")
+                await processor.process_frame(frame, FrameDirection.DOWNSTREAM)
+                await processor.process_frame(UserStoppedSpeakingFrame(), FrameDirection.DOWNSTREAM)
+
+            await turn("Das Budget ist knapp", 0)
+            self.assertFalse(any(isinstance(frame, LLMMessagesFrame) for frame in pushed))
+            await turn("Moderatur, was meinst du?", 5)
+
+        llm_frames = [frame for frame in pushed if isinstance(frame, LLMMessagesFrame)]
+        self.assertEqual(len(llm_frames), 1)
+        # The skipped turn is kept as context
+        self.assertEqual(
+            [message["content"] for message in llm_frames[0].messages[1:]],
+            ["10:00:00 | Anna | Das Budget ist knapp", "10:00:05 | Anna | Moderatur, was meinst du?"],
+        )
+        self.assertEqual(gate.metrics, {"forwarded": 1, "skipped": 1, "name": 1, "follow_up": 0})
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,138 @@
+import asyncio
+import itertools
+import time
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from fly_api import FlyAPIError, FlyMachinesClient, RateLimiter
+
+BOOT_TIME = 0.3
+
+
+class FakeMachinesAPI:
+    """A local stand-in for the Fly machines API, where machines take BOOT_TIME to start."""
+
+    def __init__(self):
+        self.ids = itertools.count()
+        self.machines = {}
+        self.list_calls = 0
+        # Requests answered with a 503 before the API recovers
+        self.failures = 0
+
+    @web.middleware
+    async def flaky(self, request, handler):
+        if self.failures > 0:
+            self.failures -= 1
+            return web.json_response({"error": "unavailable"}, status=503)
+        return await handler(request)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.flaky])
+        app.router.add_get("/apps/{app}/machines", self.list_machines)
+        app.router.add_post("/apps/{app}/machines", self.create_machine)
+        app.router.add_get("/apps/{app}/machines/{id}/wait", self.wait)
+        app.router.add_delete("/apps/{app}/machines/{id}", self.destroy)
+        return app
+
+    async def list_machines(self, request):
+        self.list_calls += 1
+        return web.json_response([{"id": "runner", "config": {"image": "registry.fly.io/mds-moderator:latest"}}])
+
+    async def create_machine(self, request):
+        vm_id = f"vm-{next(self.ids)}"
+        self.machines[vm_id] = {"config": (await request.json())["config"], "started_at": time.monotonic() + BOOT_TIME}
+        return web.json_response({"id": vm_id})
+
+    async def wait(self, request):
+        machine = self.machines.get(request.match_info["id"])
+        if machine is None:
+            return web.json_response({"error": "not found"}, status=404)
+        timeout = int(request.query["timeout"])
+        delay = machine["started_at"] - time.monotonic()
+        if delay > timeout:
+            await asyncio.sleep(timeout)
+            return web.json_response({"error": "deadline_exceeded"}, status=408)
+        await asyncio.sleep(max(delay, 0))
+        return web.json_response({"ok": True})
+
+    async def destroy(self, request):
+        self.machines.pop(request.match_info["id"])
+        return web.json_response({"ok": True})
+
+
+class TestFlyMachinesClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.api = FakeMachinesAPI()
+        self.server = TestServer(self.api.app())
+        await self.server.start_server()
+        self.fly = FlyMachinesClient(
+            str(self.server.make_url("")).rstrip("/"), "mds-moderator", "key", rate=100, backoff_base=0.01
+        )
+
+    async def asyncTearDown(self):
+        await self.fly.close()
+        await self.server.close()
+
+    async def spawn(self):
+        image = await self.fly.get_image()
+        machine = await self.fly.create_machine({"config": {"image": image}})
+        await self.fly.wait_for_state(machine["id"], "started", timeout=5)
+        return machine["id"]
+
+    async def test_concurrent_spawns_overlap(self):
+        start = time.monotonic()
+        ids = await asyncio.gather(*[self.spawn() for _ in range(10)])
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(len(set(ids)), 10)
+        self.assertLess(elapsed, 3 * BOOT_TIME)
+        # The image lookup is cached across spawns
+        self.assertEqual(self.api.list_calls, 1)
+
+    async def test_wait_for_state_times_out(self):
+        machine = await self.fly.create_machine({"config": {}})
+        self.api.machines[machine["id"]]["started_at"] += 60
+        with self.assertRaises(TimeoutError):
+            await self.fly.wait_for_state(machine["id"], "started", timeout=1)
+
+    async def test_api_errors(self):
+        with self.assertRaises(FlyAPIError) as cm:
+            await self.fly.wait_for_state("missing", "started", timeout=1)
+        self.assertEqual(cm.exception.status, 404)
+
+    async def test_retries_transient_errors_of_idempotent_requests(self):
+        machine = await self.fly.create_machine({"config": {}})
+        self.api.failures = 2
+        await self.fly.wait_for_state(machine["id"], "started", timeout=5)
+        self.assertEqual(self.api.failures, 0)
+
+        # Creating a machine isn't idempotent
+        self.api.failures = 1
+        with self.assertRaises(FlyAPIError) as cm:
+            await self.fly.create_machine({"config": {}})
+        self.assertEqual(cm.exception.status, 503)
+
+        self.api.failures = self.fly.max_retries + 1
+        with self.assertRaises(FlyAPIError):
+            await self.fly.get_image()
+
+    async def test_destroy_machine(self):
+        vm_id = await self.spawn()
+        await self.fly.destroy_machine(vm_id)
+        self.assertNotIn(vm_id, self.api.machines)
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    async def test_limits_rate_after_burst(self):
+        limiter = RateLimiter(rate=20, burst=5)
+        start = time.monotonic()
+        for _ in range(15):
+            await limiter.acquire()
+        # 5 requests fit into the burst, the other 10 take 0.5 seconds at 20/s
+        self.assertGreaterEqual(time.monotonic() - start, 0.45)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import time
+import unittest
+
+from fork_server import ForkServer
+
+
+class FakeBot:
+    """Stands in for the bot module: each session writes its arguments to a file."""
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+
+    def setup_logging(self, name=None):
+        pass
+
+    async def main(self, room_url, token, bot_name, **kwargs):
+        path = os.path.join(self.out_dir, f"{os.getpid()}.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({"room_url": room_url, "token": token, "bot_name": bot_name, "parent": os.getppid()}, f)
+        # The test polls for the file, it must never see it half written
+        os.replace(f"{path}.tmp", path)
+
+
+def serve(path: str, out_dir: str):
+    server = ForkServer(path)
+    server._bot = FakeBot(out_dir)
+    server.serve()
+
+
+class TestForkServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "fork.sock")
+        self.server = multiprocessing.get_context("fork").Process(target=serve, args=(self.path, self.tmp.name))
+        self.server.start()
+        deadline = time.monotonic() + 5
+        while not os.path.exists(self.path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def tearDown(self):
+        os.kill(self.server.pid, signal.SIGTERM)
+        self.server.join(5)
+        self.tmp.cleanup()
+
+    def request(self, session: dict) -> dict:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(self.path)
+            conn.sendall(json.dumps(session).encode() + b"\n")
+            return json.loads(conn.makefile("rb").readline())
+
+    def test_forks_a_session(self):
+        reply = self.request({"room_url": "https://example.daily.co/a", "token": "t", "bot_name": "Moderator"})
+
+        out = os.path.join(self.tmp.name, f"{reply['pid']}.json")
+        deadline = time.monotonic() + 5
+        while not os.path.exists(out) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with open(out) as f:
+            session = json.load(f)
+        self.assertEqual(session["room_url"], "https://example.daily.co/a")
+        self.assertEqual(session["bot_name"], "Moderator")
+        self.assertEqual(session["parent"], self.server.pid)
+
+    def test_rejects_incomplete_requests(self):
+        self.assertEqual(
+            self.request({"room_url": "https://example.daily.co/a"}), {"error": "room_url and token are required"}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import tempfile
+import unittest
+
+import frame_tracer
+from frame_tracer import FrameTracer, TraceProbe
+from pipecat.frames.frames import ErrorFrame, OutputAudioRawFrame, TextFrame
+from pipecat.processors.frame_processor import FrameDirection
+
+
+class TestFrameTracer(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.tracer = FrameTracer("test", capacity=3, sample_every=10, log_dir=self.log_dir.name)
+
+    def tearDown(self):
+        self.log_dir.cleanup()
+
+    def test_keeps_the_last_records(self):
+        for i in range(5):
+            self.tracer.record("input", TextFrame(str(i)), FrameDirection.DOWNSTREAM)
+        self.tracer.record("output", ErrorFrame("boom"), FrameDirection.UPSTREAM)
+
+        records = self.tracer.records()
+        self.assertEqual([r["frame"] for r in records], ["TextFrame", "TextFrame", "ErrorFrame"])
+        self.assertEqual((records[-1]["probe"], records[-1]["direction"]), ("output", "up"))
+        self.assertEqual(self.tracer.metrics["recorded"], 6)
+
+    def test_samples_high_rate_frames(self):
+        for _ in range(25):
+            self.tracer.record("output", OutputAudioRawFrame(b"\0\0", 16000, 1), FrameDirection.DOWNSTREAM)
+
+        self.assertEqual(len(self.tracer.records()), 3)
+        self.assertEqual(self.tracer.metrics["sampled_out"], 22)
+
+    def test_dump(self):
+        self.assertIsNone(self.tracer.dump("empty"))
+        self.tracer.record("input", TextFrame("hello"), FrameDirection.DOWNSTREAM)
+
+        with open(self.tracer.dump("signal")) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([(r["probe"], r["direction"], r["frame"]) for r in records], [("input", "down", "TextFrame")])
+
+    def test_dump_all(self):
+        # Only the tracers of this test
+        frame_tracer._tracers.clear()
+        frame_tracer._tracers.add(self.tracer)
+        other = FrameTracer("other", log_dir=self.log_dir.name)
+        other.record("llm", TextFrame("hello"), FrameDirection.DOWNSTREAM)
+        self.tracer.record("input", TextFrame("hello"), FrameDirection.DOWNSTREAM)
+
+        paths = frame_tracer.dump_all("signal")
+        self.assertEqual(len(paths), 2)
+        self.assertTrue(any("frames-other-signal-" in path for path in paths))
+
+
+class TestTraceProbe(unittest.IsolatedAsyncioTestCase):
+    async def test_dumps_once_per_error(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            tracer = FrameTracer("test", log_dir=log_dir)
+            probes = [TraceProbe(tracer, "tts"), TraceProbe(tracer, "llm")]
+            pushed = []
+
+            async def push_frame(frame, direction=FrameDirection.DOWNSTREAM):
+                pushed.append(frame)
+
+            for probe in probes:
+                probe.push_frame = push_frame
+
+            await probes[0].process_frame(TextFrame("hello"), FrameDirection.DOWNSTREAM)
+            error = ErrorFrame("boom")
+            for probe in probes:
+                await probe.process_frame(error, FrameDirection.UPSTREAM)
+
+            self.assertEqual(len(pushed), 3)
+            self.assertEqual([r["probe"] for r in tracer.records()], ["tts", "tts", "llm"])
+            self.assertEqual(tracer.metrics["dumps"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
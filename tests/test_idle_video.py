@@ -0,0 +1,58 @@
+import unittest
+
+from idle_video import IdleVideoPacer, VideoFpsProfile, get_fps_profile
+from pipecat.frames.frames import OutputImageRawFrame
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def image(value: int) -> OutputImageRawFrame:
+    return OutputImageRawFrame(image=bytes([value]) * 12, size=(2, 2), format="RGB")
+
+
+class TestIdleVideoPacer(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.pacer = IdleVideoPacer(VideoFpsProfile(fps=10, idle_fps=1, refresh_frames=2), clock=self.clock)
+
+    def tick(self, frame: OutputImageRawFrame) -> bool:
+        sent = self.pacer.should_send(frame)
+        self.clock.now += 0.1
+        return sent
+
+    def test_unchanged_image_is_sent_at_idle_rate(self):
+        quiet = image(0)
+        sent = [self.tick(quiet) for _ in range(30)]
+
+        # The change and its refresh frames, then once a second
+        self.assertEqual(sent[:3], [True, True, True])
+        self.assertEqual(sum(sent), 3 + 2)
+        self.assertEqual(self.pacer.metrics["skipped"], 25)
+
+    def test_changes_are_sent_immediately(self):
+        for _ in range(10):
+            self.tick(image(0))
+
+        self.assertTrue(self.tick(image(1)))
+        # An equal image in a different frame object is not a change
+        self.assertTrue(self.tick(image(1)))
+        self.assertTrue(self.tick(image(1)))
+        self.assertFalse(self.tick(image(1)))
+        self.assertEqual(self.pacer.metrics["changes"], 2)
+
+    def test_animation_is_sent_at_full_rate(self):
+        self.assertTrue(all(self.tick(image(i % 4)) for i in range(20)))
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            get_fps_profile("cinematic")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+import unittest
+
+from pipecat.frames.frames import LLMFullResponseEndFrame
+from pipecat.processors.frame_processor import FrameDirection
+
+from jsonl import JSONLWriter, iter_jsonl, iter_legacy_log, segment_paths
+from processors import ConversationLogger
+
+
+class TestJSONL(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "conversation.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_and_read_back(self):
+        records = [{"role": "user", "content": f"Grüß dich {i}"} for i in range(100)]
+        writer = JSONLWriter(self.path, fsync_interval=0)
+        writer.write_many(records)
+        writer.close()
+
+        self.assertEqual(list(iter_jsonl(self.path)), records)
+
+    def test_rotates_by_size(self):
+        records = [{"role": "user", "content": "x" * 100} for _ in range(20)]
+        writer = JSONLWriter(self.path, max_bytes=500)
+        writer.write_many(records)
+        writer.close()
+
+        self.assertGreater(len(segment_paths(self.path)), 1)
+        self.assertEqual(list(iter_jsonl(self.path)), records)
+
+    def test_skips_truncated_last_line(self):
+        with open(self.path, "w") as log_file:
+            log_file.write('{"role": "user", "content": "complete"}\n{"role": "assi')
+
+        self.assertEqual(list(iter_jsonl(self.path)), [{"role": "user", "content": "complete"}])
+
+    def test_reads_legacy_log(self):
+        records = [{"role": "user", "content": "a, b"}, {"role": "assistant", "content": "{not json}"}]
+        legacy_path = os.path.join(self.tmp.name, "conversation.log")
+        with open(legacy_path, "w") as log_file:
+            for record in records:
+                json.dump(record, log_file, indent=4)
+                log_file.write(",\n")
+
+        self.assertEqual(list(iter_legacy_log(legacy_path)), records)
+
+    async def test_conversation_logger_jsonl_mode(self):
+        messages = [{"role": "system", "content": "prompt"}]
+        conversation_logger = ConversationLogger(messages, self.path, jsonl=True)
+
+        await conversation_logger.process_frame(LLMFullResponseEndFrame(), FrameDirection.DOWNSTREAM)
+        messages.append({"role": "user", "content": "hello"})
+        await conversation_logger.process_frame(LLMFullResponseEndFrame(), FrameDirection.DOWNSTREAM)
+        await conversation_logger.cleanup()
+
+        self.assertEqual(list(iter_jsonl(self.path)), messages)
+
+
+if __name__ == "__main__":
+    unittest.main()
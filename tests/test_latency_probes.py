@@ -0,0 +1,117 @@
+import unittest
+
+from latency_probes import LatencyProbe, TurnLatencyTracker, percentile
+from pipecat.frames.frames import (
+    LLMFullResponseStartFrame,
+    LLMMessagesFrame,
+    TextFrame,
+    TTSAudioRawFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection
+from speculative_llm import SpeculativeLLMMessagesFrame
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTurnLatencyTracker(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tracker = TurnLatencyTracker(clock=self.clock)
+
+    def turn(self, *steps):
+        for stage, at in steps:
+            self.clock.now = at
+            self.tracker.mark(stage)
+
+    def test_intervals_of_a_turn(self):
+        self.turn(
+            ("stopped", 1.0),
+            ("aggregated", 1.1),
+            ("llm_started", 1.1),
+            ("llm_first_token", 1.6),
+            ("llm_first_token", 1.7),
+            ("tts_first_audio", 1.9),
+            ("output_first_audio", 1.95),
+        )
+        intervals = {name: [round(v, 3) for v in values] for name, values in self.tracker.intervals.items()}
+        self.assertEqual(
+            intervals, {"aggregation": [0.1], "llm": [0.5], "tts": [0.3], "output": [0.05], "total": [0.95]}
+        )
+        self.assertEqual(self.tracker.turns, 1)
+
+    def test_turn_starts_at_the_last_pause(self):
+        self.turn(("stopped", 1.0), ("stopped", 3.0), ("aggregated", 3.2))
+        self.assertAlmostEqual(self.tracker.intervals["aggregation"][0], 0.2)
+
+    def test_stages_out_of_order_are_ignored(self):
+        # A greeting spoken between turns
+        self.turn(("tts_first_audio", 0.5), ("output_first_audio", 0.6))
+        # A turn the bot doesn't answer
+        self.turn(("stopped", 1.0), ("aggregated", 1.1), ("tts_first_audio", 1.5))
+        self.assertEqual(len(self.tracker.intervals["aggregation"]), 1)
+        self.assertEqual(len(self.tracker.intervals["tts"]), 0)
+        self.assertEqual(len(self.tracker.intervals["total"]), 0)
+
+    def test_text_before_the_llm_starts_is_not_the_answer(self):
+        # A greeting queued as plain text while the turn waits for the LLM
+        self.turn(("stopped", 1.0), ("aggregated", 1.1), ("llm_first_token", 1.2))
+        self.turn(("llm_started", 1.3), ("llm_first_token", 1.6), ("tts_first_audio", 1.8))
+        self.assertAlmostEqual(self.tracker.intervals["llm"][0], 0.5)
+        self.assertAlmostEqual(self.tracker.intervals["tts"][0], 0.2)
+
+    def test_summary_percentiles(self):
+        for i in range(100):
+            self.turn(("stopped", i * 10), ("aggregated", i * 10 + (i + 1) / 1000))
+        summary = self.tracker.summary()
+        self.assertEqual(summary["turns"], 100)
+        self.assertEqual(summary["aggregation"], {"count": 100, "p50": 50.0, "p95": 95.0, "p99": 99.0})
+        self.assertNotIn("total", summary)
+
+    def test_percentile(self):
+        self.assertEqual(percentile([3, 1, 2], 50), 2)
+        self.assertEqual(percentile([1], 99), 1)
+
+
+class TestLatencyProbe(unittest.IsolatedAsyncioTestCase):
+    async def test_probes_mark_their_stage_and_pass_frames_on(self):
+        clock = FakeClock()
+        tracker = TurnLatencyTracker(clock=clock)
+        stages = ("stopped", "aggregated", "llm_started", "llm_first_token")
+        probes = {stage: LatencyProbe(tracker, stage) for stage in stages}
+        pushed = []
+
+        async def push_frame(frame, direction=FrameDirection.DOWNSTREAM):
+            pushed.append(frame)
+
+        for probe in probes.values():
+            probe.push_frame = push_frame
+
+        audio = TTSAudioRawFrame(audio=b"\0\0", sample_rate=16000, num_channels=1)
+        await probes["stopped"].process_frame(UserStoppedSpeakingFrame(), FrameDirection.DOWNSTREAM)
+        # A speculation isn't the turn being sent to the LLM
+        clock.now = 0.1
+        await probes["aggregated"].process_frame(SpeculativeLLMMessagesFrame([]), FrameDirection.DOWNSTREAM)
+        clock.now = 0.3
+        await probes["aggregated"].process_frame(LLMMessagesFrame([]), FrameDirection.DOWNSTREAM)
+        await probes["aggregated"].process_frame(audio, FrameDirection.DOWNSTREAM)
+        # Text before the LLM started, e.g. a greeting
+        clock.now = 0.4
+        await probes["llm_first_token"].process_frame(TextFrame("Hallo"), FrameDirection.DOWNSTREAM)
+        await probes["llm_started"].process_frame(LLMFullResponseStartFrame(), FrameDirection.DOWNSTREAM)
+        clock.now = 0.5
+        await probes["llm_first_token"].process_frame(TextFrame("Ja"), FrameDirection.DOWNSTREAM)
+
+        self.assertEqual(len(pushed), 7)
+        self.assertEqual(list(tracker.intervals["aggregation"]), [0.3])
+        self.assertAlmostEqual(tracker.intervals["llm"][0], 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
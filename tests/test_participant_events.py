@@ -0,0 +1,118 @@
+import asyncio
+import tempfile
+import unittest
+
+from participant_events import ParticipantEventCoalescer, join_names
+from pipecat.frames.frames import TTSAudioRawFrame
+from pipecat.processors.frame_processor import FrameDirection
+from tts_cache import CachedPhraseFrame, PhraseSpeaker, TTSCache
+
+GREETING = "Hallo {name}! Ich bin Chatbot."
+GOODBYE = "Auf Wiedersehen {name}! Mach's gut."
+GOODBYE_MANY = "Auf Wiedersehen {name}! Macht's gut."
+
+
+class FakeSynthesizer:
+    voice_id = "voice"
+    model = "model"
+    output_format = "pcm_16000"
+    sample_rate = 16000
+
+    def __init__(self):
+        self.texts = []
+
+    async def __call__(self, text: str) -> bytes:
+        self.texts.append(text)
+        return text.encode()
+
+
+class TestJoinNames(unittest.TestCase):
+    def test_join_names(self):
+        self.assertEqual(join_names([]), "")
+        self.assertEqual(join_names(["Anna"]), "Anna")
+        self.assertEqual(join_names(["Anna", "", "Max"]), "Anna und Max")
+        self.assertEqual(join_names(["Anna", "Max", "Lena"]), "Anna, Max und Lena")
+
+
+class TestParticipantEventCoalescer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.said = []
+
+        async def say(template, names):
+            self.said.append(template.format(name=names))
+
+        self.events = ParticipantEventCoalescer(say, GREETING, GOODBYE, GOODBYE_MANY, window=0.05, max_delay=0.2)
+        self.addCleanup(self.events.cancel)
+
+    async def test_joins_are_greeted_together(self):
+        for name in ["Anna", "Max", "Lena"]:
+            self.events.joined(name)
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.said, [])
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.said, ["Hallo Anna, Max und Lena! Ich bin Chatbot."])
+
+    async def test_max_delay_caps_a_steady_stream(self):
+        for i in range(12):
+            self.events.joined(f"P{i}")
+            await asyncio.sleep(0.03)
+        self.assertEqual(len(self.said), 1)
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(self.said), 2)
+
+    async def test_leaves_and_joins_in_one_utterance(self):
+        self.events.joined("Anna")
+        self.events.joined("Max")
+        await asyncio.sleep(0.1)
+        self.events.left("Anna", room_empty=False)
+        self.events.joined("Lena")
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.said[-1], "Auf Wiedersehen Anna! Mach's gut. Hallo Lena! Ich bin Chatbot.")
+
+    async def test_no_goodbye_to_an_empty_room(self):
+        self.events.joined("Anna")
+        self.events.joined("Max")
+        await asyncio.sleep(0.1)
+        self.events.left("Anna", room_empty=False)
+        self.events.left("Max", room_empty=True)
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(self.said), 1)
+        self.assertEqual(self.events.metrics["skipped_goodbyes"], 1)
+
+    async def test_join_and_leave_within_the_window_cancel_out(self):
+        self.events.joined("Anna")
+        await asyncio.sleep(0.1)
+        self.events.joined("Max")
+        self.events.left("Max", room_empty=False)
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.said, ["Hallo Anna! Ich bin Chatbot."])
+
+    async def test_tts_calls_stay_constant_under_join_storms(self):
+        for storm in (5, 50):
+            with self.subTest(storm=storm), tempfile.TemporaryDirectory() as cache_dir:
+                synthesizer = FakeSynthesizer()
+                speaker = PhraseSpeaker(TTSCache(cache_dir), synthesizer)
+                audio = []
+
+                async def push_frame(frame, direction=FrameDirection.DOWNSTREAM):
+                    if isinstance(frame, TTSAudioRawFrame):
+                        audio.append(frame)
+
+                async def say(template, names):
+                    await speaker.process_frame(CachedPhraseFrame(template, names), FrameDirection.DOWNSTREAM)
+
+                speaker.push_frame = push_frame
+                await speaker.preload([GREETING])
+                events = ParticipantEventCoalescer(say, GREETING, GOODBYE, window=0.05, max_delay=1)
+                for i in range(storm):
+                    events.joined(f"Teilnehmer {i}")
+                await asyncio.sleep(0.1)
+
+                # The fixed fragments and one request for all the names
+                self.assertEqual(len(synthesizer.texts), 3)
+                self.assertEqual(events.metrics["utterances"], 1)
+                self.assertEqual(len(audio), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+from placement import PlacementScheduler, distance_km, parse_regions
+
+
+class TestPlacementScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = PlacementScheduler(parse_regions("ams:2,fra,iad:1,syd"), default_region="ams")
+
+    def test_parse_regions(self):
+        self.assertEqual(parse_regions("ams:20, fra"), {"ams": 20, "fra": 0})
+        with self.assertRaises(ValueError):
+            parse_regions("mars")
+
+    def test_distance(self):
+        self.assertEqual(distance_km("ams", "ams"), 0)
+        self.assertAlmostEqual(distance_km("ams", "fra"), 365, delta=20)
+
+    def test_room_region_comes_first(self):
+        placement = self.scheduler.place(room_geo="us-east-1", client_region="syd")
+        self.assertEqual((placement.region, placement.target, placement.source), ("iad", "iad", "room"))
+
+    def test_client_region_without_a_pinned_room(self):
+        placement = self.scheduler.place(client_region="ewr")
+        self.assertEqual((placement.region, placement.source), ("iad", "client"))
+        self.assertEqual(self.scheduler.place().region, "ams")
+
+    def test_full_regions_are_skipped(self):
+        placement = self.scheduler.place(client_region="iad", load={"iad": 1})
+        self.assertEqual(placement.region, "ams")
+        self.assertIsNone(PlacementScheduler({"ams": 1}, "ams").place(load={"ams": 1}))
+
+    def test_prefers_nearby_warm_workers(self):
+        self.assertEqual(self.scheduler.place(client_region="ams", warm={"fra": 1}).region, "fra")
+        placement = self.scheduler.place(client_region="ams", warm={"iad": 1})
+        self.assertEqual((placement.region, placement.warm), ("ams", False))
+        self.assertEqual(self.scheduler.metrics, {"ams": 1, "fra": 1, "iad": 0, "syd": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import asyncio
+import itertools
+import time
+import unittest
+
+from pipecat.transports.services.helpers.daily_rest import DailyRoomObject, DailyRoomParams
+
+from room_pool import RoomPool
+
+LATENCY = 0.1
+
+
+class FakeResponse:
+    def __init__(self, status: int):
+        self.status = status
+
+    async def __aenter__(self):
+        await asyncio.sleep(LATENCY)
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def text(self):
+        return "error"
+
+
+class FakeAiohttpSession:
+    def __init__(self):
+        self.posts = []
+        self.status = 200
+
+    def post(self, url, **kwargs):
+        self.posts.append((url, kwargs["json"]))
+        return FakeResponse(self.status)
+
+
+class FakeDailyREST:
+    """A local stand-in for DailyRESTHelper where every call takes LATENCY seconds."""
+
+    daily_api_url = "https://api.daily.co/v1"
+    daily_api_key = "key"
+
+    def __init__(self):
+        self.ids = itertools.count()
+        self.rooms = {}
+        self.tokens = 0
+        self.token_lifetimes = []
+        self.aiohttp_session = FakeAiohttpSession()
+
+    async def create_room(self, params: DailyRoomParams) -> DailyRoomObject:
+        await asyncio.sleep(LATENCY)
+        name = f"room-{next(self.ids)}"
+        room = DailyRoomObject(
+            id=name,
+            name=name,
+            api_created=True,
+            privacy="public",
+            url=f"https://example.daily.co/{name}",
+            created_at="2024-07-14T10:18:19.000Z",
+            config=params.properties,
+        )
+        self.rooms[name] = room
+        return room
+
+    async def get_token(self, room_url: str, expiry_time: float = 60 * 60, owner: bool = True) -> str:
+        await asyncio.sleep(LATENCY)
+        self.tokens += 1
+        self.token_lifetimes.append(expiry_time)
+        return f"token-{self.tokens}"
+
+    async def delete_room_by_name(self, room_name: str) -> bool:
+        self.rooms.pop(room_name, None)
+        return True
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met")
+        await asyncio.sleep(0.01)
+
+
+class TestRoomPool(unittest.IsolatedAsyncioTestCase):
+    async def test_acquire_from_pool(self):
+        rest = FakeDailyREST()
+        pool = RoomPool(rest, size=2, session_time=300)
+        pool.start()
+        await wait_for(lambda: pool.ready_rooms == 2)
+
+        start = time.monotonic()
+        room = await pool.acquire()
+        # The expiry update and both tokens in one round-trip
+        self.assertLess(time.monotonic() - start, 1.5 * LATENCY)
+        self.assertNotEqual(room.bot_token, room.user_token)
+        self.assertEqual(pool.metrics["hits"], 1)
+
+        # The handed out room's expiry is moved to a session from now, and the tokens last a session
+        url, body = rest.aiohttp_session.posts[0]
+        self.assertTrue(url.endswith(f"/rooms/{room.room.name}"))
+        self.assertAlmostEqual(body["properties"]["exp"], time.time() + 300, delta=5)
+        self.assertEqual(rest.token_lifetimes, [300, 300])
+        self.assertAlmostEqual(room.usable_until, time.time() + 300, delta=5)
+
+        await wait_for(lambda: pool.ready_rooms == 2)
+        await pool.stop()
+        self.assertEqual(list(rest.rooms), [room.room.name])
+
+    async def test_rooms_are_pinned_to_the_media_region(self):
+        room = await RoomPool(FakeDailyREST(), size=0, geo="eu-central-1").acquire()
+        self.assertEqual(room.room.config.geo, "eu-central-1")
+
+    async def test_empty_pool_mints_tokens_concurrently(self):
+        pool = RoomPool(FakeDailyREST(), size=0)
+
+        start = time.monotonic()
+        room = await pool.acquire()
+        elapsed = time.monotonic() - start
+
+        # One round-trip for the room, one for both tokens
+        self.assertLess(elapsed, 2.5 * LATENCY)
+        self.assertTrue(room.bot_token and room.user_token)
+        self.assertEqual(pool.metrics["misses"], 1)
+
+    async def test_failed_expiry_update_provisions_a_room(self):
+        rest = FakeDailyREST()
+        pool = RoomPool(rest, size=1, session_time=300)
+        pool.start()
+        await wait_for(lambda: pool.ready_rooms == 1)
+        pooled = pool._ready[0]
+
+        rest.aiohttp_session.status = 500
+        room = await pool.acquire()
+        self.assertNotEqual(room.room.name, pooled.room.name)
+        self.assertAlmostEqual(room.room.config.exp, time.time() + 300, delta=5)
+        self.assertEqual((pool.metrics["handout_failures"], pool.metrics["misses"]), (1, 1))
+        await wait_for(lambda: pooled.room.name not in rest.rooms)
+        await pool.stop()
+
+    async def test_evicts_expired_rooms(self):
+        rest = FakeDailyREST()
+        pool = RoomPool(rest, size=1, session_time=300, max_age=0.3, check_interval=0.05)
+        pool.start()
+        await wait_for(lambda: pool.ready_rooms == 1)
+        first = pool._ready[0]
+
+        await wait_for(lambda: pool.metrics["evicted"] >= 1)
+        await wait_for(lambda: first.room.name not in rest.rooms)
+        await wait_for(lambda: pool.ready_rooms == 1)
+        await pool.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
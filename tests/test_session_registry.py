@@ -0,0 +1,128 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from session_registry import AdmissionRejected, InMemorySessionStore, SessionRegistry, SqliteSessionStore
+
+
+class TestSessionRegistry(unittest.IsolatedAsyncioTestCase):
+    def registry(self, **kwargs) -> SessionRegistry:
+        return SessionRegistry(**{"max_wait": 0, "poll_interval": 0.01, **kwargs})
+
+    async def test_global_and_per_client_limits(self):
+        registry = self.registry(max_sessions=3, max_per_client=2)
+        await registry.admit("alice")
+        await registry.admit("alice")
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await registry.admit("alice")
+        self.assertEqual(rejected.exception.reason, "too many sessions for this client")
+
+        await registry.admit("bob")
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await registry.admit("carol")
+        self.assertEqual(rejected.exception.reason, "too many sessions")
+        self.assertEqual(registry.metrics["admitted"], 3)
+        self.assertEqual(registry.metrics["rejected"], 2)
+
+    async def test_waits_for_a_free_slot(self):
+        registry = self.registry(max_sessions=1, max_wait=1)
+        first = await registry.admit("alice")
+        waiting = asyncio.create_task(registry.admit("bob"))
+        await asyncio.sleep(0.05)
+        self.assertEqual(registry.waiting, 1)
+
+        started = time.monotonic()
+        await registry.end(first.id)
+        second = await waiting
+        self.assertLess(time.monotonic() - started, 0.05)
+        self.assertEqual(second.client, "bob")
+        self.assertEqual(registry.waiting, 0)
+
+    async def test_rejects_fast_when_the_queue_is_full(self):
+        registry = self.registry(max_sessions=1, max_wait=1, max_queue=1)
+        await registry.admit("alice")
+        waiting = asyncio.create_task(registry.admit("bob"))
+        await asyncio.sleep(0.01)
+
+        started = time.monotonic()
+        with self.assertRaises(AdmissionRejected):
+            await registry.admit("carol")
+        self.assertLess(time.monotonic() - started, 0.05)
+        with self.assertRaises(AdmissionRejected):
+            await waiting
+
+    async def test_dead_workers_free_their_slots(self):
+        registry = self.registry(max_sessions=1)
+        alive = True
+
+        async def worker_alive():
+            return alive
+
+        record = await registry.admit("alice")
+        await registry.started(record, "https://example.daily.co/room", "pid:42", worker_alive)
+        await registry.check()
+        with self.assertRaises(AdmissionRejected):
+            await registry.admit("bob")
+
+        alive = False
+        await registry.check()
+        await registry.admit("bob")
+        self.assertEqual(registry.metrics["dead"], 1)
+
+    async def test_old_sessions_expire(self):
+        registry = self.registry(max_sessions=1, max_age=0.05, keep_finished=0.05)
+        record = await registry.admit("alice")
+        await asyncio.sleep(0.06)
+        await registry.check()
+        self.assertEqual([r.state for r in await registry.sessions()], ["ended"])
+
+        await registry.admit("bob")
+        await asyncio.sleep(0.06)
+        await registry.check()
+        self.assertNotIn(record.id, [r.id for r in await registry.sessions()])
+
+    async def test_placed_sessions_count_while_starting(self):
+        with tempfile.TemporaryDirectory() as directory:
+            registry = self.registry(store=SqliteSessionStore(os.path.join(directory, "sessions.db")))
+            record = await registry.admit("alice")
+            self.assertEqual(await registry.place(record, lambda load: "fra"), "fra")
+            (stored,) = await registry.sessions()
+            self.assertEqual((stored.state, stored.region), ("starting", "fra"))
+
+    async def test_concurrent_placements_see_each_other(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sessions.db")
+            for store in (InMemorySessionStore(), SqliteSessionStore(path)):
+                registry = self.registry(store=store)
+                records = [await registry.admit(client) for client in ("alice", "bob", "carol")]
+
+                # One slot in fra, then ams
+                def pick(load):
+                    return "fra" if load["fra"] < 1 else "ams"
+
+                regions = await asyncio.gather(*[registry.place(record, pick) for record in records])
+                self.assertEqual(sorted(regions), ["ams", "ams", "fra"])
+
+    async def test_shared_sqlite_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sessions.db")
+            first = self.registry(store=SqliteSessionStore(path), max_sessions=1, max_wait=1)
+            second = self.registry(store=SqliteSessionStore(path), max_sessions=1, max_wait=1)
+
+            record = await first.admit("alice")
+            await first.started(record, "https://example.daily.co/room", "fly:abc")
+            waiting = asyncio.create_task(second.admit("bob"))
+            await asyncio.sleep(0.05)
+            self.assertFalse(waiting.done())
+
+            await first.end(record.id)
+            await waiting
+            sessions = {r.client: r for r in await second.sessions()}
+            self.assertEqual((sessions["alice"].state, sessions["alice"].worker), ("ended", "fly:abc"))
+            self.assertEqual(sessions["bob"].state, "starting")
+
+
+if __name__ == "__main__":
+    unittest.main()
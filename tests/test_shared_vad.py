@@ -0,0 +1,55 @@
+import threading
+import unittest
+
+import numpy as np
+
+from shared_vad import BatchedVADEngine, SharedSileroOnnxModel, SharedSileroVADAnalyzer, silero_session
+
+SESSIONS = 4
+CHUNKS = 10
+
+
+def session_audio(i: int) -> np.ndarray:
+    return (np.random.RandomState(i).randn(CHUNKS, 512) * (0.05 + 0.1 * i)).astype(np.float32)
+
+
+class TestBatchedVADEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = BatchedVADEngine(max_wait=0.05)
+
+    def tearDown(self):
+        self.engine.close()
+
+    def test_batched_results_match_single_inference(self):
+        expected = []
+        for i in range(SESSIONS):
+            model = SharedSileroOnnxModel(silero_session())
+            expected.append([model(chunk, 16000)[0][0] for chunk in session_audio(i)])
+
+        models = [self.engine.model() for _ in range(SESSIONS)]
+        results = [None] * SESSIONS
+
+        def run(i):
+            results[i] = [models[i](chunk, 16000)[0][0] for chunk in session_audio(i)]
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(SESSIONS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        np.testing.assert_allclose(results, expected, atol=1e-5)
+        self.assertEqual(self.engine.metrics["chunks"], SESSIONS * CHUNKS)
+        # Every session has a chunk pending at once, so they are all run together
+        self.assertEqual(self.engine.metrics["max_batch"], SESSIONS)
+        self.assertLess(self.engine.metrics["batches"], SESSIONS * CHUNKS)
+
+    def test_analyzer_uses_engine(self):
+        analyzer = SharedSileroVADAnalyzer(engine=self.engine)
+        audio = (session_audio(1)[0] * 32767).astype(np.int16).tobytes()
+        self.assertGreaterEqual(analyzer.voice_confidence(audio), 0)
+        self.assertEqual(self.engine.metrics["chunks"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from pipecat.frames.frames import (
+    InterimTranscriptionFrame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    LLMMessagesFrame,
+    TextFrame,
+    TranscriptionFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from processors import ConversationProcessor
+from speculative_llm import SpeculativeLLMMessagesFrame, SpeculativeOpenAILLMService, turns_match
+
+SYSTEM = {"role": "system", "content": "Du bist ein Moderator."}
+
+
+class FakeLLM(SpeculativeOpenAILLMService):
+    """Streams the words of a canned answer instead of calling OpenAI."""
+
+    def __init__(self):
+        super().__init__(api_key="test", model="gpt-4o")
+        self.contexts = []
+
+    async def _process_context(self, context):
+        self.contexts.append(context.messages)
+        for word in ["Es", "ist", "zehn", "Uhr."]:
+            await asyncio.sleep(0.05)
+            await self.push_frame(TextFrame(word))
+
+
+def user_turn(content: str) -> list:
+    return [SYSTEM, {"role": "user", "content": content}]
+
+
+class TestTurnsMatch(unittest.TestCase):
+    def test_ignores_timestamps_case_and_punctuation(self):
+        self.assertTrue(turns_match("10:00:01 | Anna | wie spät ist es", "10:00:03 | Anna | Wie spät ist es?", 0.9))
+        self.assertFalse(turns_match("10:00:01 | Anna | wie spät", "10:00:03 | Anna | Wie spät ist es in Tokio?", 0.9))
+
+
+class TestSpeculativeLLM(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.pushed = []
+
+        async def push_frame(processor, frame, direction=FrameDirection.DOWNSTREAM):
+            self.pushed.append(frame)
+
+        patcher = mock.patch.object(FrameProcessor, "push_frame", push_frame)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.llm = FakeLLM()
+
+    def texts(self):
+        return [f.text for f in self.pushed if isinstance(f, TextFrame)]
+
+    async def test_hit_releases_the_head_start(self):
+        await self.llm.process_frame(
+            SpeculativeLLMMessagesFrame(user_turn("10:00:01 | Anna | wie spät ist es")), FrameDirection.DOWNSTREAM
+        )
+        await asyncio.sleep(0.12)
+        # Nothing leaves the LLM before the final transcription confirms the turn
+        self.assertEqual(self.pushed, [])
+
+        await self.llm.process_frame(
+            LLMMessagesFrame(user_turn("10:00:02 | Anna | Wie spät ist es?")), FrameDirection.DOWNSTREAM
+        )
+
+        self.assertIsInstance(self.pushed[0], LLMFullResponseStartFrame)
+        self.assertEqual(self.texts(), ["Es", "ist", "zehn", "Uhr."])
+        self.assertIsInstance(self.pushed[-1], LLMFullResponseEndFrame)
+        self.assertEqual(len(self.llm.contexts), 1)
+        self.assertEqual(self.llm.metrics["hits"], 1)
+        self.assertGreaterEqual(self.llm.metrics["saved_ms"], 100)
+
+    async def test_miss_restarts_with_the_final_turn(self):
+        await self.llm.process_frame(
+            SpeculativeLLMMessagesFrame(user_turn("10:00:01 | Anna | wie spät")), FrameDirection.DOWNSTREAM
+        )
+        await asyncio.sleep(0.07)
+        final = user_turn("10:00:02 | Anna | Wie spät ist es in Tokio?")
+        await self.llm.process_frame(LLMMessagesFrame(final), FrameDirection.DOWNSTREAM)
+
+        self.assertEqual(self.texts(), ["Es", "ist", "zehn", "Uhr."])
+        self.assertEqual(self.llm.contexts[-1], final)
+        self.assertEqual(self.llm.metrics["misses"], 1)
+
+
+class TestConversationProcessorSpeculation(unittest.IsolatedAsyncioTestCase):
+    async def test_stable_interim_starts_a_speculation(self):
+        messages = [SYSTEM]
+        processor = ConversationProcessor(messages, speculative=True, stable_after=0.05)
+        processor.add_user_mapping("u1", "Anna")
+        pushed = []
+
+        async def push_frame(frame, direction=FrameDirection.DOWNSTREAM):
+            pushed.append(frame)
+
+        processor.push_frame = push_frame
+
+        await processor.process_frame(UserStartedSpeakingFrame(), FrameDirection.DOWNSTREAM)
+        await processor.process_frame(
+            InterimTranscriptionFrame("wie spät", "u1", "2024-07-14T10:00:01.000000Z"), FrameDirection.DOWNSTREAM
+        )
+        await processor.process_frame(
+            InterimTranscriptionFrame("wie spät ist es", "u1", "2024-07-14T10:00:01.500000Z"),
+            FrameDirection.DOWNSTREAM,
+        )
+        await processor.process_frame(UserStoppedSpeakingFrame(), FrameDirection.DOWNSTREAM)
+        await asyncio.sleep(0.1)
+
+        speculative = [f for f in pushed if isinstance(f, SpeculativeLLMMessagesFrame)]
+        self.assertEqual(len(speculative), 1)
+        self.assertEqual(speculative[0].messages[-1]["content"], "10:00:01 | Anna | wie spät ist es")
+        # The speculation doesn't touch the conversation
+        self.assertEqual(messages, [SYSTEM])
+
+        await processor.process_frame(
+            TranscriptionFrame("Wie spät ist es?", "u1", "2024-07-14T10:00:02.000000Z"), FrameDirection.DOWNSTREAM
+        )
+        final = [f for f in pushed if type(f) is LLMMessagesFrame]
+        self.assertEqual(final[0].messages[-1]["content"], "10:00:02 | Anna | Wie spät ist es?")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+import sprite_atlas
+from sprite_atlas import SpriteAtlas, folder_key
+
+
+class TestSpriteAtlas(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.sprite_dir = os.path.join(self.tmp.name, "sprites")
+        os.makedirs(self.sprite_dir)
+        for i in range(3):
+            Image.new("RGB", (8, 4), (i * 50, 0, 255 - i * 50)).save(
+                os.path.join(self.sprite_dir, f"sprite{i:03d}.png")
+            )
+        patcher = mock.patch.object(sprite_atlas, "cache_dir", os.path.join(self.tmp.name, "cache"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_frames_match_decoded_sprites(self):
+        atlas = SpriteAtlas.load(self.sprite_dir)
+
+        self.assertEqual(len(atlas), 3)
+        self.assertEqual(atlas.size, (8, 4))
+        for i, frame in enumerate(atlas.frames()):
+            with Image.open(os.path.join(self.sprite_dir, f"sprite{i:03d}.png")) as img:
+                self.assertEqual(frame.image, img.tobytes())
+            self.assertEqual(frame.size, (8, 4))
+            self.assertEqual(frame.format, "RGB")
+
+    def test_reuses_atlas_until_sprites_change(self):
+        first = SpriteAtlas.load(self.sprite_dir)
+        self.assertEqual(SpriteAtlas.load(self.sprite_dir).path, first.path)
+
+        key = folder_key(self.sprite_dir)
+        Image.new("RGB", (8, 4), (1, 2, 3)).save(os.path.join(self.sprite_dir, "sprite001.png"))
+        self.assertNotEqual(folder_key(self.sprite_dir), key)
+
+        second = SpriteAtlas.load(self.sprite_dir)
+        self.assertNotEqual(second.path, first.path)
+        self.assertEqual(second.frame(1).image, bytes([1, 2, 3]) * 32)
+
+    def test_frames_are_materialized_once(self):
+        atlas = SpriteAtlas.load(self.sprite_dir)
+        self.assertIs(atlas.frame(2), atlas.frame(2))
+
+    def test_frames_are_views_into_the_map(self):
+        atlas = SpriteAtlas.load(self.sprite_dir)
+        image = atlas.frame(1).image
+        self.assertIsInstance(image, memoryview)
+        self.assertIs(image.obj, atlas._map)
+
+    def test_key_follows_modification_times(self):
+        key = folder_key(self.sprite_dir)
+        path = os.path.join(self.sprite_dir, "sprite000.png")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertNotEqual(folder_key(self.sprite_dir), key)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from static_files import IMMUTABLE, REVALIDATE, StaticIndex, accepted_encodings
+
+SCRIPT = b"console.log('hello');\n" * 100
+
+
+class TestStaticIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.write("index.html", b"<html>home</html>")
+        self.write("about.html", b"<html>about</html>")
+        self.write("docs/index.html", b"<html>docs</html>")
+        self.write("_next/static/chunks/main-3f2a1b9c.js", SCRIPT)
+        self.write("logo.png", b"\x89PNG" + bytes(1024))
+        self.index = StaticIndex(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, path: str, body: bytes):
+        path = os.path.join(self.directory.name, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(body)
+
+    def test_lookup(self):
+        self.assertEqual(self.index.lookup("").body, b"<html>home</html>")
+        self.assertEqual(self.index.lookup("about").body, b"<html>about</html>")
+        self.assertEqual(self.index.lookup("docs/").body, b"<html>docs</html>")
+        self.assertIsNone(self.index.lookup("missing"))
+        self.assertIsNone(self.index.response("../secret", {}))
+
+    def test_serves_from_memory(self):
+        os.remove(os.path.join(self.directory.name, "about.html"))
+        self.assertEqual(self.index.response("about", {}).body, b"<html>about</html>")
+
+    def test_compressed_variants(self):
+        response = self.index.response("_next/static/chunks/main-3f2a1b9c.js", {"accept-encoding": "gzip, deflate"})
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+        self.assertEqual(response.headers["cache-control"], IMMUTABLE)
+        self.assertEqual(gzip.decompress(response.body), SCRIPT)
+
+        response = self.index.response("_next/static/chunks/main-3f2a1b9c.js", {"accept-encoding": "gzip;q=0"})
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(response.body, SCRIPT)
+
+        # Too small or not compressible
+        for path in ("about", "logo.png"):
+            response = self.index.response(path, {"accept-encoding": "gzip"})
+            self.assertNotIn("content-encoding", response.headers)
+            self.assertEqual(response.headers["cache-control"], REVALIDATE)
+
+    def test_conditional_requests(self):
+        response = self.index.response("_next/static/chunks/main-3f2a1b9c.js", {"accept-encoding": "gzip"})
+        etag = response.headers["etag"]
+        self.assertNotEqual(etag, self.index.response("_next/static/chunks/main-3f2a1b9c.js", {}).headers["etag"])
+
+        response = self.index.response(
+            "_next/static/chunks/main-3f2a1b9c.js", {"accept-encoding": "gzip", "if-none-match": f"W/{etag}"}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.body, b"")
+        self.assertEqual(response.headers["etag"], etag)
+
+        response = self.index.response("about", {"if-none-match": '"outdated"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings("br;q=0.5, gzip, identity;q=x"), {"br": 0.5, "gzip": 1.0, "identity": 0.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
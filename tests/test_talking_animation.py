@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+
+from pipecat.frames.frames import OutputImageRawFrame, TTSAudioRawFrame, TTSStoppedFrame
+from pipecat.processors.frame_processor import FrameDirection
+from talking_animation import TalkingAnimation, mouth_indices
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds: float, amplitude: float) -> bytes:
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * 220 * t) * amplitude * 32767).astype(np.int16).tobytes()
+
+
+class TestMouthIndices(unittest.TestCase):
+    def test_maps_energy_to_sprites(self):
+        audio = tone(0.04, 0) + tone(0.04, 0.5) + tone(0.02, 0.05)
+        indices = mouth_indices(audio, 640, 10, floor=0.01, ceiling=0.2)
+
+        # The last window is padded with silence
+        self.assertEqual(len(indices), 3)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[1], 9)
+        self.assertTrue(0 < indices[2] < 9)
+
+
+class TestLipSync(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.animation = TalkingAnimation(sprite_folder="parkingmeter", lip_sync=True)
+        self.pushed = []
+
+        async def push_frame(frame, direction=FrameDirection.DOWNSTREAM):
+            self.pushed.append(frame)
+
+        self.animation.push_frame = push_frame
+
+    async def process(self, frame):
+        await self.animation.process_frame(frame, FrameDirection.DOWNSTREAM)
+
+    async def test_images_precede_their_audio(self):
+        quiet, loud = tone(0.08, 0), tone(0.08, 0.5)
+        await self.process(TTSAudioRawFrame(audio=quiet + loud + quiet, sample_rate=SAMPLE_RATE, num_channels=1))
+
+        kinds = ["image" if isinstance(f, OutputImageRawFrame) else "audio" for f in self.pushed]
+        self.assertEqual(kinds, ["audio", "image", "audio", "image", "audio"])
+        self.assertEqual([len(f.audio) for f in self.pushed if isinstance(f, TTSAudioRawFrame)], [len(quiet)] * 3)
+        self.assertIs(self.pushed[3], self.animation.quiet_frame())
+
+    async def test_audio_is_passed_through_unchanged(self):
+        audio = tone(0.03, 0.5) + tone(0.05, 0.1) + tone(0.07, 0)
+        for i in range(0, len(audio), 640):
+            await self.process(TTSAudioRawFrame(audio=audio[i : i + 640], sample_rate=SAMPLE_RATE, num_channels=1))
+
+        output = b"".join(f.audio for f in self.pushed if isinstance(f, TTSAudioRawFrame))
+        self.assertEqual(output, audio)
+
+    async def test_no_images_without_changes(self):
+        await self.process(TTSAudioRawFrame(audio=tone(0.1, 0), sample_rate=SAMPLE_RATE, num_channels=1))
+        await self.process(TTSStoppedFrame())
+
+        self.assertFalse([f for f in self.pushed if isinstance(f, OutputImageRawFrame)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import json
+import os
+import tempfile
+import unittest
+
+import boto3
+from moto import mock_aws
+
+from jsonl import JSONLWriter
+from transcript_index import TranscriptIndex, bucket_sources, log_sources, turns
+from transcript_store import TRANSCRIPT_NAME, encode_segment
+
+BUCKET = "mds-moderator-test"
+SYSTEM = {"role": "system", "content": "Du bist Moderator"}
+
+
+def user(*lines):
+    return {"role": "user", "content": "\n".join(lines)}
+
+
+def assistant(text):
+    return {"role": "assistant", "content": text}
+
+
+class TestTurns(unittest.TestCase):
+    def test_splits_utterances(self):
+        result = turns(
+            "2024-07-14_23-59-00-room",
+            [
+                SYSTEM,
+                user("23:59:10 | Anna | Wie ist das Budget?", "00:00:05 | Ben | Knapp"),
+                assistant("Das Budget ist knapp."),
+            ],
+        )
+        self.assertEqual(
+            [(t.participant, t.role, t.timestamp, t.text) for t in result],
+            [
+                ("Anna", "user", "2024-07-14T23:59:10", "Wie ist das Budget?"),
+                ("Ben", "user", "2024-07-15T00:00:05", "Knapp"),
+                ("assistant", "assistant", "2024-07-15T00:00:05", "Das Budget ist knapp."),
+            ],
+        )
+
+    def test_session_without_start(self):
+        result = turns("room", [user("10:00:00 | Anna | Hallo")])
+        self.assertEqual(result[0].timestamp, None)
+        self.assertEqual(result[0].participant, "Anna")
+
+
+class TestTranscriptIndex(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.logs = self.dir.name
+        self.index = TranscriptIndex(os.path.join(self.logs, "transcripts.db"))
+
+    def tearDown(self):
+        self.index.close()
+        self.dir.cleanup()
+
+    def write_log(self, session, messages):
+        writer = JSONLWriter(os.path.join(self.logs, f"conversation-{session}.jsonl"))
+        writer.write_many(messages)
+        writer.close()
+
+    def test_search_and_stats(self):
+        self.write_log(
+            "2024-07-14_10-00-00-a",
+            [SYSTEM, user("10:00:01 | Anna | Wir reden über das Budget"), assistant("Gerne, zum Budget.")],
+        )
+        self.write_log(
+            "2024-07-15_10-00-00-b", [SYSTEM, user("10:00:01 | Ben | Das Budget passt", "10:00:02 | Anna | Ja")]
+        )
+        # The old format, pretty-printed JSON objects separated by ",\n"
+        with open(os.path.join(self.logs, "conversation-2024-07-15_11-00-00-c.json"), "w") as f:
+            f.write(",\n".join(json.dumps(m, indent=4) for m in [SYSTEM, user("11:00:00 | Anna | Über Termine")]))
+
+        self.assertEqual(self.index.ingest(log_sources(self.logs)), {"indexed": 3, "unchanged": 0, "failed": 0})
+
+        sessions = self.index.sessions("budget", participant="anna")
+        self.assertEqual([s["session"] for s in sessions], ["2024-07-14_10-00-00-a"])
+        self.assertEqual(
+            {s["session"] for s in self.index.sessions("budget")}, {"2024-07-14_10-00-00-a", "2024-07-15_10-00-00-b"}
+        )
+        # Diacritics are folded
+        self.assertEqual(len(self.index.search("uber", participant="Anna")), 2)
+        self.assertEqual(
+            self.index.stats("day"),
+            [{"day": "2024-07-14", "sessions": 1, "turns": 2}, {"day": "2024-07-15", "sessions": 2, "turns": 3}],
+        )
+
+    def test_ingests_incrementally(self):
+        session = "2024-07-14_10-00-00-a"
+        self.write_log(session, [SYSTEM, user("10:00:01 | Anna | Hallo")])
+        self.write_log("2024-07-14_12-00-00-b", [SYSTEM, user("12:00:01 | Ben | Hallo")])
+        self.index.ingest(log_sources(self.logs))
+        self.assertEqual(self.index.ingest(log_sources(self.logs)), {"indexed": 0, "unchanged": 2, "failed": 0})
+
+        # A rotated segment belongs to the first one
+        writer = JSONLWriter(os.path.join(self.logs, f"conversation-{session}.jsonl"), max_bytes=1)
+        writer.write(user("10:00:02 | Anna | Tschüss"))
+        writer.close()
+        self.assertEqual(self.index.ingest(log_sources(self.logs)), {"indexed": 1, "unchanged": 1, "failed": 0})
+
+        self.assertEqual([t["text"] for t in self.index.search(participant="Anna")], ["Tschüss", "Hallo"])
+        self.assertEqual(len(self.index.search("hallo")), 2)
+        self.assertEqual(self.index.stats("participant")[0], {"participant": "Anna", "sessions": 1, "turns": 2})
+
+    def test_bucket(self):
+        os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+        os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+        os.environ.pop("AWS_ENDPOINT_URL_S3", None)
+        with mock_aws():
+            s3 = boto3.client("s3", region_name="us-east-1")
+            s3.create_bucket(Bucket=BUCKET)
+            prefix = "conversation-2024-07-14_10-00-00-a/"
+            s3.put_object(
+                Bucket=BUCKET,
+                Key=prefix + TRANSCRIPT_NAME,
+                Body=encode_segment([SYSTEM, user("10:00:01 | Anna | Das Budget"), assistant("Ja")]),
+            )
+            s3.put_object(Bucket=BUCKET, Key="conversation-2024-07-14_11-00-00-b/000000.json", Body=json.dumps(SYSTEM))
+
+            self.assertEqual(self.index.ingest(bucket_sources(s3, BUCKET)), {"indexed": 2, "unchanged": 0, "failed": 0})
+            self.assertEqual(self.index.ingest(bucket_sources(s3, BUCKET)), {"indexed": 0, "unchanged": 2, "failed": 0})
+            self.assertEqual(
+                self.index.sessions("budget"),
+                [{"session": "2024-07-14_10-00-00-a", "started_at": "2024-07-14T10:00:00", "turns": 1}],
+            )
+
+            s3.put_object(Bucket=BUCKET, Key=prefix + TRANSCRIPT_NAME, Body=encode_segment([SYSTEM]))
+            self.assertEqual(self.index.ingest(bucket_sources(s3, BUCKET)), {"indexed": 1, "unchanged": 1, "failed": 0})
+            self.assertEqual(self.index.search("budget"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
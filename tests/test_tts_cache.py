@@ -0,0 +1,135 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pipecat.frames.frames import LLMFullResponseEndFrame, TTSAudioRawFrame, TTSSpeakFrame, TTSStoppedFrame
+from pipecat.processors.frame_processor import FrameDirection
+from tts_cache import CachedPhraseFrame, PhraseSpeaker, TTSCache, cache_key, split_template
+
+GREETING = "Hallo {name}! Ich bin Chatbot."
+
+
+class FakeSynthesizer:
+    voice_id = "voice"
+    model = "model"
+    output_format = "pcm_16000"
+    sample_rate = 16000
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.texts = []
+
+    async def __call__(self, text: str) -> bytes:
+        if self.fail:
+            raise ConnectionError("offline")
+        self.texts.append(text)
+        return text.encode()
+
+
+class TestTTSCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_falls_back_to_temp_dir_when_not_writable(self):
+        read_only = os.path.join(self.tmp.name, "assets", ".cache", "tts")
+        makedirs = os.makedirs
+
+        def deny(path, *args, **kwargs):
+            # Like a root-owned cache directory seen by an unprivileged user
+            if path.startswith(os.path.join(self.tmp.name, "assets")):
+                raise PermissionError(13, "Permission denied", path)
+            return makedirs(path, *args, **kwargs)
+
+        with mock.patch("tts_cache.os.makedirs", deny), mock.patch(
+            "tts_cache.tempfile.gettempdir", return_value=self.tmp.name
+        ):
+            cache = TTSCache(read_only, max_bytes=100)
+        self.assertEqual(cache.directory, os.path.join(self.tmp.name, "tts-cache"))
+        cache.put("a", b"audio")
+        self.assertEqual(cache.get("a"), b"audio")
+
+    def test_key_covers_voice_model_and_text(self):
+        key = cache_key("voice", "model", "pcm_16000", "Hallo")
+        self.assertNotEqual(key, cache_key("other", "model", "pcm_16000", "Hallo"))
+        self.assertNotEqual(key, cache_key("voice", "other", "pcm_16000", "Hallo"))
+        self.assertNotEqual(key, cache_key("voice", "model", "pcm_16000", "Hallo!"))
+
+    def test_evicts_least_recently_used(self):
+        cache = TTSCache(self.tmp.name, max_bytes=25)
+        cache.put("a", b"a" * 10)
+        cache.put("b", b"b" * 10)
+        cache.get("a")
+        cache.put("c", b"c" * 10)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), b"a" * 10)
+        self.assertEqual(cache.size, 20)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["a.pcm", "c.pcm"])
+
+    def test_survives_restarts(self):
+        TTSCache(self.tmp.name).put("a", b"audio")
+        cache = TTSCache(self.tmp.name)
+        self.assertEqual(cache.size, 5)
+        self.assertEqual(cache.get("a"), b"audio")
+
+
+class TestPhraseSpeaker(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.synthesizer = FakeSynthesizer()
+        self.pushed = []
+        self.speaker = self.make_speaker(self.synthesizer)
+
+    def make_speaker(self, synthesizer):
+        speaker = PhraseSpeaker(TTSCache(self.tmp.name), synthesizer)
+
+        async def push_frame(frame, direction=FrameDirection.DOWNSTREAM):
+            self.pushed.append((frame, direction))
+
+        speaker.push_frame = push_frame
+        return speaker
+
+    async def say(self, name: str):
+        await self.speaker.process_frame(CachedPhraseFrame(GREETING, name), FrameDirection.DOWNSTREAM)
+
+    def test_split_template(self):
+        self.assertEqual(split_template(GREETING), ["Hallo", "{name}!", "Ich bin Chatbot."])
+
+    async def test_only_names_are_synthesized_after_preload(self):
+        await self.speaker.preload([GREETING])
+        self.assertEqual(self.synthesizer.texts, ["Hallo", "Ich bin Chatbot."])
+
+        await self.say("Anna")
+        await self.say("Max")
+        await self.say("Anna")
+        self.assertEqual(self.synthesizer.texts, ["Hallo", "Ich bin Chatbot.", "Anna!", "Max!"])
+
+        frames = [frame for frame, _ in self.pushed]
+        audio = [frame.audio for frame in frames if isinstance(frame, TTSAudioRawFrame)]
+        self.assertEqual(audio[-3:], [b"Hallo", b"Anna!", b"Ich bin Chatbot."])
+        self.assertIsInstance(frames[-3], TTSStoppedFrame)
+        self.assertEqual(frames[-2].text, "Hallo Anna! Ich bin Chatbot.")
+        self.assertIsInstance(frames[-1], LLMFullResponseEndFrame)
+
+    async def test_cache_is_shared_across_sessions(self):
+        await self.say("Anna")
+        synthesizer = FakeSynthesizer()
+        self.speaker = self.make_speaker(synthesizer)
+        await self.speaker.preload([GREETING])
+        await self.say("Anna")
+        self.assertEqual(synthesizer.texts, [])
+
+    async def test_falls_back_to_the_tts(self):
+        self.speaker = self.make_speaker(FakeSynthesizer(fail=True))
+        await self.say("Anna")
+        [(frame, direction)] = self.pushed
+        self.assertIsInstance(frame, TTSSpeakFrame)
+        self.assertEqual(frame.text, "Hallo Anna! Ich bin Chatbot.")
+        self.assertEqual(direction, FrameDirection.UPSTREAM)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import asyncio
+import itertools
+import time
+import unittest
+
+from warm_pool import WarmPool, WarmWorker
+
+
+class FakeMachinesBackend:
+    """A local stand-in for booting, assigning and destroying worker machines."""
+
+    def __init__(self, boot_time: float = 0.05):
+        self.boot_time = boot_time
+        self.ids = itertools.count()
+        self.running = {}
+        self.assigned = {}
+        self.broken = set()
+
+    async def create_worker(self) -> WarmWorker:
+        await asyncio.sleep(self.boot_time)
+        worker = WarmWorker(id=f"vm-{next(self.ids)}", address="http://localhost")
+        self.running[worker.id] = worker
+        return worker
+
+    async def assign(self, worker: WarmWorker, session: dict):
+        if worker.id in self.broken:
+            raise Exception("connection refused")
+        self.assigned[worker.id] = session
+
+    async def destroy_worker(self, worker: WarmWorker):
+        self.running.pop(worker.id, None)
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met")
+        await asyncio.sleep(0.01)
+
+
+class TestWarmPool(unittest.IsolatedAsyncioTestCase):
+    async def test_launch_uses_warm_worker_and_refills(self):
+        backend = FakeMachinesBackend()
+        pool = WarmPool(backend, size=2)
+        pool.start()
+        await wait_for(lambda: pool.idle_workers == 2)
+
+        start = time.monotonic()
+        worker = await pool.launch({"room_url": "https://example.daily.co/room", "token": "token"})
+        self.assertLess(time.monotonic() - start, backend.boot_time)
+        self.assertEqual(backend.assigned[worker.id]["room_url"], "https://example.daily.co/room")
+
+        await wait_for(lambda: pool.idle_workers == 2)
+        self.assertEqual(pool.metrics["hits"], 1)
+        self.assertEqual(pool.metrics["created"], 3)
+        await pool.stop()
+
+    async def test_launch_returns_none_when_empty(self):
+        pool = WarmPool(FakeMachinesBackend(boot_time=10), size=1)
+        self.assertIsNone(await pool.launch({"room_url": "r", "token": "t"}))
+        self.assertEqual(pool.metrics["misses"], 1)
+        await pool.stop()
+
+    async def test_skips_broken_worker(self):
+        backend = FakeMachinesBackend()
+        pool = WarmPool(backend, size=2)
+        pool.start()
+        await wait_for(lambda: pool.idle_workers == 2)
+        backend.broken.add("vm-0")
+
+        worker = await pool.launch({"room_url": "r", "token": "t"})
+        self.assertEqual(worker.id, "vm-1")
+        self.assertEqual(pool.metrics["assign_failures"], 1)
+        await wait_for(lambda: "vm-0" not in backend.running)
+        await pool.stop()
+
+    async def test_shrinks_when_idle(self):
+        backend = FakeMachinesBackend()
+        pool = WarmPool(backend, size=3, min_size=1, idle_timeout=0.2, check_interval=0.05)
+        pool.start()
+        await wait_for(lambda: pool.idle_workers == 3)
+
+        await wait_for(lambda: pool.idle_workers == 1)
+        self.assertEqual(len(backend.running), 1)
+
+        await pool.stop()
+        self.assertEqual(backend.running, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
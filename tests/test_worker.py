@@ -0,0 +1,40 @@
+import unittest
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from worker import Worker
+
+ROOM = {"room_url": "https://example.daily.co/a", "token": "t"}
+
+
+class TestWorker(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.worker = Worker(token="secret")
+        self.started = []
+
+        async def run_session(data):
+            self.started.append(data)
+
+        self.worker.run_session = run_session
+        self.client = TestClient(TestServer(self.worker.app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_start_requires_the_token(self):
+        for headers in ({}, {"Authorization": "Bearer wrong"}):
+            res = await self.client.post("/start", json=ROOM, headers=headers)
+            self.assertEqual(res.status, 401)
+        self.assertEqual(self.worker.state, "idle")
+        self.assertEqual((await self.client.get("/health")).status, 200)
+
+    async def test_start(self):
+        res = await self.client.post("/start", json=ROOM, headers={"Authorization": "Bearer secret"})
+        self.assertEqual(res.status, 200)
+        await self.worker.session_task
+        self.assertEqual(self.started, [ROOM])
+
+
+if __name__ == "__main__":
+    unittest.main()
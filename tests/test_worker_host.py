@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+
+import aiohttp
+from aiohttp.test_utils import TestClient, TestServer
+
+from pipecat.frames.frames import TextFrame
+from pipecat.processors.frame_processor import FrameDirection
+from worker_host import WorkerHost
+
+
+class FakeBot:
+    """Stands in for bot.main: runs until its runner is cancelled, like a pipeline would."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def main(self, room_url, token, bot_name, runner=None, **kwargs):
+        self.calls.append({"room_url": room_url, "token": token, "bot_name": bot_name, **kwargs})
+        if room_url.endswith("broken"):
+            raise Exception("unable to join")
+        cancelled = asyncio.Event()
+
+        async def cancel():
+            cancelled.set()
+
+        runner.cancel = cancel
+        await cancelled.wait()
+
+
+class TestWorkerHost(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.bot = FakeBot()
+        self.host = WorkerHost(max_sessions=2, bot_main=self.bot.main, token="secret")
+        self.host.aiohttp_session = aiohttp.ClientSession()
+        self.client = TestClient(TestServer(self.host.app()), headers={"Authorization": "Bearer secret"})
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.host.shutdown()
+        await self.client.close()
+        await self.host.aiohttp_session.close()
+        self.host.vad_engine.close()
+
+    async def add(self, room: str):
+        return await self.client.post("/sessions", json={"room_url": f"https://example.daily.co/{room}", "token": "t"})
+
+    async def test_sessions_share_resources(self):
+        first = await (await self.add("a")).json()
+        await (await self.add("b")).json()
+        await asyncio.sleep(0)
+
+        self.assertEqual(len(self.bot.calls), 2)
+        self.assertIs(self.bot.calls[0]["aiohttp_session"], self.host.aiohttp_session)
+        self.assertIs(self.bot.calls[1]["aiohttp_session"], self.host.aiohttp_session)
+        for call in self.bot.calls:
+            self.assertIs(call["vad_analyzer"]._model.engine, self.host.vad_engine)
+        # Each session keeps its own VAD state
+        self.assertIsNot(self.bot.calls[0]["vad_analyzer"], self.bot.calls[1]["vad_analyzer"])
+
+        session = await (await self.client.get(f"/sessions/{first['id']}")).json()
+        self.assertEqual(session["state"], "running")
+
+    async def test_rejects_sessions_when_full(self):
+        await self.add("a")
+        await self.add("b")
+        res = await self.add("c")
+        self.assertEqual(res.status, 503)
+        self.assertEqual((await (await self.client.get("/health")).json())["state"], "full")
+
+    async def test_remove_session(self):
+        session = await (await self.add("a")).json()
+        await asyncio.sleep(0)
+
+        res = await self.client.delete(f"/sessions/{session['id']}")
+        self.assertEqual((await res.json())["state"], "done")
+        self.assertEqual(self.host.active_sessions, 0)
+
+    async def test_failed_session_is_reported(self):
+        session = await (await self.add("broken")).json()
+        await asyncio.sleep(0.01)
+
+        health = await (await self.client.get(f"/sessions/{session['id']}")).json()
+        self.assertEqual(health["state"], "failed")
+        self.assertEqual(health["error"], "unable to join")
+
+    async def test_session_trace(self):
+        session = await (await self.add("a")).json()
+        await asyncio.sleep(0)
+        tracer = self.bot.calls[0]["tracer"]
+        tracer.record("input", TextFrame("hello"), FrameDirection.DOWNSTREAM)
+
+        trace = await (await self.client.get(f"/sessions/{session['id']}/trace")).json()
+        self.assertEqual([(r["probe"], r["frame"]) for r in trace["frames"]], [("input", "TextFrame")])
+        self.assertEqual((await self.client.get("/sessions/unknown/trace")).status, 404)
+
+    async def test_requires_the_token(self):
+        room = {"room_url": "https://example.daily.co/a", "token": "t"}
+        async with aiohttp.ClientSession() as anonymous:
+            for headers in ({}, {"Authorization": "Bearer wrong"}):
+                res = await anonymous.post(self.client.make_url("/sessions"), json=room, headers=headers)
+                self.assertEqual(res.status, 401)
+                res = await anonymous.get(self.client.make_url("/sessions"), headers=headers)
+                self.assertEqual(res.status, 401)
+            self.assertEqual((await anonymous.get(self.client.make_url("/health"))).status, 200)
+        self.assertEqual(self.bot.calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+
+import argparse
+import datetime
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+from jsonl import iter_jsonl, iter_legacy_log, segment_path
+from transcript_store import list_session_objects, read_session
+
+# The start time in session names, e.g. "2024-07-14_10-18-19-room"
+_SESSION_START = re.compile(r"(\d{4}-\d{2}-\d{2})_(\d{2})-(\d{2})-(\d{2})")
+# A user message holds one "10:18:19 | Anna | text" line per utterance, see ConversationProcessor.format_entries
+_UTTERANCE = re.compile(r"^(\d{2}:\d{2}:\d{2}) \| (.*?) \| (.*)$")
+# A ConversationLogger log, rotated segments like "conversation-x.1.jsonl" are indexed with the first one
+_LOG = re.compile(r"(conversation-[^.]+)(?:\.(\d+)(?=\.jsonl$))?(\.jsonl|\.json)")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY, session TEXT NOT NULL, fingerprint TEXT NOT NULL, indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    session TEXT PRIMARY KEY, source TEXT NOT NULL, started_at TEXT, day TEXT, turns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY, session TEXT NOT NULL, position INTEGER NOT NULL, participant TEXT NOT NULL,
+    role TEXT NOT NULL, timestamp TEXT, day TEXT, text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_session ON turns (session);
+CREATE INDEX IF NOT EXISTS turns_participant ON turns (participant COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS turns_day ON turns (day);
+CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5(
+    text, content='turns', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+
+class SessionSource(NamedTuple):
+    # Where the session comes from, e.g. a log path or "s3://bucket/prefix/"
+    source: str
+    session: str
+    # Changes whenever the stored session changes
+    fingerprint: str
+    load: Callable[[], List[dict]]
+
+
+class Turn(NamedTuple):
+    position: int
+    participant: str
+    role: str
+    timestamp: Optional[str]
+    text: str
+
+
+def session_start(session: str) -> Optional[datetime.datetime]:
+    match = _SESSION_START.search(session)
+    if not match:
+        return None
+    day, hours, minutes, seconds = match.groups()
+    return datetime.datetime.fromisoformat(f"{day}T{hours}:{minutes}:{seconds}")
+
+
+def turns(session: str, messages: List[dict]) -> List[Turn]:
+    """
+    Splits the messages of a session into turns: one per utterance of a user message
+    and one per assistant message, which gets the time of the utterance before it.
+    System messages are skipped.
+    """
+    now = session_start(session)
+    result = []
+    for message in messages:
+        role, content = message.get("role"), message.get("content")
+        if role not in ("user", "assistant") or not isinstance(content, str):
+            continue
+        if role == "assistant":
+            if content.strip():
+                result.append(Turn(len(result), "assistant", role, now and now.isoformat(), content.strip()))
+            continue
+        for line in content.splitlines():
+            match = _UTTERANCE.match(line)
+            if not match:
+                if line.strip():
+                    result.append(Turn(len(result), "", role, now and now.isoformat(), line.strip()))
+                continue
+            clock, participant, text = match.groups()
+            if now:
+                at = datetime.datetime.combine(now.date(), datetime.time.fromisoformat(clock))
+                # The session went past midnight
+                now = at if at >= now - datetime.timedelta(hours=1) else at + datetime.timedelta(days=1)
+            result.append(Turn(len(result), participant, role, now and now.isoformat(), text))
+    return result
+
+
+def log_sources(directory: str) -> Iterator[SessionSource]:
+    """
+    Finds the conversation logs written by ConversationLogger, as JSON Lines or in the old format.
+    """
+    # One pass over the directory, the sizes and modification times of all segments make up the fingerprint
+    logs: Dict[str, List[Tuple[int, os.stat_result]]] = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            match = _LOG.fullmatch(entry.name)
+            if match and entry.is_file():
+                session, index, ext = match.groups()
+                logs.setdefault(session + ext, []).append((int(index or 0), entry.stat()))
+
+    for name, segments in sorted(logs.items()):
+        segments.sort(key=lambda segment: segment[0])
+        if segments[0][0] != 0:
+            continue
+        path = os.path.join(directory, name)
+        paths = [segment_path(path, index) for index, _ in segments]
+        fingerprint = ",".join(f"{s.st_size}:{s.st_mtime_ns}" for _, s in segments)
+        session = name.removeprefix("conversation-").rsplit(".", 1)[0]
+
+        def load(path=path, paths=paths) -> List[dict]:
+            return list(iter_jsonl(path, paths) if path.endswith(".jsonl") else iter_legacy_log(path))
+
+        yield SessionSource(os.path.abspath(path), session, fingerprint, load)
+
+
+def bucket_sources(s3_client, bucket: str, prefix: str = "conversation-") -> Iterator[SessionSource]:
+    """
+    Finds the sessions stored by BucketLogger. One listing of the bucket fingerprints all
+    sessions, only changed ones are read.
+    """
+    for session_prefix, objects in list_session_objects(s3_client, bucket, prefix).items():
+        fingerprint = hashlib.sha256(
+            ",".join(f"{o['Key']}:{o['ETag']}" for o in sorted(objects, key=lambda o: o["Key"])).encode()
+        ).hexdigest()
+        session = session_prefix.rstrip("/").removeprefix("conversation-")
+
+        def load(session_prefix=session_prefix) -> List[dict]:
+            return read_session(s3_client, bucket, session_prefix)
+
+        yield SessionSource(f"s3://{bucket}/{session_prefix}", session, fingerprint, load)
+
+
+class TranscriptIndex:
+    """
+    A local SQLite database of the turns of stored conversations, with a full text
+    index (FTS5) of what was said.
+
+    Ingesting is incremental: every source is fingerprinted (file sizes and
+    modification times, object ETags) and only new or changed sessions are read, in
+    `jobs` threads, and re-indexed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def ingest(self, sources: Iterator[SessionSource], jobs: int = 8) -> Dict[str, int]:
+        known = dict(self.db.execute("SELECT source, fingerprint FROM sources"))
+        changed, unchanged = [], 0
+        for source in sources:
+            if known.get(source.source) == source.fingerprint:
+                unchanged += 1
+            else:
+                changed.append(source)
+
+        def load(source: SessionSource) -> Tuple[SessionSource, Optional[List[Turn]]]:
+            try:
+                return source, turns(source.session, source.load())
+            except Exception as e:
+                logger.warning(f"Unable to read {source.source}: {e}")
+                return source, None
+
+        indexed = failed = 0
+        with ThreadPoolExecutor(max_workers=jobs) as executor, self.db:
+            for source, session_turns in executor.map(load, changed):
+                if session_turns is None:
+                    failed += 1
+                    continue
+                self._replace(source, session_turns)
+                indexed += 1
+        return {"indexed": indexed, "unchanged": unchanged, "failed": failed}
+
+    def _replace(self, source: SessionSource, session_turns: List[Turn]):
+        self._delete(source.session)
+        start = session_start(source.session)
+        self.db.execute(
+            "INSERT INTO sessions VALUES (?, ?, ?, ?, ?)",
+            (
+                source.session,
+                source.source,
+                start and start.isoformat(),
+                start and start.date().isoformat(),
+                len(session_turns),
+            ),
+        )
+        self.db.executemany(
+            "INSERT INTO turns (session, position, participant, role, timestamp, day, text)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(source.session, *turn[:4], turn.timestamp and turn.timestamp[:10], turn.text) for turn in session_turns],
+        )
+        self.db.execute(
+            "INSERT INTO turns_fts (rowid, text) SELECT id, text FROM turns WHERE session = ?", (source.session,)
+        )
+        self.db.execute(
+            "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+            (source.source, source.session, source.fingerprint, time.time()),
+        )
+
+    def _delete(self, session: str):
+        # External content FTS tables are cleaned with the 'delete' command and the old values
+        self.db.execute(
+            "INSERT INTO turns_fts (turns_fts, rowid, text) SELECT 'delete', id, text FROM turns WHERE session = ?",
+            (session,),
+        )
+        self.db.execute("DELETE FROM turns WHERE session = ?", (session,))
+        self.db.execute("DELETE FROM sessions WHERE session = ?", (session,))
+
+    def search(self, query: Optional[str] = None, participant: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """
+        Finds the turns matching an FTS5 `query` (e.g. "budget OR haushalt", "termin*"),
+        optionally only those of a `participant`, best matches first.
+        """
+        where, params = [], []
+        if query:
+            where.append("turns.id IN (SELECT rowid FROM turns_fts WHERE turns_fts MATCH ?)")
+            params.append(query)
+        if participant:
+            where.append("turns.participant = ? COLLATE NOCASE")
+            params.append(participant)
+        sql = (
+            "SELECT turns.session, turns.timestamp, turns.participant, turns.role, turns.text FROM turns"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + " ORDER BY turns.timestamp DESC, turns.position LIMIT ?"
+        )
+        columns = ("session", "timestamp", "participant", "role", "text")
+        return [dict(zip(columns, row)) for row in self.db.execute(sql, (*params, limit))]
+
+    def sessions(self, query: Optional[str] = None, participant: Optional[str] = None) -> List[dict]:
+        """
+        Returns the sessions with turns matching `query` and `participant`, with the number of matching turns.
+        """
+        where, params = [], []
+        if query:
+            where.append("turns.id IN (SELECT rowid FROM turns_fts WHERE turns_fts MATCH ?)")
+            params.append(query)
+        if participant:
+            where.append("turns.participant = ? COLLATE NOCASE")
+            params.append(participant)
+        rows = self.db.execute(
+            "SELECT turns.session, sessions.started_at, COUNT(*) FROM turns JOIN sessions USING (session)"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + " GROUP BY turns.session ORDER BY sessions.started_at DESC",
+            params,
+        )
+        return [{"session": session, "started_at": started, "turns": count} for session, started, count in rows]
+
+    def stats(self, by: str = "day") -> List[dict]:
+        """
+        Counts the sessions and turns per `day`, `participant` or `role`.
+        """
+        if by not in ("day", "participant", "role"):
+            raise ValueError(f"Can't group by {by}")
+        rows = self.db.execute(
+            f"SELECT {by}, COUNT(DISTINCT session), COUNT(*) FROM turns GROUP BY {by} ORDER BY {by}"  # nosec B608
+        )
+        return [{by: key, "sessions": sessions, "turns": count} for key, sessions, count in rows]
+
+
+def print_table(rows: List[dict], width: int = 100):
+    for row in rows:
+        print(" | ".join(str(value if value is not None else "-")[:width] for value in row.values()))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Index and query stored conversations")
+    parser.add_argument("--db", default=os.getenv("TRANSCRIPT_INDEX_DB", "./logs/transcripts.db"))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index = commands.add_parser("index", help="Index new and changed sessions")
+    index.add_argument("--logs", help="A directory of ConversationLogger logs")
+    index.add_argument("--bucket", help="An S3 bucket written by BucketLogger")
+    index.add_argument("--prefix", default="conversation-")
+    index.add_argument("--jobs", type=int, default=8, help="Sessions read in parallel")
+
+    search = commands.add_parser("search", help="Find turns, e.g. search 'budget OR haushalt' --participant Anna")
+    search.add_argument("query", nargs="?")
+    search.add_argument("--participant")
+    search.add_argument("--sessions", action="store_true", help="List the matching sessions instead of the turns")
+    search.add_argument("--limit", type=int, default=50)
+
+    stats = commands.add_parser("stats", help="Count sessions and turns")
+    stats.add_argument("--by", choices=("day", "participant", "role"), default="day")
+
+    args = parser.parse_args(argv)
+    transcript_index = TranscriptIndex(args.db)
+    started = time.perf_counter()
+    try:
+        if args.command == "index":
+            if not args.logs and not args.bucket:
+                parser.error("index needs --logs or --bucket")
+            if args.logs:
+                print(f"{args.logs}: {transcript_index.ingest(log_sources(args.logs), args.jobs)}")
+            if args.bucket:
+                import boto3
+
+                sources = bucket_sources(boto3.client("s3"), args.bucket, args.prefix)
+                print(f"s3://{args.bucket}/{args.prefix}: {transcript_index.ingest(sources, args.jobs)}")
+        elif args.command == "search" and args.sessions:
+            print_table(transcript_index.sessions(args.query, args.participant))
+        elif args.command == "search":
+            print_table(transcript_index.search(args.query, args.participant, args.limit))
+        else:
+            print_table(transcript_index.stats(args.by))
+    except sqlite3.OperationalError as e:
+        # e.g. a malformed FTS5 query
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        transcript_index.close()
+    logger.debug(f"{args.command} took {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import gzip
+import json
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from botocore.exceptions import ClientError
+from loguru import logger
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_FORMAT = 1
+# All messages of a finished session, as gzip'd JSON Lines
+TRANSCRIPT_NAME = "transcript.jsonl.gz"
+# The messages of a running session, in gzip'd JSON Lines segments numbered in write order
+_SEGMENT = re.compile(r"segment-(\d+)\.jsonl\.gz$")
+# The old layout, one pretty-printed JSON object per message
+_LEGACY_MESSAGE = re.compile(r"(\d{6})\.json$")
+
+
+def segment_name(index: int) -> str:
+    return f"segment-{index:06d}.jsonl.gz"
+
+
+def encode_segment(messages: Iterable[dict]) -> bytes:
+    lines = "".join(json.dumps(message, ensure_ascii=False, default=str) + "\n" for message in messages)
+    return gzip.compress(lines.encode("utf-8"), mtime=0)
+
+
+def decode_segment(body: bytes) -> List[dict]:
+    return [json.loads(line) for line in gzip.decompress(body).decode("utf-8").splitlines() if line.strip()]
+
+
+def manifest(segments: List[dict], complete: bool) -> dict:
+    """
+    Describes the segments of a session: each segment's `name`, the index of its `first`
+    message, its message `count` and its size in `bytes`. A `complete` session has all
+    its messages in the listed segments, a running or crashed one may have newer segments.
+    """
+    return {
+        "format": MANIFEST_FORMAT,
+        "messages": sum(segment["count"] for segment in segments),
+        "complete": complete,
+        "segments": segments,
+    }
+
+
+def _get(s3_client, bucket: str, key: str) -> Optional[bytes]:
+    try:
+        return s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return None
+        raise
+
+
+def _list_keys(s3_client, bucket: str, prefix: str) -> List[str]:
+    keys = []
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        keys.extend(o["Key"] for o in page.get("Contents", []))
+    return keys
+
+
+def read_session(s3_client, bucket: str, prefix: str) -> List[dict]:
+    """
+    Reads the messages of a stored session.
+
+    A finished session takes two GETs: the manifest and its compacted transcript.
+    Sessions without a complete manifest (still running, or the runner died) are read
+    from a listing of their segments, and sessions stored in the old layout of one
+    object per message (`000000.json`, ...) from a listing of those.
+    """
+    prefix = prefix.rstrip("/") + "/"
+    body = _get(s3_client, bucket, prefix + MANIFEST_NAME)
+    if body is not None:
+        session_manifest = json.loads(body)
+        if session_manifest.get("complete"):
+            messages = []
+            for segment in session_manifest["segments"]:
+                segment_body = _get(s3_client, bucket, prefix + segment["name"])
+                if segment_body is None:
+                    logger.warning(f"Segment {segment['name']} of s3://{bucket}/{prefix} is missing, listing instead")
+                    break
+                messages.extend(decode_segment(segment_body))
+            else:
+                return messages
+
+    return list(_read_listed(s3_client, bucket, prefix, _list_keys(s3_client, bucket, prefix)))
+
+
+def _read_listed(s3_client, bucket: str, prefix: str, keys: List[str]) -> Iterator[dict]:
+    names = {key[len(prefix) :] for key in keys}
+    if TRANSCRIPT_NAME in names:
+        # Compacted, but the manifest or the removal of the segments didn't make it
+        yield from decode_segment(_get(s3_client, bucket, prefix + TRANSCRIPT_NAME))
+        return
+
+    segments = sorted((int(m.group(1)), name) for name in names if (m := _SEGMENT.fullmatch(name)))
+    if segments:
+        for _, name in segments:
+            yield from decode_segment(_get(s3_client, bucket, prefix + name))
+        return
+
+    for name in sorted(name for name in names if _LEGACY_MESSAGE.fullmatch(name)):
+        yield json.loads(_get(s3_client, bucket, prefix + name))
+
+
+def list_sessions(s3_client, bucket: str, prefix: str = "conversation-") -> List[str]:
+    """
+    Returns the prefixes of the sessions stored in the bucket, e.g. "conversation-2024-07-14_10-18-19-room/".
+    """
+    sessions = []
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix, Delimiter="/"):
+        sessions.extend(p["Prefix"] for p in page.get("CommonPrefixes", []))
+    return sessions
+
+
+def list_session_objects(s3_client, bucket: str, prefix: str = "conversation-") -> Dict[str, List[dict]]:
+    """
+    Lists the objects of all sessions stored in the bucket by session prefix, with one
+    paginated listing of the bucket rather than one per session.
+    """
+    sessions: Dict[str, List[dict]] = {}
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        for o in page.get("Contents", []):
+            session, slash, _ = o["Key"].partition("/")
+            if slash:
+                sessions.setdefault(session + "/", []).append(o)
+    return sessions
@@ -0,0 +1,251 @@
+import hashlib
+import os
+import re
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import aiohttp
+from loguru import logger
+
+from pipecat.frames.frames import (
+    DataFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    TextFrame,
+    TTSAudioRawFrame,
+    TTSSpeakFrame,
+    TTSStartedFrame,
+    TTSStoppedFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from sprite_atlas import cache_dir
+
+# A placeholder together with the punctuation attached to it, e.g. "{name}!"
+_PLACEHOLDER = re.compile(r"(\S*\{name\}\S*)")
+
+tts_cache_dir = os.getenv("TTS_CACHE_DIR", os.path.join(cache_dir, "tts"))
+
+
+def cache_key(voice_id: str, model: str, output_format: str, text: str) -> str:
+    return hashlib.sha256("\0".join((voice_id, model, output_format, text)).encode()).hexdigest()
+
+
+class TTSCache:
+    """
+    A content-addressed on-disk cache of synthesized audio.
+
+    Each entry is a file named after the hash of the voice, model, output format and
+    text. The cache is shared by all sessions using the same directory. When it grows
+    beyond `max_bytes`, the least recently used entries are removed. Use is tracked in
+    memory and through the file modification times, so it survives restarts.
+
+    If `directory` isn't writable (e.g. it belongs to root in the image), a private
+    cache in the temp directory is used instead.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0}
+        try:
+            os.makedirs(directory, exist_ok=True)
+            writable = os.access(directory, os.W_OK)
+        except PermissionError:
+            writable = False
+        if not writable:
+            fallback = os.path.join(tempfile.gettempdir(), "tts-cache")
+            logger.warning(f"TTS cache {directory} is not writable, using {fallback}")
+            directory = fallback
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".pcm"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        self._entries: OrderedDict[str, int] = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self.size = sum(self._entries.values())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                audio = f.read()
+        except FileNotFoundError:
+            # Another process sharing the directory may have evicted it
+            self._forget(key)
+            self.metrics["misses"] += 1
+            return None
+        os.utime(self._path(key))
+        self._entries[key] = len(audio)
+        self._entries.move_to_end(key)
+        self.metrics["hits"] += 1
+        return audio
+
+    def put(self, key: str, audio: bytes):
+        # Write to a temporary file first, so that concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._forget(key)
+        self._entries[key] = len(audio)
+        self.size += len(audio)
+        self._evict()
+
+    def _forget(self, key: str):
+        self.size -= self._entries.pop(key, 0)
+
+    def _evict(self):
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self.size -= size
+            self.metrics["evictions"] += 1
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+
+class ElevenLabsSynthesizer:
+    """
+    Synthesizes a text in one HTTP request to the ElevenLabs API, returning raw 16-bit PCM.
+    """
+
+    def __init__(
+        self,
+        aiohttp_session: aiohttp.ClientSession,
+        api_key: str,
+        voice_id: str,
+        model: str = "eleven_multilingual_v2",
+        output_format: str = "pcm_16000",
+        url: str = "https://api.elevenlabs.io",
+    ):
+        self._session = aiohttp_session
+        self._api_key = api_key
+        self.voice_id = voice_id
+        self.model = model
+        self.output_format = output_format
+        self.sample_rate = int(output_format.split("_")[1])
+        self._url = url
+
+    async def __call__(self, text: str) -> bytes:
+        async with self._session.post(
+            f"{self._url}/v1/text-to-speech/{self.voice_id}",
+            params={"output_format": self.output_format},
+            headers={"xi-api-key": self._api_key},
+            json={"text": text, "model_id": self.model},
+        ) as response:
+            response.raise_for_status()
+            return await response.read()
+
+
+@dataclass
+class CachedPhraseFrame(DataFrame):
+    """
+    A templated bot phrase, e.g. a greeting, that a PhraseSpeaker speaks from cached
+    audio. `{name}` in the template is replaced by `participant_name`.
+    """
+
+    template: str
+    participant_name: str = ""
+
+    @property
+    def text(self) -> str:
+        return self.template.format(name=self.participant_name)
+
+
+def split_template(template: str) -> List[str]:
+    """
+    Splits a phrase template into fragments that are synthesized separately: the
+    placeholder with its attached punctuation, and the fixed text around it.
+
+        >>> split_template("Hallo {name}! Ich bin Chatbot.")
+        ['Hallo', '{name}!', 'Ich bin Chatbot.']
+    """
+    return [fragment.strip() for fragment in _PLACEHOLDER.split(template) if fragment.strip()]
+
+
+class PhraseSpeaker(FrameProcessor):
+    """
+    This frame processor, placed right after the TTS, speaks CachedPhraseFrames from
+    the TTSCache instead of sending them to the TTS service.
+
+    A phrase is split into fragments (see `split_template`). Each fragment is looked up
+    in the cache and only synthesized on a miss, so a greeting for a new participant
+    costs one short request for the name, and none at all for a name heard before.
+    `preload` synthesizes the fixed fragments of the templates ahead of time. The
+    spliced audio is pushed as TTSAudioRawFrames, followed by the text and an
+    LLMFullResponseEndFrame, like the TTS would.
+
+    If synthesis fails, the phrase is sent back upstream to the TTS as a TTSSpeakFrame.
+    """
+
+    def __init__(self, cache: TTSCache, synthesizer: ElevenLabsSynthesizer):
+        super().__init__()
+        self.cache = cache
+        self._synthesizer = synthesizer
+        # Fixed fragments stay in memory once loaded
+        self._fragments: Dict[str, bytes] = {}
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, CachedPhraseFrame):
+            await self._speak(frame)
+        else:
+            await self.push_frame(frame, direction)
+
+    async def preload(self, templates: Iterable[str]):
+        for template in templates:
+            for fragment in split_template(template):
+                if "{name}" in fragment or fragment in self._fragments:
+                    continue
+                try:
+                    self._fragments[fragment] = await self._audio(fragment)
+                except Exception as e:
+                    logger.warning(f"{self} couldn't preload [{fragment}]: {e}")
+        logger.info(f"Preloaded {len(self._fragments)} phrase fragments, cache metrics: {self.cache.metrics}")
+
+    async def _audio(self, text: str) -> bytes:
+        if text in self._fragments:
+            return self._fragments[text]
+        synthesizer = self._synthesizer
+        key = cache_key(synthesizer.voice_id, synthesizer.model, synthesizer.output_format, text)
+        audio = self.cache.get(key)
+        if audio is None:
+            logger.debug(f"Synthesizing phrase fragment: [{text}]")
+            audio = await synthesizer(text)
+            self.cache.put(key, audio)
+        return audio
+
+    async def _speak(self, frame: CachedPhraseFrame):
+        fragments = [fragment.format(name=frame.participant_name) for fragment in split_template(frame.template)]
+        # Without a name, only its punctuation would be left
+        fragments = [fragment for fragment in fragments if any(c.isalnum() for c in fragment)]
+        try:
+            audio = [await self._audio(fragment) for fragment in fragments]
+        except Exception as e:
+            logger.error(f"{self} couldn't synthesize [{frame.text}], falling back to the TTS: {e}")
+            await self.push_frame(TTSSpeakFrame(frame.text), FrameDirection.UPSTREAM)
+            return
+
+        await self.push_frame(TTSStartedFrame())
+        for chunk in audio:
+            await self.push_frame(
+                TTSAudioRawFrame(audio=chunk, sample_rate=self._synthesizer.sample_rate, num_channels=1)
+            )
+        await self.push_frame(TTSStoppedFrame())
+        await self.push_frame(TextFrame(frame.text))
+        await self.push_frame(LLMFullResponseEndFrame())
+
+    async def cleanup(self):
+        await super().cleanup()
+        logger.info(f"TTS cache metrics: {self.cache.metrics}, {self.cache.size} bytes")
@@ -0,0 +1,166 @@
+import asyncio
+import random
+from dataclasses import dataclass
+from typing import List, Optional
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+from loguru import logger
+
+
+@dataclass
+class UploadItem:
+    key: str
+    body: bytes | str
+    attempts: int = 0
+
+
+class BackgroundUploader:
+    """
+    Uploads objects to S3 from a bounded queue using a small pool of asyncio
+    workers, so that callers on the event loop never wait on object storage.
+
+    The blocking boto3 calls run in the default thread pool. Failed uploads are
+    retried with exponential backoff and jitter. When the queue is full,
+    `submit` returns False instead of blocking and the caller is expected to
+    try again later.
+
+    Attributes:
+        bucket_name (str): The bucket objects are uploaded to.
+        metrics (dict): Counters describing the uploader's throughput and backpressure.
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        s3_client=None,
+        max_queue_size: int = 256,
+        concurrency: int = 4,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+    ):
+        self.bucket_name = bucket_name
+        self.s3_client = s3_client or boto3.client("s3")
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._queue: asyncio.Queue[UploadItem] = asyncio.Queue(maxsize=max_queue_size)
+        self._workers: list[asyncio.Task] = []
+        self._closed = False
+        self.metrics = {
+            "submitted": 0,
+            "uploaded": 0,
+            "failed": 0,
+            "retried": 0,
+            "rejected": 0,
+            "deleted": 0,
+            "in_flight": 0,
+            "max_queue_depth": 0,
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def submit(self, key: str, body: bytes | str) -> bool:
+        """
+        Enqueues an object for upload without blocking.
+
+        Args:
+            key (str): The object key.
+            body (bytes | str): The object body.
+
+        Returns:
+            bool: True if the object was queued, False if the queue is full or the uploader is closed.
+        """
+        if self._closed:
+            return False
+        self._start()
+        try:
+            self._queue.put_nowait(UploadItem(key, body))
+        except asyncio.QueueFull:
+            self.metrics["rejected"] += 1
+            return False
+        self.metrics["submitted"] += 1
+        self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], self._queue.qsize())
+        return True
+
+    async def flush(self, timeout: Optional[float] = None):
+        """
+        Waits until every queued object has been uploaded or given up on.
+        """
+        if self._workers:
+            await asyncio.wait_for(self._queue.join(), timeout)
+
+    async def delete(self, keys: List[str]):
+        """
+        Deletes objects in one request. Failures are logged, not retried.
+        """
+        try:
+            await asyncio.to_thread(
+                self.s3_client.delete_objects,
+                Bucket=self.bucket_name,
+                Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+            )
+            self.metrics["deleted"] += len(keys)
+        except (BotoCoreError, ClientError) as e:
+            logger.error(f"Failed to delete {len(keys)} objects from s3://{self.bucket_name}: {e}")
+
+    async def close(self, timeout: Optional[float] = None):
+        """
+        Flushes the queue and stops the workers. Objects submitted after close are rejected.
+        """
+        try:
+            await self.flush(timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out flushing {self.queue_depth} pending uploads to s3://{self.bucket_name}")
+        self._closed = True
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info(f"Uploader for s3://{self.bucket_name} closed: {self.metrics}")
+
+    def _start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            self.metrics["in_flight"] += 1
+            try:
+                await self._upload(item)
+            finally:
+                self.metrics["in_flight"] -= 1
+                self._queue.task_done()
+
+    async def _upload(self, item: UploadItem):
+        while True:
+            item.attempts += 1
+            try:
+                await asyncio.to_thread(
+                    self.s3_client.put_object,
+                    Bucket=self.bucket_name,
+                    Key=item.key,
+                    Body=item.body,
+                )
+                self.metrics["uploaded"] += 1
+                logger.info(f"Uploaded s3://{self.bucket_name}/{item.key}")
+                return
+            except (BotoCoreError, ClientError) as e:
+                if item.attempts > self.max_retries:
+                    self.metrics["failed"] += 1
+                    logger.error(f"Failed to upload {item.key} to S3 after {item.attempts} attempts: {e}")
+                    return
+                self.metrics["retried"] += 1
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (item.attempts - 1))
+                delay *= random.uniform(0.5, 1.0)  # nosec B311
+                logger.warning(f"Upload of {item.key} failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
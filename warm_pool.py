@@ -0,0 +1,198 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Protocol
+
+from loguru import logger
+
+
+@dataclass
+class WarmWorker:
+    id: str
+    address: str
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class WarmWorkerBackend(Protocol):
+    """
+    Creates, assigns and destroys warm workers. See `FlyWarmWorkerBackend` in bot_runner.py.
+    """
+
+    async def create_worker(self) -> WarmWorker:
+        """
+        Starts a worker and returns it once it is ready for a session.
+        """
+        ...
+
+    async def assign(self, worker: WarmWorker, session: dict):
+        """
+        Hands the `session` to the worker, raising if it refuses.
+        """
+        ...
+
+    async def destroy_worker(self, worker: WarmWorker):
+        """
+        Stops the worker and frees its resources.
+        """
+        ...
+
+
+class WarmPool:
+    """
+    Keeps a pool of started-but-idle bot workers, so that a session can be handed
+    to a running worker instead of waiting for a machine to cold start.
+
+    The pool is refilled in the background whenever a worker is taken. If no
+    session is launched for `idle_timeout` seconds, the pool shrinks to
+    `min_size` until the next launch.
+
+    Attributes:
+        size (int): The number of idle workers to keep around while the pool is in use.
+        min_size (int): The number of idle workers to keep around while the pool is idle.
+        idle_timeout (float): Seconds without launches after which the pool shrinks.
+        max_age (float): Idle workers older than this are replaced, before they exit on their own
+            (see WORKER_MAX_IDLE in worker.py).
+        metrics (dict): Hit, miss and failure counters.
+    """
+
+    def __init__(
+        self,
+        backend: WarmWorkerBackend,
+        size: int = 2,
+        min_size: int = 0,
+        idle_timeout: float = 10 * 60,
+        max_age: float = 50 * 60,
+        check_interval: float = 30,
+    ):
+        self.backend = backend
+        self.size = size
+        self.min_size = min(min_size, size)
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self._idle: List[WarmWorker] = []
+        self._creating = 0
+        self._last_launch = time.monotonic()
+        self._refill_event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._pending: set[asyncio.Task] = set()
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "created": 0,
+            "create_failures": 0,
+            "assign_failures": 0,
+            "shrunk": 0,
+        }
+
+    @property
+    def idle_workers(self) -> int:
+        return len(self._idle)
+
+    @property
+    def target_size(self) -> int:
+        if time.monotonic() - self._last_launch >= self.idle_timeout:
+            return self.min_size
+        return self.size
+
+    def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._maintain())
+            self._refill_event.set()
+
+    async def stop(self):
+        """
+        Stops refilling and destroys all idle workers.
+        """
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._pending):
+            task.cancel()
+        await asyncio.gather(*self._pending, return_exceptions=True)
+        workers, self._idle = self._idle, []
+        await asyncio.gather(*[self._destroy(w) for w in workers])
+
+    async def launch(self, session: dict) -> Optional[WarmWorker]:
+        """
+        Hands a session to an idle worker.
+
+        Args:
+            session (dict): The session configuration: room_url, token, bot_name, system_prompt and sprite_folder.
+
+        Returns:
+            WarmWorker | None: The worker running the session, or None if no idle worker could take it.
+        """
+        self._last_launch = time.monotonic()
+        self._refill_event.set()
+        while self._idle:
+            worker = self._idle.pop(0)
+            try:
+                await self.backend.assign(worker, session)
+            except Exception as e:
+                self.metrics["assign_failures"] += 1
+                logger.warning(f"Warm worker {worker.id} could not take the session: {e}")
+                self._spawn(self._destroy(worker))
+                continue
+            self.metrics["hits"] += 1
+            logger.info(f"Session for {session.get('room_url')} handed to warm worker {worker.id}")
+            return worker
+        self.metrics["misses"] += 1
+        logger.info("Warm pool is empty")
+        return None
+
+    async def _maintain(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._refill_event.wait(), self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._refill_event.clear()
+            self._recycle()
+            target = self.target_size
+            missing = target - len(self._idle) - self._creating
+            for _ in range(missing):
+                self._creating += 1
+                self._spawn(self._create())
+            while len(self._idle) > target:
+                # Shrink oldest first, they are the most likely to be recycled by their idle timeout
+                worker = self._idle.pop(0)
+                self.metrics["shrunk"] += 1
+                logger.info(f"Shrinking warm pool, destroying worker {worker.id}")
+                self._spawn(self._destroy(worker))
+
+    def _recycle(self):
+        now = time.monotonic()
+        expired = [w for w in self._idle if now - w.created_at >= self.max_age]
+        for worker in expired:
+            self._idle.remove(worker)
+            logger.info(f"Recycling warm worker {worker.id}")
+            self._spawn(self._destroy(worker))
+
+    async def _create(self):
+        try:
+            worker = await self.backend.create_worker()
+        except Exception as e:
+            self.metrics["create_failures"] += 1
+            logger.error(f"Unable to create warm worker: {e}")
+            return
+        finally:
+            self._creating -= 1
+        self.metrics["created"] += 1
+        self._idle.append(worker)
+        logger.info(f"Warm worker {worker.id} ready ({len(self._idle)} idle)")
+        # The pool may have shrunk while the worker was booting
+        if len(self._idle) > self.target_size:
+            self._refill_event.set()
+
+    async def _destroy(self, worker: WarmWorker):
+        try:
+            await self.backend.destroy_worker(worker)
+        except Exception as e:
+            logger.warning(f"Unable to destroy warm worker {worker.id}: {e}")
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
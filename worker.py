@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+import argparse
+import asyncio
+import importlib
+import os
+
+# Pay for the heavy imports while the worker is idle in the warm pool,
+# not when it is handed a room.
+import pipecat.services.elevenlabs  # noqa: F401
+import pipecat.services.openai  # noqa: F401
+import pipecat.transports.services.daily  # noqa: F401
+import pipecat.vad.silero  # noqa: F401
+from aiohttp import web
+from dotenv import load_dotenv
+from loguru import logger
+
+from worker_auth import bearer_auth
+
+load_dotenv(override=True)
+
+WORKER_PORT = int(os.getenv("WORKER_PORT", 8081))
+WORKER_MAX_IDLE = int(os.getenv("WORKER_MAX_IDLE", 60 * 60))  # Default: 1 hour
+# Shared secret the runner sends as a bearer token with POST /start
+WORKER_TOKEN = os.getenv("WORKER_TOKEN", "")
+
+
+class Worker:
+    """
+    A pre-booted bot worker. It idles until the runner hands it a room via
+    `POST /start`, runs exactly one bot session and then exits, so that the
+    machine is destroyed just like a cold-started one. `POST /start` requires the
+    bearer `token`.
+
+    If it isn't handed a room within `max_idle` seconds it exits on its own.
+    """
+
+    def __init__(self, max_idle: int = WORKER_MAX_IDLE, token: str = WORKER_TOKEN):
+        self.max_idle = max_idle
+        self.token = token
+        self.state = "idle"
+        self.session_task: asyncio.Task | None = None
+        self.done = asyncio.Event()
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[bearer_auth(self.token)])
+        app.router.add_get("/health", self.health)
+        app.router.add_post("/start", self.start)
+        return app
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"state": self.state})
+
+    async def start(self, request: web.Request) -> web.Response:
+        if self.state != "idle":
+            return web.json_response({"error": f"Worker is {self.state}"}, status=409)
+        data = await request.json()
+        if not data.get("room_url") or not data.get("token"):
+            return web.json_response({"error": "room_url and token are required"}, status=400)
+
+        self.state = "busy"
+        logger.info(f"Worker assigned to room: {data['room_url']}")
+        self.session_task = asyncio.create_task(self.run_session(data))
+        return web.json_response({"state": self.state})
+
+    async def run_session(self, data: dict):
+        bot_name = data.get("bot_name") or os.getenv("BOT_NAME", "Chatbot")
+        try:
+            bot = importlib.import_module("bot")
+            await bot.main(
+                data["room_url"],
+                data["token"],
+                bot_name,
+                system_prompt=data.get("system_prompt"),
+                sprite_folder=data.get("sprite_folder"),
+            )
+        except Exception as e:
+            logger.exception(f"Bot session failed: {e}")
+        finally:
+            self.state = "done"
+            self.done.set()
+
+    async def run(self, host: str, port: int):
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Worker listening on {host}:{port}")
+        try:
+            await asyncio.wait_for(self.done.wait(), self.max_idle)
+        except asyncio.TimeoutError:
+            if self.state == "idle":
+                logger.info(f"Worker was not assigned a room within {self.max_idle} seconds. Exiting.")
+            else:
+                await self.done.wait()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MDS Bot Worker")
+    # Fly's private network is IPv6 only
+    parser.add_argument("--host", type=str, default=os.getenv("WORKER_HOST", "::"), help="Host address")
+    parser.add_argument("--port", type=int, default=WORKER_PORT, help="Port number")
+    config = parser.parse_args()
+    if not WORKER_TOKEN:
+        parser.error("WORKER_TOKEN must be set, the worker refuses all sessions without it")
+
+    asyncio.run(Worker().run(config.host, config.port))
@@ -0,0 +1,30 @@
+import secrets
+from typing import Iterable, Optional
+
+from aiohttp import web
+
+
+def bearer_authorized(authorization: Optional[str], token: str) -> bool:
+    """
+    Whether an Authorization header carries the bearer `token`. Without a token nothing is authorized.
+    """
+    return bool(token) and secrets.compare_digest((authorization or "").encode(), f"Bearer {token}".encode())
+
+
+def bearer_headers(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+
+def bearer_auth(token: str, public: Iterable[str] = ("/health",)):
+    """
+    An aiohttp middleware refusing requests without the bearer `token` with a 401, except for the `public` paths.
+    """
+    public = frozenset(public)
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        if request.path not in public and not bearer_authorized(request.headers.get("Authorization"), token):
+            return web.json_response({"error": "Unauthorized"}, status=401)
+        return await handler(request)
+
+    return middleware
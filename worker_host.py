@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+import argparse
+import asyncio
+import importlib
+import os
+import resource
+import signal
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional
+
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv
+from loguru import logger
+
+from frame_tracer import FrameTracer
+from latency_probes import TurnLatencyTracker
+from pipecat.pipeline.runner import PipelineRunner
+from shared_vad import BatchedVADEngine, SharedSileroVADAnalyzer, silero_session
+from talking_animation import load_atlas
+from worker_auth import bearer_auth
+
+load_dotenv(override=True)
+
+WORKER_HOST_PORT = int(os.getenv("WORKER_HOST_PORT", 8082))
+WORKER_HOST_MAX_SESSIONS = int(os.getenv("WORKER_HOST_MAX_SESSIONS", 8))
+# Finished sessions stay listed for this many seconds, so their outcome can be checked
+WORKER_HOST_KEEP_FINISHED = int(os.getenv("WORKER_HOST_KEEP_FINISHED", 5 * 60))
+# Batch the VAD inference of all sessions, see shared_vad.BatchedVADEngine
+WORKER_HOST_BATCH_VAD = os.getenv("WORKER_HOST_BATCH_VAD", "true").lower() in ("true", "1", "yes")
+FRAME_TRACE_SIZE = int(os.getenv("FRAME_TRACE_SIZE", 4096))
+# Shared secret the runner sends as a bearer token, every endpoint but /health requires it
+WORKER_TOKEN = os.getenv("WORKER_TOKEN", "")
+
+
+@dataclass
+class HostedSession:
+    id: str
+    room_url: str
+    bot_name: str
+    runner: PipelineRunner
+    # running, stopping, done or failed
+    state: str = "running"
+    started_at: float = field(default_factory=time.time)
+    ended_at: Optional[float] = None
+    error: Optional[str] = None
+    task: Optional[asyncio.Task] = None
+    latency: TurnLatencyTracker = field(default_factory=TurnLatencyTracker)
+    tracer: Optional[FrameTracer] = None
+
+    def health(self) -> dict:
+        return {
+            "id": self.id,
+            "room_url": self.room_url,
+            "bot_name": self.bot_name,
+            "state": self.state,
+            "started_at": self.started_at,
+            "uptime": (self.ended_at or time.time()) - self.started_at,
+            "error": self.error,
+            "latency": self.latency.summary(),
+        }
+
+
+class WorkerHost:
+    """
+    Runs many bot sessions in one process. Everything that is the same for all
+    sessions is loaded once and shared: the imports, the Silero VAD model, the
+    sprite atlases and the HTTP connection pool. The VAD inference of all sessions
+    is batched. Each session still gets its own transport, services and pipeline.
+
+    Sessions are added with `POST /sessions`, listed with `GET /sessions`, checked
+    with `GET /sessions/{id}` and stopped with `DELETE /sessions/{id}`. The last frames
+    of a session are listed by `GET /sessions/{id}/trace`. All of them require the
+    bearer `token`, only `GET /health` is public.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = WORKER_HOST_MAX_SESSIONS,
+        keep_finished: float = WORKER_HOST_KEEP_FINISHED,
+        bot_main: Optional[Callable[..., Awaitable[None]]] = None,
+        batch_vad: bool = WORKER_HOST_BATCH_VAD,
+        token: str = WORKER_TOKEN,
+    ):
+        self.max_sessions = max_sessions
+        self.keep_finished = keep_finished
+        self.sessions: Dict[str, HostedSession] = {}
+        self.draining = False
+        self.aiohttp_session: Optional[aiohttp.ClientSession] = None
+        self._bot_main = bot_main
+        self.token = token
+        self.vad_engine = BatchedVADEngine() if batch_vad else None
+
+    @property
+    def active_sessions(self) -> int:
+        return sum(1 for s in self.sessions.values() if s.state in ("running", "stopping"))
+
+    def preload(self, sprite_folders: list[str]):
+        if not self._bot_main:
+            self._bot_main = importlib.import_module("bot").main
+        silero_session()
+        for folder in sprite_folders:
+            load_atlas(folder)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[bearer_auth(self.token)])
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/sessions", self.list_sessions)
+        app.router.add_post("/sessions", self.add_session)
+        app.router.add_get("/sessions/{id}", self.get_session)
+        app.router.add_delete("/sessions/{id}", self.remove_session)
+        app.router.add_get("/sessions/{id}/trace", self.get_trace)
+        return app
+
+    async def health(self, request: web.Request) -> web.Response:
+        active = self.active_sessions
+        if self.draining:
+            state = "draining"
+        elif active >= self.max_sessions:
+            state = "full"
+        else:
+            state = "ok"
+        return web.json_response(
+            {
+                "state": state,
+                "sessions": active,
+                "max_sessions": self.max_sessions,
+                # ru_maxrss is in kilobytes on Linux
+                "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                "vad": self.vad_engine.metrics if self.vad_engine else None,
+            }
+        )
+
+    async def list_sessions(self, request: web.Request) -> web.Response:
+        self._prune()
+        return web.json_response([s.health() for s in self.sessions.values()])
+
+    async def get_session(self, request: web.Request) -> web.Response:
+        session = self.sessions.get(request.match_info["id"])
+        if not session:
+            return web.json_response({"error": "Unknown session"}, status=404)
+        return web.json_response(session.health())
+
+    async def get_trace(self, request: web.Request) -> web.Response:
+        session = self.sessions.get(request.match_info["id"])
+        if not session or not session.tracer:
+            return web.json_response({"error": "Unknown session"}, status=404)
+        return web.json_response({"id": session.id, "frames": session.tracer.records()})
+
+    async def add_session(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return web.json_response({"error": "Host is shutting down"}, status=503)
+        if self.active_sessions >= self.max_sessions:
+            return web.json_response({"error": "Host is full"}, status=503)
+        data = await request.json()
+        if not data.get("room_url") or not data.get("token"):
+            return web.json_response({"error": "room_url and token are required"}, status=400)
+
+        session = HostedSession(
+            id=uuid.uuid4().hex,
+            room_url=data["room_url"],
+            bot_name=data.get("bot_name") or os.getenv("BOT_NAME", "Chatbot"),
+            runner=PipelineRunner(handle_sigint=False),
+        )
+        if FRAME_TRACE_SIZE > 0:
+            session.tracer = FrameTracer(session.id, capacity=FRAME_TRACE_SIZE)
+        self.sessions[session.id] = session
+        session.task = asyncio.create_task(self._run_session(session, data))
+        logger.info(f"Session {session.id} started for room {session.room_url} ({self.active_sessions} active)")
+        return web.json_response(session.health(), status=201)
+
+    async def remove_session(self, request: web.Request) -> web.Response:
+        session = self.sessions.get(request.match_info["id"])
+        if not session:
+            return web.json_response({"error": "Unknown session"}, status=404)
+        await self.stop_session(session)
+        return web.json_response(session.health())
+
+    async def stop_session(self, session: HostedSession, timeout: float = 10):
+        if session.state != "running":
+            return
+        session.state = "stopping"
+        await session.runner.cancel()
+        try:
+            await asyncio.wait_for(asyncio.shield(session.task), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Session {session.id} did not stop within {timeout} seconds, cancelling it")
+            session.task.cancel()
+            await asyncio.gather(session.task, return_exceptions=True)
+
+    async def _run_session(self, session: HostedSession, data: dict):
+        try:
+            await self._bot_main(
+                session.room_url,
+                data["token"],
+                session.bot_name,
+                system_prompt=data.get("system_prompt"),
+                sprite_folder=data.get("sprite_folder"),
+                aiohttp_session=self.aiohttp_session,
+                vad_analyzer=SharedSileroVADAnalyzer(engine=self.vad_engine),
+                runner=session.runner,
+                latency=session.latency,
+                tracer=session.tracer,
+            )
+            session.state = "done"
+        except asyncio.CancelledError:
+            session.state = "done"
+        except Exception as e:
+            logger.exception(f"Session {session.id} failed: {e}")
+            session.state = "failed"
+            session.error = str(e)
+        finally:
+            session.ended_at = time.time()
+            logger.info(f"Session {session.id} {session.state} ({self.active_sessions} active)")
+
+    def _prune(self):
+        now = time.time()
+        for session in list(self.sessions.values()):
+            if session.ended_at and now - session.ended_at > self.keep_finished:
+                del self.sessions[session.id]
+
+    async def shutdown(self):
+        self.draining = True
+        await asyncio.gather(*[self.stop_session(s) for s in list(self.sessions.values())])
+
+    async def run(self, host: str, port: int):
+        self.aiohttp_session = aiohttp.ClientSession()
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stopped.set)
+
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Worker host listening on {host}:{port} with room for {self.max_sessions} sessions")
+        await stopped.wait()
+
+        logger.info("Worker host shutting down")
+        await self.shutdown()
+        await runner.cleanup()
+        await self.aiohttp_session.close()
+        if self.vad_engine:
+            self.vad_engine.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MDS Bot Worker Host")
+    # Fly's private network is IPv6 only
+    parser.add_argument("--host", type=str, default=os.getenv("WORKER_HOST", "::"), help="Host address")
+    parser.add_argument("--port", type=int, default=WORKER_HOST_PORT, help="Port number")
+    parser.add_argument(
+        "--max-sessions", type=int, default=WORKER_HOST_MAX_SESSIONS, help="Maximum concurrent sessions"
+    )
+    parser.add_argument(
+        "--sprites",
+        nargs="*",
+        default=[os.getenv("SPRITE_FOLDER", "parkingmeter")],
+        help="Sprite folders to load up front",
+    )
+    config = parser.parse_args()
+    if not WORKER_TOKEN:
+        parser.error("WORKER_TOKEN must be set, the host refuses all sessions without it")
+
+    host = WorkerHost(max_sessions=config.max_sessions)
+    host.preload(config.sprites)
+    asyncio.run(host.run(config.host, config.port))